@@ -1,22 +1,283 @@
 import copy
-import pygame
+import itertools
+import json
+import os
+import time
+from array import array
+
+from Board import ZOBRIST_PIECE_KEYS, encode_move
+from PawnHashTable import pawn_hash_table
 from Piece import King, Rook, Pawn, Queen, Bishop, Knight
+from SoundBank import sound_bank
+from TimeManager import TimeManager
 
+# Evaluation is in centipawns (1 pawn = 100)
 PIECE_VALUES = {
-    Pawn: 1,
-    Knight: 3,
-    Bishop: 3,
-    Rook: 5,
-    Queen: 9,
-    King: 100  # High value to prioritize king safety
+    Pawn: 100,
+    Knight: 300,
+    Bishop: 300,
+    Rook: 500,
+    Queen: 900,
+    King: 10000  # High value to prioritize king safety
 }
 
+# Piece-square tables, from white's point of view (row 0 is the 8th rank). Black uses them mirrored.
+PIECE_SQUARE_TABLES = {
+    Pawn: [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [50, 50, 50, 50, 50, 50, 50, 50],
+        [10, 10, 20, 30, 30, 20, 10, 10],
+        [5, 5, 10, 25, 25, 10, 5, 5],
+        [0, 0, 0, 20, 20, 0, 0, 0],
+        [5, -5, -10, 0, 0, -10, -5, 5],
+        [5, 10, 10, -20, -20, 10, 10, 5],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+    Knight: [
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+        [-40, -20, 0, 0, 0, 0, -20, -40],
+        [-30, 0, 10, 15, 15, 10, 0, -30],
+        [-30, 5, 15, 20, 20, 15, 5, -30],
+        [-30, 0, 15, 20, 20, 15, 0, -30],
+        [-30, 5, 10, 15, 15, 10, 5, -30],
+        [-40, -20, 0, 5, 5, 0, -20, -40],
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+    ],
+    Bishop: [
+        [-20, -10, -10, -10, -10, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 10, 10, 5, 0, -10],
+        [-10, 5, 5, 10, 10, 5, 5, -10],
+        [-10, 0, 10, 10, 10, 10, 0, -10],
+        [-10, 10, 10, 10, 10, 10, 10, -10],
+        [-10, 5, 0, 0, 0, 0, 5, -10],
+        [-20, -10, -10, -10, -10, -10, -10, -20],
+    ],
+    Rook: [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [5, 10, 10, 10, 10, 10, 10, 5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [0, 0, 0, 5, 5, 0, 0, 0],
+    ],
+    Queen: [
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 5, 5, 5, 0, -10],
+        [-5, 0, 5, 5, 5, 5, 0, -5],
+        [0, 0, 5, 5, 5, 5, 0, -5],
+        [-10, 5, 5, 5, 5, 5, 0, -10],
+        [-10, 0, 5, 0, 0, 0, 0, -10],
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+    ],
+    King: [
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-20, -30, -30, -40, -40, -30, -30, -20],
+        [-10, -20, -20, -20, -20, -20, -20, -10],
+        [20, 20, 0, 0, 0, 0, 20, 20],
+        [20, 30, 10, 0, 0, 10, 30, 20],
+    ],
+}
+
+# Weights of the positional terms, in centipawns
+EVALUATION_WEIGHTS = {
+    "mobility": 2,  # per square a knight/bishop/rook/queen reaches (see MOBILITY_TARGETS)
+    "doubled_pawn": -15,  # per extra pawn on a file
+    "isolated_pawn": -10,  # per pawn without friendly pawns on the neighbouring files
+    "passed_pawn": 10,  # per rank advanced (1 on its starting rank, 6 one step from promotion) of a passed pawn
+    "backward_pawn": -8,  # per pawn behind its neighbours whose advance square an enemy pawn guards
+    "pawn_shield": 10,  # per friendly pawn one or two squares in front of the king (its file and the next ones)
+}
+# pawn_structure_terms order, then count_pawn_shield
+PAWN_TERMS = ["doubled_pawn", "isolated_pawn", "passed_pawn", "backward_pawn", "pawn_shield"]
+
+# Tuned weights written by EvaluationTuner.py; when present they replace the defaults above at startup
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json")
+
+
+def load_evaluation_weights(path=WEIGHTS_PATH):
+    """
+    Updates PIECE_VALUES, PIECE_SQUARE_TABLES and EVALUATION_WEIGHTS in place from a weights file
+    (pieces keyed by class name). Missing entries keep their default. Returns False if there is no file.
+    """
+    if not os.path.exists(path):
+        return False
+
+    with open(path) as weights_file:
+        weights = json.load(weights_file)
+
+    piece_types = {piece_type.__name__: piece_type for piece_type in PIECE_VALUES}
+    for name, value in weights.get("piece_values", {}).items():
+        PIECE_VALUES[piece_types[name]] = int(value)
+    for name, table in weights.get("piece_square_tables", {}).items():
+        PIECE_SQUARE_TABLES[piece_types[name]] = [[int(value) for value in row] for row in table]
+    for term, value in weights.get("evaluation_weights", {}).items():
+        EVALUATION_WEIGHTS[term] = int(value)
+    pawn_hash_table.clear()  # its scores were computed with the previous weights
+    return True
+
+
+load_evaluation_weights()
+
+
+def build_mobility_targets():
+    """
+    Mobility proxy: for every square (row * 8 + col), the squares a piece there would reach on an
+    empty board. Counting those not held by friendly pieces approximates mobility without generating moves.
+    """
+    directions = {
+        Knight: [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)],
+        Bishop: [(1, 1), (1, -1), (-1, 1), (-1, -1)],
+        Rook: [(0, 1), (0, -1), (1, 0), (-1, 0)],
+    }
+    directions[Queen] = directions[Bishop] + directions[Rook]
+
+    targets = {}
+    for piece_type, piece_directions in directions.items():
+        targets[piece_type] = []
+        for square in range(64):
+            row, col = divmod(square, 8)
+            square_targets = []
+            for vertical_direction, horizontal_direction in piece_directions:
+                new_row, new_col = row + vertical_direction, col + horizontal_direction
+                while 0 <= new_row < 8 and 0 <= new_col < 8:
+                    square_targets.append(new_row * 8 + new_col)
+                    if piece_type == Knight:
+                        break  # knights jump once
+                    new_row, new_col = new_row + vertical_direction, new_col + horizontal_direction
+            targets[piece_type].append(square_targets)
+    return targets
+
+
+MOBILITY_TARGETS = build_mobility_targets()
+
+
+def build_pawn_shield_squares():
+    """
+    For every king square (row * 8 + col) and color: the squares one and two rows in front of the king
+    (towards the enemy) on its file and the neighbouring files.
+    """
+    shield_squares = {"white": [], "black": []}
+    for color, forward in (("white", -1), ("black", 1)):
+        for square in range(64):
+            row, col = divmod(square, 8)
+            shield_squares[color].append([(row + distance * forward) * 8 + shield_col
+                                          for distance in (1, 2) if 0 <= row + distance * forward < 8
+                                          for shield_col in (col - 1, col, col + 1) if 0 <= shield_col < 8])
+    return shield_squares
+
+
+PAWN_SHIELD_SQUARES = build_pawn_shield_squares()
+
+
+def pawn_structure_terms(pawns, enemy_pawns, color):
+    """
+    Unweighted pawn-only terms of one side (doubled, isolated, passed, backward pawns: PAWN_TERMS
+    without the pawn shield). pawns / enemy_pawns are sets of squares (row * 8 + col).
+    """
+    forward = -1 if color == "white" else 1
+    pawn_files = [0] * 8
+    for square in pawns:
+        pawn_files[square & 7] += 1
+
+    doubled_pawns = sum(count - 1 for count in pawn_files if count > 1)
+    isolated_pawns = sum(count for file, count in enumerate(pawn_files)
+                         if count and (file == 0 or not pawn_files[file - 1])
+                         and (file == 7 or not pawn_files[file + 1]))
+
+    passed_pawns = backward_pawns = 0
+    for square in pawns:
+        row, col = square >> 3, square & 7
+
+        # Passed: no enemy pawn in front of it, on its file or the neighbouring ones
+        if not any(abs((enemy & 7) - col) <= 1 and ((enemy >> 3) - row) * forward > 0 for enemy in enemy_pawns):
+            passed_pawns += 7 - row if color == "white" else row
+
+        # Backward: its neighbours have all advanced past it, and an enemy pawn guards the square in front of it
+        neighbour_rows = [other >> 3 for other in pawns if abs((other & 7) - col) == 1]
+        guard_row = row + 2 * forward
+        if neighbour_rows and all((other_row - row) * forward > 0 for other_row in neighbour_rows) \
+                and 0 <= guard_row < 8 and any(guard_row * 8 + guard_col in enemy_pawns
+                                               for guard_col in (col - 1, col + 1) if 0 <= guard_col < 8):
+            backward_pawns += 1
+
+    return doubled_pawns, isolated_pawns, passed_pawns, backward_pawns
+
+
+def evaluate_pawn_structure(white_pawns, black_pawns):
+    """Weighted pawn-only score (white minus black): the value stored in the pawn hash table."""
+    white_terms = pawn_structure_terms(white_pawns, black_pawns, "white")
+    black_terms = pawn_structure_terms(black_pawns, white_pawns, "black")
+    return sum(EVALUATION_WEIGHTS[term] * (white_term - black_term)
+               for term, white_term, black_term in zip(PAWN_TERMS, white_terms, black_terms))
+
+
+def count_pawn_shield(pawns, king_square, color) -> int:
+    """Friendly pawns on the PAWN_SHIELD_SQUARES of {color}'s king (0 without a king)."""
+    if king_square is None:
+        return 0
+    return sum(1 for square in PAWN_SHIELD_SQUARES[color][king_square] if square in pawns)
+
+
+DRAW_SCORE = 0  # Score of a repeated position, a fifty-move draw or a stalemate
+MATE_SCORE = 1000000  # Score of a checkmate (plus the remaining depth, so quicker mates score higher)
+TIME_CHECK_INTERVAL = 256  # Nodes between two looks at the clock
+
+# Transposition table entries: position hash => (depth, value, bound, best move)
+TRANSPOSITION_TABLE_SIZE = 1 << 20  # Entries kept before the table is cleared
+EXACT_BOUND = 0  # The value is exact
+LOWER_BOUND = 1  # The search failed high: the value is at least this
+UPPER_BOUND = 2  # The search failed low: the value is at most this
+KILLERS_PER_DEPTH = 2  # Quiet moves remembered per depth for causing a cutoff
+
+# Moves inside the search are 16-bit codes: Board.encode_move's start square (bits 0-5) and end square (bits 6-11),
+# promotion bits 12-13 left at 0 (the bot always promotes to a queen), plus this flag for captures and promotions
+NOISY_MOVE_FLAG = 1 << 14
+MAX_MOVES = 256  # Size of the per-depth move buffers (more than the legal moves of any position)
+MOVE_LOCATIONS = [(square >> 3, square & 7) for square in range(64)]  # square index => (row, col)
+MAX_CLOCKED_DEPTH = 30  # Depth limit of search_clocked, where the clock decides when to stop
+FIXED_DEPTH = 3  # Depth of the bot's search in games without clocks
+PONDER_POLL_INTERVAL = 0.05  # Seconds between two looks at the ponder search after a ponderhit
+
+
+class SearchTimeout(Exception):
+    """Raised inside minimax when the time limit of search() runs out."""
+
+
+def move_locations(code):
+    """Search move code => (start_location, end_location)."""
+    return MOVE_LOCATIONS[code & 63], MOVE_LOCATIONS[(code >> 6) & 63]
+
+
+def code_to_move(board, code):
+    """Search move code => (piece, end_location) on {board}, the bot's move format outside the search."""
+    start_location, end_location = move_locations(code)
+    return board.get_square(start_location).piece, end_location
+
 
 class AIBot:
     def __init__(self, game, color):
-        self.game = game
+        self.game = game  # None when the bot is used outside a Game (e.g. batch analysis)
         self.color = color
-        self.transposition_table = {}  # Initialize Transposition Table
+        # Zobrist hash => (depth, value, bound, best move code or None); a SharedTranspositionTable in parallel search
+        self.transposition_table = {}
+        self.killer_moves = {}  # remaining depth => codes of quiet moves that caused a cutoff
+        self.move_buffers = []  # remaining depth => (move codes, scores) arrays reused by pick_moves
+
+        # Search statistics and limits
+        self.nodes = 0  # Nodes visited since the last reset
+        self.deadline = None  # time.perf_counter() value at which search() stops deepening
+        self.stop_requested = None  # optional callable, polled like the clock: True aborts the search
+        self.time_manager = TimeManager()  # budgets search_clocked
+        self.ponder_hash = None  # position hash of the position the game's ponder search is searching
+        self.ponder_start = None  # time.perf_counter() value at which that search started
+        self.pv_lines = {}  # remaining depth => move codes of the best line found below the node searched there
 
     ###########################################################
     """ Helper functions """
@@ -24,55 +285,62 @@ class AIBot:
     @staticmethod
     def evaluate_board(board):
         """
-        Evaluate the board and return a score based on piece values and their positions.
-        Positive scores favor AI, negative scores favor the opponent.
+        Evaluate the board and return a score (centipawns) based on piece values and their positions.
+        Positive scores favor white, negative scores favor black.
+        Terms: material, piece-square tables, mobility proxy and pawn structure (see pawn_structure_terms).
+        The pawn-only terms are scored once per pawn placement and then read from the pawn hash table;
+        the pawn shield depends on the kings too, and is counted at every call (a handful of squares).
+        BatchEvaluator computes exactly the same terms for many positions at once.
         """
         score = 0
+        squares = board.squares
+        pawn_key = 0  # Zobrist keys of the pawns only
+        pawn_squares = {"white": set(), "black": set()}
+        king_squares = {"white": None, "black": None}
+
+        for pieces, sign in ((board.white_pieces, 1), (board.black_pieces, -1)):
+            mobility = 0
+
+            for piece in pieces:
+                piece_type = type(piece)
+                row, col = piece.current_square.location
+
+                # Material + piece-square table (mirrored for black)
+                table_row = row if sign == 1 else 7 - row
+                score += sign * (PIECE_VALUES[piece_type] + PIECE_SQUARE_TABLES[piece_type][table_row][col])
+
+                if piece_type == Pawn:
+                    pawn_squares[piece.color].add(row * 8 + col)
+                    pawn_key ^= ZOBRIST_PIECE_KEYS[(Pawn, piece.color)][row * 8 + col]
+                elif piece_type == King:
+                    king_squares[piece.color] = row * 8 + col
+                else:
+                    # Mobility proxy: reachable squares (on an empty board) not held by a friendly piece
+                    for target in MOBILITY_TARGETS[piece_type][row * 8 + col]:
+                        target_piece = squares[target >> 3][target & 7].piece
+                        if not target_piece or target_piece.color != piece.color:
+                            mobility += 1
+
+            score += sign * EVALUATION_WEIGHTS["mobility"] * mobility
 
-        for piece in board.white_pieces:
-            value = PIECE_VALUES[type(piece)]
-            score += value
+        # Pawn structure
+        pawn_score = pawn_hash_table.get(pawn_key)
+        if pawn_score is None:
+            pawn_score = evaluate_pawn_structure(pawn_squares["white"], pawn_squares["black"])
+            pawn_hash_table.put(pawn_key, pawn_score)
 
-        for piece in board.black_pieces:
-            value = PIECE_VALUES[type(piece)]
-            score -= value
+        pawn_shield = (count_pawn_shield(pawn_squares["white"], king_squares["white"], "white")
+                       - count_pawn_shield(pawn_squares["black"], king_squares["black"], "black"))
 
-        return score
+        return score + pawn_score + EVALUATION_WEIGHTS["pawn_shield"] * pawn_shield
 
     @staticmethod
     def handle_ai_pawn_promotion(board):
         """
         Handle pawn promotion when a pawn reaches the last row of the board using the last move information.
-        This version automatically chooses a random promotion option (Q, R, B, N).
+        The bot always promotes to a Queen for simplicity.
         """
-        piece, start_square, destination_square, captured_piece = board.last_move
-
-        if isinstance(piece, Pawn):
-            # Check if the pawn reached the last row (promotion row)
-            if (piece.color == "white" and destination_square.location[0] == 0) or \
-                    (piece.color == "black" and destination_square.location[0] == 7):
-
-                promotion_choice = "Q"  # Always promote to a Queen for simplicity
-
-                promoted_piece = {
-                    "Q": Queen(piece.color, destination_square),
-                    "R": Rook(piece.color, destination_square),
-                    "B": Bishop(piece.color, destination_square),
-                    "N": Knight(piece.color, destination_square)
-                }[promotion_choice]
-
-                # Remove the pawn from the board's piece list and add the new one
-                if piece.color == "white":
-                    board.white_pieces.remove(piece)
-                    board.white_pieces.append(promoted_piece)
-                else:
-                    board.black_pieces.remove(piece)
-                    board.black_pieces.append(promoted_piece)
-
-                # Replace the pawn with the promoted piece on the board
-                destination_square.piece = promoted_piece
-
-                board.sound = "promote"
+        board.promote_pawn("Q")
 
     """ Executes a move on any given board """
     def execute_ai_move(self, piece, location, board):
@@ -88,118 +356,364 @@ class AIBot:
         board.handle_castling()
         self.handle_ai_pawn_promotion(board)
 
+        board.record_position()
+
     ###########################################################
     """ minimax methods """
 
     @staticmethod
-    def get_valid_moves(color, board):
-        """Collect all valid moves for {color} pieces and a given board."""
-        pieces = board.white_pieces if color == "white" else board.black_pieces
-        valid_moves = []
-
-        for piece in pieces:
-            unfiltered_moves = piece.get_unfiltered_moves(board)
-            filtered_moves = board.filter_moves(unfiltered_moves, piece)
-            for move in filtered_moves:
-                valid_moves.append((piece, move))  # Collect the piece and its valid move
-
-        return valid_moves
-
-    @staticmethod
-    def order_moves(valid_moves, board):
-        ordered_moves = []
-
-        for piece, move in valid_moves:
-            row, col = move  # Get the target row and column from the move
-            destination_square = board.squares[row][col]
-            move_value = 0
-
-            # Check if the move captures an opponent's piece
-            if destination_square.piece and destination_square.piece.color != piece.color:
-                move_value += PIECE_VALUES[type(destination_square.piece)]  # Value of the captured piece
-
-            # Add the move and its value to the list
-            ordered_moves.append((piece, move, move_value))
-
-        # Sort by move_value in descending order
-        ordered_moves.sort(key=lambda x: x[2], reverse=True)
-
-        return [(piece, move) for piece, move, _ in ordered_moves]
+    def noisy_move_score(board, piece, move) -> int:
+        """
+        MVV-LVA score of a capture (en passant included) or promotion: the most valuable victim first,
+        then the least valuable attacker. 0 for a quiet move.
+        """
+        target_piece = board.squares[move[0]][move[1]].piece
+        gain = PIECE_VALUES[type(target_piece)] if target_piece else 0
+        if type(piece) == Pawn:
+            if not target_piece and move[1] != piece.current_square.location[1]:
+                gain = PIECE_VALUES[Pawn]  # en passant
+            if move[0] in (0, 7):
+                gain += PIECE_VALUES[Queen] - PIECE_VALUES[Pawn]
+        # Piece values are multiples of 100 up to the king's 10000: the victim always outweighs the attacker
+        return gain * 1000 - PIECE_VALUES[type(piece)] if gain else 0
+
+    def get_move_buffers(self, depth):
+        """(move codes, scores) buffers of the nodes searched at {depth}, allocated once per depth."""
+        while len(self.move_buffers) <= depth:
+            self.move_buffers.append((array("H", [0]) * MAX_MOVES, array("i", [0]) * MAX_MOVES))
+        return self.move_buffers[depth]
+
+    def pick_moves(self, board, color, hash_move, depth, position_hash):
+        """
+        Staged move picker: yields the code (see NOISY_MOVE_FLAG) of every legal move of {color}, in phases:
+        the hash move, captures and promotions (MVV-LVA), the killer moves, then the quiet moves.
+        The moves are written to the buffers of {depth}, shared by every node at that depth (a node's children
+        are one depth lower): captures and promotions from the front with their scores, quiet moves from the back.
+        Captures are picked by an in-place selection sort, and each move's legality (filter_moves) is checked
+        only when it is picked, so when the caller stops iterating after a cutoff, the rest is never examined.
+        """
+        moves, scores = self.get_move_buffers(depth)
+        squares = board.squares
+        cached_moves = board.get_cached_legal_moves(color, position_hash)
+        verified = cached_moves is not None  # cached moves are legal, the others still need filter_moves
+
+        # Fill the buffers: noisy moves in moves[:noisy_end], quiet moves in moves[quiet_start:]
+        if verified:
+            candidates = ((squares[start_location[0]][start_location[1]].piece, end_location)
+                          for start_location, end_location in cached_moves)
+        else:
+            candidates = ((piece, end_location) for piece in (board.white_pieces if color == "white"
+                                                              else board.black_pieces)
+                          for end_location in piece.get_unfiltered_moves(board))
+        noisy_end, quiet_start = 0, MAX_MOVES
+        for piece, end_location in candidates:
+            start_row, start_col = piece.current_square.location
+            code = start_row * 8 + start_col | (end_location[0] * 8 + end_location[1]) << 6
+            score = self.noisy_move_score(board, piece, end_location)
+            if score:
+                moves[noisy_end] = code | NOISY_MOVE_FLAG
+                scores[noisy_end] = score
+                noisy_end += 1
+            else:
+                quiet_start -= 1
+                moves[quiet_start] = code
+
+        def is_legal(code):
+            """Whether the move is legal here. Illegal moves are cleared (0) from the buffer by the caller."""
+            if verified:
+                return True
+            start = code & 63
+            return bool(board.filter_moves([MOVE_LOCATIONS[(code >> 6) & 63]], squares[start >> 3][start & 7].piece))
+
+        def find_move(code, start_index, end_index):
+            """Index of {code} in moves[start_index:end_index], or None."""
+            for index in range(start_index, end_index):
+                if moves[index] == code:
+                    return index
+            return None
+
+        # 1. Hash move: the best move of the last search of this position
+        if hash_move:
+            index = (find_move(hash_move, 0, noisy_end) if hash_move & NOISY_MOVE_FLAG
+                     else find_move(hash_move, quiet_start, MAX_MOVES))
+            if index is None:
+                hash_move = None
+            elif is_legal(hash_move):
+                yield hash_move
+            else:
+                moves[index] = hash_move = 0
+
+        # 2. Captures and promotions, most valuable victim first: each pick swaps the best remaining one in front
+        for index in range(noisy_end):
+            best_index = index
+            for other_index in range(index + 1, noisy_end):
+                if scores[other_index] > scores[best_index]:
+                    best_index = other_index
+            code = moves[best_index]
+            moves[best_index], scores[best_index] = moves[index], scores[index]
+            moves[index] = code
+
+            if code != hash_move:
+                if is_legal(code):
+                    yield code
+                else:
+                    moves[index] = 0
+
+        # 3. Killer moves: quiet moves that caused a cutoff at this depth in a sibling position
+        killers = self.killer_moves.get(depth, ())
+        for killer_move in killers:
+            index = find_move(killer_move, quiet_start, MAX_MOVES) if killer_move != hash_move else None
+            if index is not None:
+                if is_legal(killer_move):
+                    yield killer_move
+                else:
+                    moves[index] = 0
+
+        # 4. Quiet moves, in generation order (piece by piece)
+        for index in range(MAX_MOVES - 1, quiet_start - 1, -1):
+            code = moves[index]
+            if code and code != hash_move and code not in killers:
+                if is_legal(code):
+                    yield code
+                else:
+                    moves[index] = 0
+
+        # Every stage was generated and the illegal moves cleared: the full legal move list is worth caching
+        # for game-end detection
+        if not verified:
+            legal_moves = []
+            for index in itertools.chain(range(noisy_end), range(MAX_MOVES - 1, quiet_start - 1, -1)):
+                if moves[index]:
+                    legal_moves.append(move_locations(moves[index]))
+            board.cache_legal_moves(color, legal_moves, position_hash)
+
+    def store_killer_move(self, depth, move):
+        killers = self.killer_moves.setdefault(depth, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLERS_PER_DEPTH:]
+
+    def store_transposition(self, position_hash, depth, value, bound, best_move):
+        table = self.transposition_table
+        if not isinstance(table, dict):
+            table.put(position_hash, (depth, value, bound, best_move))  # fixed size, replaces by depth and age
+            return
+        if len(table) >= TRANSPOSITION_TABLE_SIZE:
+            table.clear()
+        table[position_hash] = (depth, value, bound, best_move)
 
     """ Minimax + Extras """
-    def minimax(self, board, depth, is_white, alpha=float('-inf'), beta=float('inf')):
-        # Hash the current board state
-        """ Hash function to represent the board state """
-        board_hash = hash(str(board.squares))
-
-        # Check if this board state has already been evaluated
-        if board_hash in self.transposition_table:
-            return self.transposition_table[board_hash], None
-
-        # Base case: if depth is zero or the game is over
-        if depth == 0 or board.check_board_state():
-            evaluation = self.evaluate_board(board)
-            # Store the evaluation in the transposition table
-            self.transposition_table[board_hash] = evaluation
-            return evaluation, None
-
+    def minimax(self, board, depth, is_white, alpha=float('-inf'), beta=float('inf'), excluded_moves=None):
+        """
+        Returns (evaluation, best move code or None); code_to_move turns the code into (piece, end_location).
+        excluded_moves: root only, a set of move codes that are not searched (multi-PV).
+        The value of such a search is not the position's, so it neither uses nor fills the table entry of the root.
+        """
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0 and ((self.deadline and time.perf_counter() > self.deadline)
+                                                      or (self.stop_requested and self.stop_requested())):
+            raise SearchTimeout()
+
+        # Base case: depth is zero
+        if depth == 0:
+            return self.evaluate_board(board), None
+
+        # Transposition table: a deep enough result ends the search here, any result gives the move to try first
+        position_hash = board.get_position_hash()
+        entry = self.transposition_table.get(position_hash)
+        hash_move = None
+        if entry is not None:
+            entry_depth, entry_value, bound, hash_move = entry
+            if not excluded_moves and entry_depth >= depth and (bound == EXACT_BOUND
+                                         or (bound == LOWER_BOUND and entry_value >= beta)
+                                         or (bound == UPPER_BOUND and entry_value <= alpha)):
+                self.pv_lines[depth] = [hash_move] if hash_move else []
+                return entry_value, hash_move
+
+        original_alpha, original_beta = alpha, beta
         best_evaluation = float('-inf') if is_white else float('inf')
         best_move = None
-        valid_moves = self.get_valid_moves("white", board) if is_white else self.get_valid_moves("black", board)
-
-        # Ensure there are valid moves
-        if not valid_moves:
-            return self.evaluate_board(board), None  # Return evaluation if no moves are available
+        color = "white" if is_white else "black"
 
-        # Move Ordering: sort valid moves based on their impact
-        ordered_moves = self.order_moves(valid_moves, board)
+        for code in self.pick_moves(board, color, hash_move, depth, position_hash):
+            if excluded_moves and code in excluded_moves:
+                continue
 
-        for piece, move in ordered_moves:
             temp_board = copy.deepcopy(board)
-            row, col = piece.current_square.location
-            temp_piece = temp_board.squares[row][col].piece
+            start = code & 63
+            temp_piece = temp_board.squares[start >> 3][start & 7].piece
 
-            self.execute_ai_move(temp_piece, move, temp_board)
-            evaluation, _ = self.minimax(temp_board, depth - 1, not is_white, alpha, beta)
+            self.execute_ai_move(temp_piece, MOVE_LOCATIONS[(code >> 6) & 63], temp_board)
+            temp_board.current_turn = "black" if is_white else "white"
+            self.pv_lines[depth - 1] = []  # filled by the child if it finds a best move
+
+            # A repeated position is a draw (it can be repeated again), so its subtree is not searched
+            if temp_board.count_repetitions() or temp_board.is_fifty_move_draw():
+                evaluation = DRAW_SCORE
+            else:
+                evaluation, _ = self.minimax(temp_board, depth - 1, not is_white, alpha, beta)
 
             # Update best evaluation and move
+            improved = evaluation > best_evaluation if is_white else evaluation < best_evaluation
+            if improved:
+                best_evaluation = evaluation
+                best_move = code
+                # The principal variation: this move followed by the child's best line
+                self.pv_lines[depth] = [code] + self.pv_lines[depth - 1]
+
             if is_white:
-                if evaluation > best_evaluation:
-                    best_evaluation = evaluation
-                    best_move = (piece, move)
                 alpha = max(alpha, best_evaluation)
             else:
-                if evaluation < best_evaluation:
-                    best_evaluation = evaluation
-                    best_move = (piece, move)
                 beta = min(beta, best_evaluation)
 
-            # Alpha-Beta Pruning:
+            # Alpha-Beta Pruning: leaving the loop closes the picker before the later stages are generated
             if beta <= alpha:
+                if not code & NOISY_MOVE_FLAG:
+                    self.store_killer_move(depth, code)
                 break
 
-        # Ensure best_move is always set to a valid move
+        # The game is over only if there are no moves: checkmate if in check (tracked by the board), else stalemate
         if best_move is None:
-            best_move = ordered_moves[0][:2]  # Default to the first valid move if no better one is found
+            if board.checked_color == color:
+                evaluation = -(MATE_SCORE + depth) if is_white else MATE_SCORE + depth
+            else:
+                evaluation = DRAW_SCORE
+            self.store_transposition(position_hash, depth, evaluation, EXACT_BOUND, None)
+            return evaluation, None
 
         # Store the evaluation in the transposition table before returning
-        self.transposition_table[board_hash] = best_evaluation
+        if excluded_moves:
+            return best_evaluation, best_move
+        if best_evaluation <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_evaluation >= original_beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT_BOUND
+        self.store_transposition(position_hash, depth, best_evaluation, bound, best_move)
 
         return best_evaluation, best_move
 
+    def search(self, board, max_depth, time_limit=None):
+        """
+        Iterative deepening over minimax: searches depth 1, 2, ... max_depth and stops early
+        once time_limit (seconds) runs out. Depth 1 always completes, so a move is always returned.
+        Returns (evaluation, best_move, pv, depth) of the deepest completed iteration, where
+        pv is a list of (start_location, end_location) tuples.
+        """
+        lines, depth = self.search_lines(board, max_depth, 1, time_limit)
+        return (*lines[0], depth)
+
+    def search_lines(self, board, max_depth, num_lines, time_limit=None, on_depth=None, time_manager=None,
+                     start_depth=1):
+        """
+        Multi-PV iterative deepening: at every depth, finds the best move, then the best move among the others,
+        and so on until num_lines moves have been found. Every root move is searched once per line at most,
+        and the transposition table and killer moves carry over from one line (and one depth) to the next.
+        Returns ([(evaluation, best_move, pv), ...] best line first, depth) of the deepest completed iteration;
+        on_depth(lines, depth), if given, receives the same after every completed iteration, and
+        time_manager.iteration_done(lines, depth), if given, can end the deepening early.
+        Only stop_requested can abort the first iteration (depth start_depth), in which case ([], 0) is returned.
+        """
+        is_white = board.current_turn == "white"
+        # Without legal moves, the single line holds the checkmate or stalemate score and no move
+        num_lines = max(1, min(num_lines, len(board.get_legal_moves(board.current_turn))))
+        start_time = time.perf_counter()
+        self.nodes = 0
+        self.deadline = None
+        result = ([], 0)
+
+        self.killer_moves = {}
+
+        for depth in range(start_depth, max_depth + 1):
+            # The table is kept between iterations: its best moves order the next, deeper one
+            lines = []
+            excluded_moves = set()
+
+            try:
+                while len(lines) < num_lines:
+                    self.pv_lines = {depth: []}
+                    evaluation, best_move = self.minimax(board, depth, is_white, excluded_moves=excluded_moves)
+                    lines.append((evaluation, best_move, self.pv_lines[depth]))
+                    if best_move is None:
+                        break
+                    excluded_moves.add(best_move)
+            except SearchTimeout:
+                break
+
+            # Each line is searched without the better ones, but a line can still come out ahead of an earlier
+            # one (a transposition table hit deeper down, for instance), so they are sorted
+            lines.sort(key=lambda line: -line[0] if is_white else line[0])
+            lines = [(evaluation, code_to_move(board, best_move) if best_move else None,
+                      [move_locations(code) for code in pv]) for evaluation, best_move, pv in lines]
+            result = (lines, depth)
+            if on_depth:
+                on_depth(lines, depth)
+            if time_manager and time_manager.iteration_done(lines, depth):
+                break
+            if time_limit:
+                self.deadline = start_time + time_limit
+                if time.perf_counter() > self.deadline:
+                    break
+
+        self.deadline = None
+        return result
+
+    def search_clocked(self, board, time_left, increment, max_depth=MAX_CLOCKED_DEPTH):
+        """
+        search() budgeted from the clock by the time manager: time_left and increment in seconds.
+        Returns (evaluation, best_move, pv, depth) like search().
+        """
+        hard_limit = self.time_manager.start_move(board, time_left, increment)
+        lines, depth = self.search_lines(board, max_depth, 1, hard_limit, time_manager=self.time_manager)
+        return (*lines[0], depth)
+
     ###########################################################
     """ AI selects and executes a valid move directly on the real game board. """
     def handle_ai_turn(self):
-        # Call minimax to get the best score and the best move (piece and its destination)
-        is_white = True if self.color == "white" else False
-        depth = 3
-        _, best_move = self.minimax(self.game.board, depth, is_white)
+        board = self.game.board
+        clock = self.game.game_clock
+        ponder = self.game.ponder
+
+        # Ponderhit: the opponent played the predicted move, so the ponder search is already searching this position
+        best_move = None
+        if ponder and self.ponder_hash == board.get_position_hash():
+            _, best_move, pv = self.finish_ponder_search(board, clock)
+        self.ponder_hash = None
+        if ponder:
+            ponder.pause()  # on a miss, the ponder search is dropped, but what it stored stays in the shared table
+            self.transposition_table.new_search()
+
+        # Get the best move (piece and its destination): with clocks, the time manager decides how deep
+        # the search goes (or how long the Monte Carlo tree search runs), without them the depth is fixed
+        monte_carlo = self.game.monte_carlo
+        if monte_carlo:
+            # The opponent's move, for the tree to follow it
+            log_index = self.game.current_log_index
+            last_code = self.game.move_codes[log_index - 1] if log_index > 0 else None
+            if clock:
+                self.time_manager.start_move(board, clock.time_left(self.color), clock.increment)
+                _, best_move, pv, _ = monte_carlo.search(board, self.time_manager.soft_limit, last_code=last_code)
+            else:
+                _, best_move, pv, _ = monte_carlo.search(board, last_code=last_code)
+        elif best_move is None and clock:
+            _, best_move, pv, _ = self.search_clocked(board, clock.time_left(self.color), clock.increment)
+        elif best_move is None:
+            is_white = True if self.color == "white" else False
+            self.pv_lines = {FIXED_DEPTH: []}
+            _, best_code = self.minimax(board, FIXED_DEPTH, is_white)
+            best_move = code_to_move(board, best_code) if best_code else None
+            pv = [move_locations(code) for code in self.pv_lines[FIXED_DEPTH]]
 
         # this condition should not exist. meaning that minimax sometimes returns a bad move
+        move = None
         if best_move:
             piece, location = best_move
+            move = (piece.current_square.location, location)
             # Execute the best move directly on the real game board
             self.execute_ai_move(piece, location, self.game.board)
+            if monte_carlo:
+                monte_carlo.advance(encode_move(*move))  # the tree of the reply is kept for the next search
 
         # Check if the game is finished after the move
         self.game.finished = self.game.board.check_board_state()
@@ -209,10 +723,63 @@ class AIBot:
             self.game.board.switch_turn()
         else:
             # Play sound if the game is finished
-            pygame.mixer.Sound(f'sounds/{self.game.board.sound}.mp3').play()
+            sound_bank.play(self.game.board.sound)
 
         # Save the game state
-        self.game.save_board_state()
+        self.game.save_board_state(move)
+
+        # Ponder on the reply the search expects, while the opponent thinks
+        if ponder and not self.game.finished and len(pv) > 1:
+            self.start_pondering(pv[1], MAX_CLOCKED_DEPTH if clock else FIXED_DEPTH)
+
+    ###########################################################
+    """ Pondering """
+
+    def start_pondering(self, predicted_move, max_depth):
+        """Searches the position after the opponent's predicted reply (start, end locations) in the background."""
+        ponder_board = copy.deepcopy(self.game.board)
+        ponder_board.make_move(*predicted_move)
+        self.ponder_hash = ponder_board.get_position_hash()
+        self.ponder_start = time.perf_counter()
+        self.game.ponder.set_position(ponder_board, max_depth)
+
+    def finish_ponder_search(self, board, clock):
+        """
+        Turns the ponder search into the search of the move: without clocks, waits until it reached FIXED_DEPTH
+        (often already done); with clocks, the time manager budgets the move from the clock as usual, but counts
+        the time spent pondering as spent on the move, so a long enough ponder is answered at once (only the hard
+        limit runs from now). The search stops between depths, or once the soft limit has passed.
+        Returns (evaluation, best_move, pv), with best_move None if the ponder search found nothing in time.
+        """
+        ponder = self.game.ponder
+        deadline = None
+        if clock:
+            deadline = time.perf_counter() + self.time_manager.start_move(board, clock.time_left(self.color),
+                                                                          clock.increment)
+            self.time_manager.start_time = self.ponder_start
+
+        searched_depth = 0
+        result = None
+        while ponder.process.is_alive():
+            ponder.poll(PONDER_POLL_INTERVAL)
+            if ponder.result and ponder.result[0] > searched_depth and ponder.result[2]:
+                result = ponder.result
+                searched_depth, evaluation, pv = result
+                if clock:
+                    done = self.time_manager.iteration_done([(evaluation, None, pv)], searched_depth)
+                else:
+                    done = searched_depth >= FIXED_DEPTH
+                if done:
+                    break
+            # The depth in progress was started on the opponent's time: past the soft limit, it is not waited for
+            if clock and result and time.perf_counter() - self.time_manager.start_time > self.time_manager.soft_limit:
+                break
+            if deadline and time.perf_counter() > deadline:
+                break
+
+        if result is None:
+            return None, None, []
+        _, evaluation, pv = result
+        start_location, end_location = pv[0]
+        return evaluation, (board.get_square(start_location).piece, end_location), pv
 
-        # Print for debugging
-        print(self.evaluate_board(self.game.board))
@@ -0,0 +1,126 @@
+""" Background analysis: a worker process keeps deepening on the displayed position and streams its results """
+import multiprocessing
+import queue
+
+from AIBot import AIBot, MATE_SCORE
+from Board import Board
+from SharedTranspositionTable import SharedTranspositionTable
+
+ANALYSIS_MAX_DEPTH = 30  # Deepening stops here (in practice, the position changes long before)
+
+
+def analysis_worker(command_queue, result_queue, latest_generation, table_name=None):
+    """
+    Runs in the worker process. Commands are (generation, fen, max_depth), or None to quit; results are
+    (generation, depth, score, pv), one per completed depth. A search is abandoned as soon as
+    latest_generation moves past its own generation (the displayed position changed).
+    table_name: a SharedTranspositionTable to search with, instead of a private table.
+    """
+    bot = AIBot(None, "white")  # one bot for the whole session: its transposition table survives position changes
+    if table_name:
+        bot.transposition_table = SharedTranspositionTable(name=table_name)
+
+    while True:
+        command = command_queue.get()
+        # Only the newest position matters
+        try:
+            while True:
+                command = command_queue.get_nowait()
+        except queue.Empty:
+            pass
+        if command is None:
+            break
+
+        generation, fen, max_depth = command
+        if generation != latest_generation.value:
+            continue
+
+        def send_depth(lines, depth):
+            evaluation, _, pv = lines[0]
+            result_queue.put((generation, depth, evaluation, pv))
+
+        bot.stop_requested = lambda: latest_generation.value != generation
+        bot.search_lines(Board.from_fen(fen), max_depth, 1, on_depth=send_depth)
+
+    if table_name:
+        bot.transposition_table.close()
+
+
+class BackgroundAnalysis:
+    """
+    GUI side of the analysis: set_position() hands the displayed position to the worker (cancelling the
+    search of the previous one), poll() collects what the worker found without ever waiting for it.
+    The bot also uses one to ponder (search on the opponent's time), sharing its transposition table.
+    """
+
+    def __init__(self, table_name=None):
+        # spawn: the GUI process runs SDL and a sound loading thread, which a forked child should not inherit
+        context = multiprocessing.get_context("spawn")
+        self.command_queue = context.Queue()
+        self.result_queue = context.Queue()
+        self.latest_generation = context.Value("i", 0)
+        self.process = context.Process(target=analysis_worker, daemon=True,
+                                       args=(self.command_queue, self.result_queue, self.latest_generation,
+                                             table_name))
+        self.process.start()
+
+        self.generation = 0
+        self.fen = None  # position being analysed, None while paused
+        self.result = None  # (depth, score, pv) of the deepest search completed on it
+
+    def set_position(self, board, max_depth=ANALYSIS_MAX_DEPTH):
+        """Analyse {board} from now on (nothing happens if it is the position already analysed)."""
+        fen = board.to_fen()
+        if fen == self.fen:
+            return
+        self.restart(fen)
+        self.command_queue.put((self.generation, fen, max_depth))
+
+    def pause(self):
+        """Stop searching (e.g. while the bot thinks on the same CPU), until the next set_position."""
+        if self.fen is not None:
+            self.restart(None)
+
+    def restart(self, fen):
+        self.generation += 1
+        self.latest_generation.value = self.generation
+        self.fen = fen
+        self.result = None
+
+    def poll(self, timeout=0) -> bool:
+        """
+        Collects the results streamed so far; True if self.result changed.
+        With a timeout (seconds), waits that long for a first result if none is there yet.
+        """
+        changed = False
+        try:
+            if timeout:
+                changed = self.store_result(self.result_queue.get(timeout=timeout))
+            while True:
+                changed = self.store_result(self.result_queue.get_nowait()) or changed
+        except queue.Empty:
+            pass
+        return changed
+
+    def store_result(self, result) -> bool:
+        generation, depth, score, pv = result
+        if generation != self.generation:
+            return False
+        self.result = (depth, score, pv)
+        return True
+
+    def close(self):
+        self.restart(None)
+        self.command_queue.put(None)
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def format_score(score, depth) -> str:
+    """Centipawns from white's point of view as "+0.35" / "-1.20", mates as "#3" / "#-2" (moves)."""
+    if abs(score) >= MATE_SCORE:
+        plies = depth - (abs(score) - MATE_SCORE)  # a mate scores MATE_SCORE + the depth left when it happens
+        moves = (plies + 1) // 2
+        return f"#{moves}" if score > 0 else f"#-{moves}"
+    return f"{score / 100:+.2f}"
@@ -0,0 +1,205 @@
+""" Batch position analysis: streams FEN/EPD positions through a pool of AIBot workers and writes JSONL """
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # keep pygame's banner out of the JSONL output
+
+import argparse
+import json
+import multiprocessing
+import queue
+import sys
+
+from AIBot import AIBot
+from Board import Board, location_to_name
+from Piece import Pawn
+
+DEFAULT_DEPTH = 3
+IN_FLIGHT_PER_WORKER = 4  # Positions read ahead per worker; bounds memory no matter how long the input is
+WORKER_CHECK_INTERVAL = 1.0  # Seconds waited for a result before checking that the workers are still alive
+
+
+##################################
+""" Parsing and formatting """
+
+
+def parse_position_line(line: str):
+    """
+    Splits a FEN or EPD line into (fen, epd_id).
+    EPD lines carry operations after the first four fields ("bm Nf3; id \"WAC.001\";"), only id is kept.
+    """
+    fields = line.split()
+    if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+        return " ".join(fields[:6]), None  # plain FEN
+
+    fen = " ".join(fields[:4])
+    epd_id = None
+    for operation in " ".join(fields[4:]).split(";"):
+        operation = operation.strip()
+        if operation.startswith("id "):
+            epd_id = operation[3:].strip().strip('"')
+    return fen, epd_id
+
+
+def move_to_uci(board, start_location, end_location) -> str:
+    """(6, 4), (4, 4) => "e2e4". The bot always promotes to a queen."""
+    piece = board.get_square(start_location).piece
+    promotion = "q" if isinstance(piece, Pawn) and end_location[0] in (0, 7) else ""
+    return location_to_name(start_location) + location_to_name(end_location) + promotion
+
+
+def pv_to_uci(board, pv) -> list:
+    """Converts a principal variation by replaying it on a copy of the board."""
+    board = Board.from_fen(board.to_fen())
+    bot = AIBot(None, board.current_turn)
+    uci_moves = []
+    for start_location, end_location in pv:
+        uci_moves.append(move_to_uci(board, start_location, end_location))
+        bot.execute_ai_move(board.get_square(start_location).piece, end_location, board)
+    return uci_moves
+
+
+##################################
+""" Workers """
+
+
+def analyse_position(bot, line: str, depth: int, time_limit, num_lines=1):
+    """
+    Analyses a single input line, returning a JSON-ready dict (with "error" for bad lines).
+    With num_lines > 1, "lines" also lists the best num_lines moves, each with its score and PV.
+    """
+    try:
+        fen, epd_id = parse_position_line(line)
+        board = Board.from_fen(fen)
+    except (ValueError, IndexError) as error:
+        return {"input": line, "error": str(error)}
+
+    result = {"fen": fen}
+    if epd_id:
+        result["id"] = epd_id
+
+    bot.color = board.current_turn
+    bot.transposition_table.clear()  # keep every worker's memory flat over long inputs
+    lines, completed_depth = bot.search_lines(board, depth, num_lines, time_limit)
+    evaluation, best_move, pv = lines[0]
+
+    result["bestmove"] = pv_to_uci(board, pv[:1])[0] if pv else None
+    result["score"] = evaluation  # from white's point of view, in centipawns
+    result["pv"] = pv_to_uci(board, pv)
+    result["depth"] = completed_depth
+    result["nodes"] = bot.nodes
+    if num_lines > 1:
+        result["lines"] = [{"move": pv_to_uci(board, line_pv[:1])[0] if line_pv else None,
+                            "score": line_evaluation, "pv": pv_to_uci(board, line_pv)}
+                           for line_evaluation, _, line_pv in lines]
+    return result
+
+
+def worker_loop(task_queue, result_queue, depth, time_limit, num_lines):
+    """Runs in a worker process: one AIBot per process, analysing tasks until it gets None."""
+    sys.stdout = sys.stderr  # stdout is reserved for JSONL, keep any stray output away from it
+    bot = AIBot(None, "white")
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        index, line = task
+        try:
+            result = analyse_position(bot, line, depth, time_limit, num_lines)
+        except Exception as error:
+            # Every task must get a result, or the driver would wait for it forever
+            result = {"input": line, "error": f"analysis failed: {error!r}"}
+        result_queue.put((index, result))
+
+
+def next_result(result_queue, processes):
+    """Waits for the next (index, result); raises RuntimeError if a worker process died in the meantime."""
+    while True:
+        try:
+            return result_queue.get(timeout=WORKER_CHECK_INTERVAL)
+        except queue.Empty:
+            if not all(process.is_alive() for process in processes):
+                raise RuntimeError("a worker process died")
+
+
+##################################
+""" Driver """
+
+
+def analyse_stream(lines, output, depth=DEFAULT_DEPTH, time_limit=None, workers=None, num_lines=1):
+    """
+    Analyses every non-empty line of {lines} over a pool of worker processes and writes one
+    JSON object per line to {output}, in input order. At most IN_FLIGHT_PER_WORKER * workers
+    positions are read ahead, so memory stays flat however many positions are streamed.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+
+    task_queue = multiprocessing.Queue(maxsize=max_in_flight)
+    result_queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker_loop,
+                                         args=(task_queue, result_queue, depth, time_limit, num_lines), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    pending_results = {}  # index => result, waiting for earlier positions to finish
+    next_index = 0  # index of the next position read
+    next_to_write = 0  # index of the next result written
+    lines = iter(lines)
+    exhausted = False
+
+    try:
+        while True:
+            # 1. Read ahead until the in-flight window is full
+            while not exhausted and next_index - next_to_write < max_in_flight:
+                line = next(lines, None)
+                if line is None:
+                    exhausted = True
+                    break
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                task_queue.put((next_index, line))
+                next_index += 1
+
+            if next_to_write == next_index:
+                break  # everything read was written
+
+            # 2. Wait for a result, then write every result that is next in input order
+            index, result = next_result(result_queue, processes)
+            pending_results[index] = result
+            while next_to_write in pending_results:
+                output.write(json.dumps(pending_results.pop(next_to_write)) + "\n")
+                next_to_write += 1
+            output.flush()
+    finally:
+        if all(process.is_alive() for process in processes):
+            for _ in processes:
+                task_queue.put(None)
+            for process in processes:
+                process.join()
+        else:
+            # A dead worker leaves its tasks in the queue: the others are stopped instead of waited for
+            for process in processes:
+                process.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse FEN/EPD positions and write JSONL results.")
+    parser.add_argument("input", nargs="?", help="file with one FEN or EPD per line (default: stdin)")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="maximum search depth")
+    parser.add_argument("--time", type=float, default=None, help="time limit per position, in seconds")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--multipv", type=int, default=1, help="number of best moves reported, with their lines")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input) as lines:
+            analyse_stream(lines, sys.stdout, args.depth, args.time, args.workers, args.multipv)
+    else:
+        analyse_stream(sys.stdin, sys.stdout, args.depth, args.time, args.workers, args.multipv)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,60 @@
+import random
+import re
 from typing import List, Tuple
 
-import pygame
-
+from LegalMoveCache import legal_move_cache
 from Piece import Pawn, Rook, Knight, Bishop, Queen, King
+from SoundBank import sound_bank
 from Square import Square
 
+##################################
+# Zobrist keys for position hashing (fixed seed: the same position hashes the same in every process)
+zobrist_random = random.Random(2024)
+ZOBRIST_PIECE_KEYS = {(piece_type, color): [zobrist_random.getrandbits(64) for _ in range(64)]
+                      for piece_type in (Pawn, Rook, Knight, Bishop, Queen, King)
+                      for color in ("white", "black")}
+ZOBRIST_CASTLING_KEYS = [zobrist_random.getrandbits(64) for _ in range(4)]  # white short/long, black short/long
+ZOBRIST_EN_PASSANT_KEYS = [zobrist_random.getrandbits(64) for _ in range(8)]  # one per file
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+
+##################################
+# Notation helpers (FEN piece letters, "e4" style square names)
+FEN_PIECE_TYPES = {"p": Pawn, "n": Knight, "b": Bishop, "r": Rook, "q": Queen, "k": King}
+FEN_PIECE_LETTERS = {piece_type: letter for letter, piece_type in FEN_PIECE_TYPES.items()}
+CASTLING_LETTERS = "KQkq"  # white short/long, black short/long (same order as ZOBRIST_CASTLING_KEYS)
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+
+def location_to_name(location: tuple[int, int]) -> str:
+    """(6, 4) => "e2". Row 0 is the 8th rank."""
+    row, col = location
+    return "abcdefgh"[col] + str(8 - row)
+
+
+def name_to_location(name: str) -> tuple[int, int]:
+    """"e2" => (6, 4)"""
+    return 8 - int(name[1]), "abcdefgh".index(name[0])
+
+
+# 16-bit move encoding: bits 0-5 start square, bits 6-11 end square (square = row * 8 + col),
+# bits 12-13 promotion piece (ignored unless a pawn reaches the last row)
+PROMOTION_CHOICES = "QRBN"
+
+
+def encode_move(start_location, end_location, promotion_choice="Q") -> int:
+    """((6, 4), (4, 4)) => 0x0934"""
+    start_row, start_col = start_location
+    end_row, end_col = end_location
+    return ((start_row * 8 + start_col) | (end_row * 8 + end_col) << 6
+            | PROMOTION_CHOICES.index(promotion_choice or "Q") << 12)
+
+
+def decode_move(code: int):
+    """0x0934 => ((6, 4), (4, 4), "Q")"""
+    start, end = code & 63, (code >> 6) & 63
+    return (start >> 3, start & 7), (end >> 3, end & 7), PROMOTION_CHOICES[(code >> 12) & 3]
+
+
 
 class Board:
     def __init__(self):
@@ -31,18 +81,26 @@ class Board:
 
         ##################################
         # Fields for en-passant handling
-        self.last_move = None  # Tracks the last move made: 3 value tuple : piece,start,destination
-        self.en_passant_square = None
-        self.en_passant_end_location = None
-        self.en_passanting_pawns = []
+        self.last_move = None  # Tracks the last move made: 4 value tuple : piece,start,destination,captured
+        self.en_passant_location = None  # Square skipped by a two-square pawn move on the last turn, if any
 
         ##################################
         # Fields for check system
         self.check_location = None
+        self.checked_color = None  # Color whose king is in check after the last move (None: no check)
+        self.turn_destinations = []  # Squares pieces moved to during the current move (castling moves two)
+        self.turn_vacated = []  # Squares emptied during the current move (start squares, en passant victim)
+
+        ##################################
+        # Fields for draw detection (repetition and fifty-move rule)
+        self.halfmove_clock = 0  # Half-moves since the last pawn move or capture
+        self.fullmove_number = 1  # Starts at 1, incremented after every black move
+        self.position_history = []  # Position hash after every move, oldest first
 
         ##################################
         # Initialize the board (not based on the viewing angle anymore)
         self.initialize_board()
+        self.position_history.append(self.get_position_hash("white"))
 
     ##################################
     """ init methods """
@@ -145,6 +203,163 @@ class Board:
             if isinstance(piece, Pawn):
                 self.capture_piece(piece)"""
 
+    ##################################
+    """ Notation: FEN import / export, SAN parsing """
+
+    @classmethod
+    def from_fen(cls, fen: str):
+        """
+        Builds a board from a FEN string. The move counters are optional, so the first
+        four fields of an EPD line are accepted as well.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        placement, turn, castling, en_passant = fields[:4]
+
+        board = cls()
+
+        # Start from an empty board
+        for row in board.squares:
+            for square in row:
+                square.piece = None
+        board.white_pieces, board.black_pieces = [], []
+        board.white_king = board.black_king = None
+        board.white_king_rook = board.black_king_rook = None
+        board.white_queen_rook = board.black_queen_rook = None
+
+        ranks = placement.split("/")
+        if len(ranks) != 8:
+            raise ValueError(f"Invalid FEN placement: {placement!r}")
+
+        for row, rank in enumerate(ranks):
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                if char.lower() not in FEN_PIECE_TYPES or col > 7:
+                    raise ValueError(f"Invalid FEN placement: {placement!r}")
+
+                color = "white" if char.isupper() else "black"
+                square = board.squares[row][col]
+                piece = FEN_PIECE_TYPES[char.lower()](color, square)
+                square.set_piece(piece)
+                (board.white_pieces if color == "white" else board.black_pieces).append(piece)
+
+                if isinstance(piece, King):
+                    if color == "white":
+                        board.white_king = piece
+                    else:
+                        board.black_king = piece
+                col += 1
+
+        if not board.white_king or not board.black_king:
+            raise ValueError(f"FEN needs both kings: {placement!r}")
+
+        # Castling rights => has_moved flags of the kings and the corner rooks
+        for letter, (row, col) in zip(CASTLING_LETTERS, [(7, 7), (7, 0), (0, 7), (0, 0)]):
+            color = "white" if letter.isupper() else "black"
+            rook = board.squares[row][col].piece
+            if not (isinstance(rook, Rook) and rook.color == color):
+                rook = None
+            elif letter not in castling:
+                rook.has_moved = True
+
+            side = "king" if letter.lower() == "k" else "queen"
+            setattr(board, f"{color}_{side}_rook", rook)
+
+        board.white_king.has_moved = "K" not in castling and "Q" not in castling
+        board.black_king.has_moved = "k" not in castling and "q" not in castling
+
+        board.current_turn = "white" if turn == "w" else "black"
+        board.en_passant_location = None if en_passant == "-" else name_to_location(en_passant)
+
+        # Move counters are only present in full FEN
+        if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+            board.halfmove_clock = int(fields[4])
+            board.fullmove_number = int(fields[5])
+
+        board.position_history = [board.get_position_hash()]
+        board.checked_color = board.current_turn if board.is_in_check(board.current_turn) else None
+        return board
+
+    def to_fen(self) -> str:
+        """Returns the position as a FEN string."""
+        ranks = []
+        for row in self.squares:
+            rank, empty = "", 0
+            for square in row:
+                if not square.piece:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                letter = FEN_PIECE_LETTERS[type(square.piece)]
+                rank += letter.upper() if square.piece.color == "white" else letter
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        turn = "w" if self.current_turn == "white" else "b"
+        en_passant = location_to_name(self.en_passant_location) if self.en_passant_location else "-"
+        return (f"{'/'.join(ranks)} {turn} {self.get_castling_rights()} {en_passant} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def parse_san(self, san: str):
+        """
+        Finds the legal move of the side to move written in Standard Algebraic Notation ("Nbd7", "exd5",
+        "e8=Q+", "O-O"). Returns (start_location, end_location, promotion_choice); raises ValueError if
+        the move is illegal or ambiguous.
+        """
+        move_text = san.rstrip("+#!?")
+        row = 7 if self.current_turn == "white" else 0
+        legal_moves = self.get_legal_moves(self.current_turn)
+
+        if move_text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            end_location = (row, 6) if len(move_text) == 3 else (row, 2)
+            if ((row, 4), end_location) in legal_moves and isinstance(self.squares[row][4].piece, King):
+                return (row, 4), end_location, "Q"
+            raise ValueError(f"Illegal move: {san}")
+
+        match = SAN_PATTERN.match(move_text)
+        if not match:
+            raise ValueError(f"Invalid SAN: {san}")
+        piece_letter, from_file, from_rank, destination, promotion_choice = match.groups()
+        piece_type = FEN_PIECE_TYPES[piece_letter.lower()] if piece_letter else Pawn
+        end_location = name_to_location(destination)
+
+        candidates = []
+        for start_location, move in legal_moves:
+            if move != end_location or type(self.get_square(start_location).piece) != piece_type:
+                continue
+            if from_file and "abcdefgh".index(from_file) != start_location[1]:
+                continue
+            if from_rank and 8 - int(from_rank) != start_location[0]:
+                continue
+            candidates.append(start_location)
+
+        if len(candidates) != 1:
+            raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} move: {san}")
+        return candidates[0], end_location, promotion_choice or "Q"
+
+    def parse_uci(self, uci: str):
+        """
+        Checks a move of the side to move written in UCI long algebraic notation ("e2e4", "e7e8n").
+        Returns (start_location, end_location, promotion_choice); raises ValueError if the move is illegal.
+        """
+        if len(uci) not in (4, 5) or (len(uci) == 5 and uci[4].upper() not in "QRBN"):
+            raise ValueError(f"Invalid UCI move: {uci}")
+        try:
+            start_location, end_location = name_to_location(uci[:2]), name_to_location(uci[2:4])
+        except (ValueError, IndexError):
+            raise ValueError(f"Invalid UCI move: {uci}")
+
+        if (start_location, end_location) not in self.get_legal_moves(self.current_turn):
+            raise ValueError(f"Illegal move: {uci}")
+        return start_location, end_location, uci[4].upper() if len(uci) == 5 else "Q"
+
     ##################################
     """ general methods """
 
@@ -160,13 +375,85 @@ class Board:
         # probably the first method in the main game loop.
         """
         self.current_turn = "black" if self.current_turn == "white" else "white"
-        pygame.mixer.Sound(f'sounds/{self.sound}.mp3').play()
+        sound_bank.play(self.sound)
+
+    def get_castling_rights(self) -> str:
+        """Returns the castling rights in FEN form ("KQkq", "Kq", "-" ...)."""
+        rights = ""
+        rooks = [self.white_king_rook, self.white_queen_rook, self.black_king_rook, self.black_queen_rook]
+        for letter, rook in zip(CASTLING_LETTERS, rooks):
+            king = self.white_king if letter.isupper() else self.black_king
+            if not king.has_moved and rook and not rook.has_moved and rook.current_square:
+                rights += letter
+        return rights or "-"
+
+    def get_position_hash(self, color: str = None) -> int:
+        """
+        Zobrist hash of the position with {color} to move (defaults to the current turn):
+        piece placement, castling rights and the en passant file.
+        """
+        color = color or self.current_turn
+        position_hash = ZOBRIST_BLACK_TO_MOVE if color == "black" else 0
+
+        for piece in self.white_pieces + self.black_pieces:
+            row, col = piece.current_square.location
+            position_hash ^= ZOBRIST_PIECE_KEYS[(type(piece), piece.color)][row * 8 + col]
+
+        # Castling rights: the king and the matching rook are both unmoved and still on the board
+        castling_rights = self.get_castling_rights()
+        for i, letter in enumerate(CASTLING_LETTERS):
+            if letter in castling_rights:
+                position_hash ^= ZOBRIST_CASTLING_KEYS[i]
+
+        # En passant: the last move was a pawn moving two squares forward
+        if self.en_passant_location:
+            position_hash ^= ZOBRIST_EN_PASSANT_KEYS[self.en_passant_location[1]]
+
+        return position_hash
+
+    def get_legal_moves(self, color: str) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """
+        Returns all legal moves for {color} as (start_location, end_location) tuples.
+        Moves are generated once per position and served from the shared legal_move_cache afterwards,
+        so the returned list must not be modified.
+        """
+        key = (self.get_position_hash(color), color)
+        legal_moves = legal_move_cache.get(key)
+
+        if legal_moves is None:
+            legal_moves = []
+            pieces = self.white_pieces if color == "white" else self.black_pieces
+
+            # filter_moves temporarily edits the piece lists, so iterate over a copy
+            for piece in list(pieces):
+                unfiltered_moves = piece.get_unfiltered_moves(self)
+                for move in self.filter_moves(unfiltered_moves, piece):
+                    legal_moves.append((piece.current_square.location, move))
+
+            legal_move_cache.put(key, legal_moves)
+
+        return legal_moves
+
+    def get_cached_legal_moves(self, color: str, position_hash: int = None):
+        """
+        get_legal_moves if the position is already in the legal_move_cache, None otherwise (nothing is generated).
+        position_hash: get_position_hash(color), when the caller already has it.
+        """
+        if position_hash is None:
+            position_hash = self.get_position_hash(color)
+        return legal_move_cache.peek((position_hash, color))
+
+    def cache_legal_moves(self, color: str, legal_moves, position_hash: int = None):
+        """Stores a complete legal move list generated outside get_legal_moves (see AIBot.pick_moves)."""
+        if position_hash is None:
+            position_hash = self.get_position_hash(color)
+        legal_move_cache.put((position_hash, color), legal_moves)
 
     def highlight_moves(self, square):
         self.highlighted_square = square
 
-        unfiltered_moves = square.piece.get_unfiltered_moves(self)
-        filtered_moves = self.filter_moves(unfiltered_moves, self.highlighted_square.piece)
+        filtered_moves = [end_location for start_location, end_location in self.get_legal_moves(square.piece.color)
+                          if start_location == square.location]
         self.highlighted_square_locations = filtered_moves
 
         # check all the moves that hold enemy team pieces
@@ -190,6 +477,7 @@ class Board:
         Captures a piece by removing it from the board and adding it to the graveyard.
         """
         # remove Piece from Square + add to graveyard
+        self.turn_vacated.append(piece.current_square.location)
         piece.current_square.remove_piece()
         self.graveyard.append(piece)
 
@@ -222,10 +510,21 @@ class Board:
         # Update the piece's current square reference
         piece.current_square = destination_square
 
+        # Squares that can give check (directly, or by discovery) once the move is complete
+        self.turn_vacated.append(start_square.location)
+        self.turn_destinations.append(destination_square.location)
+
         # Update last move - now with 4 values: moved piece, start square, destination square, and captured piece
         # used for general documentation and en-passant
         self.last_move = (piece, start_square, destination_square, captured_piece)
 
+        # Record the en passant target: the square skipped by a two-square pawn move (cleared by any other move)
+        start_row, col = start_square.location
+        if isinstance(piece, Pawn) and abs(start_row - destination_square.location[0]) == 2:
+            self.en_passant_location = ((start_row + destination_square.location[0]) // 2, col)
+        else:
+            self.en_passant_location = None
+
     def handle_en_passant(self):
         """
         Check if an EN-PASSANT move was made.
@@ -233,19 +532,14 @@ class Board:
         """
         piece, start_square, destination_square, captured_piece = self.last_move
 
-        # Ensure the moved piece is a Pawn and en passant is possible
-        if isinstance(piece, Pawn) and self.en_passant_end_location == destination_square.location:
-            # Check if the en passanting pawn matches to the current pawn and capture the opponent's pawn
-            if piece in self.en_passanting_pawns:
-                # Capture the opponent's pawn via en passant
-                self.capture_piece(self.en_passant_square.piece)
+        # A pawn that moved diagonally onto an empty square can only have captured en passant.
+        if isinstance(piece, Pawn) and not captured_piece and start_square.location[1] != destination_square.location[1]:
+            # Capture the opponent's pawn that stands next to our start square
+            passed_pawn_square = self.get_square((start_square.location[0], destination_square.location[1]))
+            if passed_pawn_square.piece:
+                self.capture_piece(passed_pawn_square.piece)
                 self.sound = "capture"
 
-        # Clear the en passant fields after the move
-        self.en_passant_end_location = None
-        self.en_passant_square = None
-        self.en_passanting_pawns = []
-
     def handle_castling(self):
         """
         Handle castling based on the last move information.
@@ -275,45 +569,56 @@ class Board:
                     rook_destination_square.piece.has_moved = True  # Update rook's has_moved status
                     self.sound = "castle"
 
-    def handle_player_pawn_promotion(self, graphics_manager):
+    def is_promotion_pending(self) -> bool:
+        """True if the last move brought a pawn to the last row of the board."""
+        piece, start_square, destination_square, captured_piece = self.last_move
+        return isinstance(piece, Pawn) and (
+                (piece.color == "white" and destination_square.location[0] == 0) or
+                (piece.color == "black" and destination_square.location[0] == 7))
+
+    def promote_pawn(self, promotion_choice):
         """
-        Handle pawn promotion when a pawn reaches the last row of the board using the last move information.
+        Replaces the pawn that just reached the last row with a Queen, Rook, Bishop or Knight
+        (promotion_choice "Q", "R", "B" or "N"). Does nothing if the last move was not a promotion.
         """
+        if not self.is_promotion_pending():
+            return
+
         piece, start_square, destination_square, captured_piece = self.last_move
 
-        if isinstance(piece, Pawn):
-            # Check if the pawn reached the last row (promotion row)
-            if (piece.color == "white" and destination_square.location[0] == 0) or \
-                    (piece.color == "black" and destination_square.location[0] == 7):
-
-                # Ask the player for the promotion choice via the GraphicsManager
-                promotion_choice = graphics_manager.ask_for_promotion_choice()
-
-                # Validate promotion choice and create the appropriate piece
-                if promotion_choice == "Q":
-                    promoted_piece = Queen(piece.color, destination_square)
-                elif promotion_choice == "R":
-                    promoted_piece = Rook(piece.color, destination_square)
-                elif promotion_choice == "B":
-                    promoted_piece = Bishop(piece.color, destination_square)
-                elif promotion_choice == "N":
-                    promoted_piece = Knight(piece.color, destination_square)
-                else:
-                    print("Invalid choice, defaulting to Queen.")
-                    promoted_piece = Queen(piece.color, destination_square)
-
-                # Remove the pawn from the board's piece list and add the new one
-                if piece.color == "white":
-                    self.white_pieces.remove(piece)
-                    self.white_pieces.append(promoted_piece)
-                else:
-                    self.black_pieces.remove(piece)
-                    self.black_pieces.append(promoted_piece)
-
-                # Replace the pawn with the promoted piece on the board
-                destination_square.piece = promoted_piece
-
-                self.sound = "promote"
+        # Validate promotion choice and create the appropriate piece
+        if promotion_choice == "Q":
+            promoted_piece = Queen(piece.color, destination_square)
+        elif promotion_choice == "R":
+            promoted_piece = Rook(piece.color, destination_square)
+        elif promotion_choice == "B":
+            promoted_piece = Bishop(piece.color, destination_square)
+        elif promotion_choice == "N":
+            promoted_piece = Knight(piece.color, destination_square)
+        else:
+            print("Invalid choice, defaulting to Queen.")
+            promoted_piece = Queen(piece.color, destination_square)
+
+        # Remove the pawn from the board's piece list and add the new one
+        if piece.color == "white":
+            self.white_pieces.remove(piece)
+            self.white_pieces.append(promoted_piece)
+        else:
+            self.black_pieces.remove(piece)
+            self.black_pieces.append(promoted_piece)
+
+        # Replace the pawn with the promoted piece on the board
+        destination_square.piece = promoted_piece
+
+        self.sound = "promote"
+
+    def handle_player_pawn_promotion(self, graphics_manager):
+        """
+        Handle pawn promotion when a pawn reaches the last row of the board using the last move information.
+        """
+        if self.is_promotion_pending():
+            # Ask the player for the promotion choice via the GraphicsManager
+            self.promote_pawn(graphics_manager.ask_for_promotion_choice())
 
     def execute_player_move(self, piece, destination_square, graphics_manager):
         self.move_piece(piece, destination_square)
@@ -327,6 +632,69 @@ class Board:
         self.handle_castling()
         self.handle_player_pawn_promotion(graphics_manager)
 
+        self.record_position()
+
+    def make_move(self, start_location, end_location, promotion_choice="Q"):
+        """
+        Plays a complete move (castling, en passant and promotion included) and passes the turn,
+        without asking the GUI or playing sounds. Used by the tools that replay games.
+        """
+        piece = self.get_square(start_location).piece
+        self.move_piece(piece, self.get_square(end_location))
+
+        # Mark the king or rook as having moved, if applicable
+        if isinstance(piece, (King, Rook)):
+            piece.has_moved = True
+
+        self.handle_en_passant()
+        self.handle_castling()
+        self.promote_pawn(promotion_choice)
+        self.record_position()
+
+        self.current_turn = "black" if self.current_turn == "white" else "white"
+
+    def record_position(self):
+        """
+        Called once a move is complete (after castling, en passant and promotion):
+        updates the halfmove clock and pushes the new position on the position history.
+        """
+        piece, _, _, captured_piece = self.last_move
+
+        # Pawn moves and captures are irreversible and restart the fifty-move count
+        # (an en passant capture is a pawn move, so it is covered as well)
+        if isinstance(piece, Pawn) or captured_piece:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        if piece.color == "black":
+            self.fullmove_number += 1
+
+        next_turn = "black" if piece.color == "white" else "white"
+        self.position_history.append(self.get_position_hash(next_turn))
+        self.update_check(piece.color)
+
+    ##################################
+    """ Draw detection """
+
+    def count_repetitions(self) -> int:
+        """
+        Returns how many times the current position occurred before.
+        Only positions since the last pawn move or capture can repeat, so only those are scanned.
+        """
+        current_position = self.position_history[-1]
+        recent_positions = self.position_history[-(self.halfmove_clock + 1):-1]
+        return recent_positions.count(current_position)
+
+    def is_threefold_repetition(self) -> bool:
+        return self.count_repetitions() >= 2
+
+    def is_fifty_move_draw(self) -> bool:
+        return self.halfmove_clock >= 100  # fifty moves by each side
+
+    def is_draw(self) -> bool:
+        return self.is_threefold_repetition() or self.is_fifty_move_draw()
+
     ##################################
     """ Check system """
 
@@ -366,21 +734,31 @@ class Board:
             target_square = self.get_square(move)
             target_piece = target_square.piece  # Save original piece at target square
 
+            # En passant: the captured pawn is not on the target square, and removing it can expose the king
+            if isinstance(piece, Pawn) and not target_piece and move[1] != original_square.location[1]:
+                target_square = self.get_square((original_square.location[0], move[1]))
+                target_piece = target_square.piece
+                target_square.piece = None
+                moved_to_square = self.get_square(move)
+            else:
+                moved_to_square = target_square
+
             # Temporarily remove target_piece from pieces if it exists
             if target_piece:
                 pieces.remove(target_piece)
 
             # Move the piece to the target square
             original_square.piece = None
-            target_square.piece = piece
-            piece.current_square = target_square
+            moved_to_square.piece = piece
+            piece.current_square = moved_to_square
 
             """ Test if in this setting the king is not safe """
-            check_threat_square = target_square if isinstance(piece, King) else king.current_square
+            check_threat_square = moved_to_square if isinstance(piece, King) else king.current_square
             if not self.get_threats_to_square(check_threat_square, piece.color):
                 safe_moves.append(move)
 
             """ Restore Board to original state """
+            moved_to_square.piece = None
             target_square.piece = target_piece  # Restore target piece
             if target_piece:
                 pieces.append(target_piece)  # Re-add to pieces
@@ -389,18 +767,95 @@ class Board:
 
         return safe_moves
 
-    def is_enemy_able_to_move(self):
-        # Determine enemy pieces based on the color of the current square's piece
-        enemy_pieces = self.black_pieces if self.current_turn == "white" else self.white_pieces
-
-        able_to_move = False
-        for piece in enemy_pieces:
-            unfiltered_moves = piece.get_unfiltered_moves(self)
-            filtered_moves = self.filter_moves(unfiltered_moves, piece)
-            if filtered_moves:  # If there are any valid moves
-                able_to_move = True
+    def attacks(self, piece, target_location) -> bool:
+        """True if {piece} attacks {target_location} on the current board (sliding pieces need a clear path)."""
+        row, col = piece.current_square.location
+        row_distance, col_distance = target_location[0] - row, target_location[1] - col
+        piece_type = type(piece)
+
+        if piece_type == Pawn:
+            return row_distance == (-1 if piece.color == "white" else 1) and abs(col_distance) == 1
+        if piece_type == Knight:
+            return (abs(row_distance), abs(col_distance)) in ((1, 2), (2, 1))
+        if piece_type == King:
+            return max(abs(row_distance), abs(col_distance)) == 1
+
+        orthogonal = row_distance == 0 or col_distance == 0
+        diagonal = abs(row_distance) == abs(col_distance)
+        if (row_distance == col_distance == 0 or not (orthogonal or diagonal)
+                or (piece_type == Rook and not orthogonal) or (piece_type == Bishop and not diagonal)):
+            return False
+
+        # Every square between the piece and the target must be empty
+        row_step, col_step = (row_distance > 0) - (row_distance < 0), (col_distance > 0) - (col_distance < 0)
+        for step in range(1, max(abs(row_distance), abs(col_distance))):
+            if self.squares[row + step * row_step][col + step * col_step].piece:
+                return False
+        return True
+
+    def is_discovered_attack(self, king_location, vacated_location, color) -> bool:
+        """True if a {color} rook, bishop or queen now attacks king_location through the vacated square."""
+        row_distance, col_distance = vacated_location[0] - king_location[0], vacated_location[1] - king_location[1]
+        orthogonal = row_distance == 0 or col_distance == 0
+        if (row_distance == col_distance == 0) or not (orthogonal or abs(row_distance) == abs(col_distance)):
+            return False
+
+        # First piece on the ray from the king through the vacated square
+        row_step, col_step = (row_distance > 0) - (row_distance < 0), (col_distance > 0) - (col_distance < 0)
+        row, col = king_location[0] + row_step, king_location[1] + col_step
+        while 0 <= row < 8 and 0 <= col < 8:
+            piece = self.squares[row][col].piece
+            if piece:
+                return piece.color == color and (type(piece) == Queen
+                                                 or type(piece) == (Rook if orthogonal else Bishop))
+            row, col = row + row_step, col + col_step
+        return False
+
+    def update_check(self, mover_color):
+        """
+        Incremental check detection, called once a move is complete: the enemy king can only be attacked
+        by a piece that just moved (direct check) or through a square that was just emptied (discovered check).
+        """
+        enemy_color = "black" if mover_color == "white" else "white"
+        king_location = (self.black_king if mover_color == "white" else self.white_king).current_square.location
+
+        in_check = False
+        for location in self.turn_destinations:
+            piece = self.get_square(location).piece  # after promotion: the new piece
+            if piece and piece.color == mover_color and self.attacks(piece, king_location):
+                in_check = True
                 break
-        return able_to_move
+        else:
+            in_check = any(self.is_discovered_attack(king_location, location, mover_color)
+                           for location in self.turn_vacated)
+
+        self.checked_color = enemy_color if in_check else None
+        self.turn_destinations, self.turn_vacated = [], []
+
+    def is_in_check(self, color: str) -> bool:
+        """True if the king of {color} is attacked (full scan; checked_color is the incremental equivalent)."""
+        king = self.white_king if color == "white" else self.black_king
+        return bool(self.get_threats_to_square(king.current_square, color))
+
+    def get_game_status(self):
+        """
+        Outcome for the side to move, without printing or sounds: "checkmate", "stalemate", "repetition",
+        "fifty_moves", or None while the game goes on. Used by the headless tools (the GUI uses check_board_state).
+        """
+        if not self.get_legal_moves(self.current_turn):
+            return "checkmate" if self.checked_color == self.current_turn else "stalemate"
+        if self.is_threefold_repetition():
+            return "repetition"
+        if self.is_fifty_move_draw():
+            return "fifty_moves"
+        return None
+
+    def is_enemy_able_to_move(self):
+        # Determine the enemy color based on the current turn
+        enemy_color = "black" if self.current_turn == "white" else "white"
+
+        # Shares the cached move list with highlighting and search
+        return bool(self.get_legal_moves(enemy_color))
 
     def check_board_state(self):
         """ checks whether the game has finished or not. """
@@ -410,14 +865,14 @@ class Board:
         # Check if any enemy piece can move
         enemy_able_to_move = self.is_enemy_able_to_move()
 
-        # Determine the enemy king and check for threats to its square
+        # Determine the enemy king; whether it is in check was tracked while the move was made
         enemy_king = self.black_king if self.current_turn == "white" else self.white_king
-        threats = self.get_threats_to_square(enemy_king.current_square, enemy_king.color)
+        in_check = self.checked_color == enemy_king.color
 
         # Update check location and check for checkmate or stalemate
 
         if not enemy_able_to_move:
-            if threats:
+            if in_check:
                 self.check_location = enemy_king.current_square.location
                 print("CHECKMATE!")
                 self.sound = "checkmate"
@@ -427,9 +882,20 @@ class Board:
 
             return True
 
-        if threats:
+        if in_check:
             self.check_location = enemy_king.current_square.location
             print("CHECK!")
             self.sound = "check"
 
+        # Draws by rule (checkmate on the last move still wins, so these are tested after it)
+        if self.is_threefold_repetition():
+            print("DRAW BY REPETITION!")
+            self.sound = "stalemate"
+            return True
+
+        if self.is_fifty_move_draw():
+            print("DRAW BY FIFTY-MOVE RULE!")
+            self.sound = "stalemate"
+            return True
+
         return False
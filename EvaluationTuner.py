@@ -0,0 +1,311 @@
+""" Texel-style tuning of the evaluation weights on positions labelled with their game result """
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import json
+import math
+import multiprocessing
+import re
+import sys
+
+import numpy as np
+
+from AIBot import PIECE_VALUES, PIECE_SQUARE_TABLES, EVALUATION_WEIGHTS, WEIGHTS_PATH
+from BatchEvaluator import (PIECE_CODES, POSITIONAL_TERMS, CHUNK_SIZE, boards_to_mailboxes, fen_to_mailbox,
+                            evaluate_mailboxes, positional_terms)
+from Board import Board
+from PgnReader import read_games, result_to_score
+from Piece import King
+
+# Weight vector layout: material (6, King included but frozen), piece-square tables (6 x 64), positional terms
+PIECE_TYPES = sorted(PIECE_CODES, key=PIECE_CODES.get)  # Pawn, Knight, Bishop, Rook, Queen, King
+MATERIAL_OFFSET = 0
+TABLE_OFFSET = len(PIECE_TYPES)
+POSITIONAL_OFFSET = TABLE_OFFSET + len(PIECE_TYPES) * 64
+NUM_WEIGHTS = POSITIONAL_OFFSET + len(POSITIONAL_TERMS)
+MAX_PIECES = 32  # Piece slots per position
+
+RESULT_PATTERN = re.compile(r"1-0|0-1|1/2-1/2")
+BRACKET_RESULT_PATTERN = re.compile(r"\[\s*(0(?:\.\d*)?|1(?:\.0*)?|\.5)\s*\]")
+
+DEFAULT_ITERATIONS = 200
+DEFAULT_LEARNING_RATE = 1.0  # Adam step size, in centipawns
+DEFAULT_SKIP_PLIES = 8  # PGN positions before this ply are opening theory, not evaluation signal
+
+
+##################################
+""" Reading labelled positions """
+
+
+def parse_labelled_line(line: str):
+    """
+    Splits a labelled FEN/EPD line into (fen, result). The result is the game outcome for white and can be
+    written as an EPD operation (c9 "1-0"; result "1/2-1/2";), a trailing 1-0 / 0-1 / 1/2-1/2 or [1.0] / [0.5] / [0.0].
+    """
+    fields = line.split()
+    fen, label = " ".join(fields[:4]), " ".join(fields[4:])
+
+    bracket_match = BRACKET_RESULT_PATTERN.search(label)
+    if bracket_match:
+        return fen, float(bracket_match.group(1))
+
+    result_match = RESULT_PATTERN.search(label)
+    if result_match:
+        return fen, result_to_score(result_match.group(0))
+
+    raise ValueError(f"No result label: {line.strip()}")
+
+
+def read_epd_positions(lines):
+    """Yields (mailbox bytes, result) for every labelled FEN/EPD line, skipping blank lines and comments."""
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fen, result = parse_labelled_line(line)
+        yield fen_to_mailbox(fen), result
+
+
+def read_pgn_positions(lines, skip_plies=DEFAULT_SKIP_PLIES):
+    """
+    Yields (mailbox bytes, result) for every position of every decided or drawn game, labelled with the
+    game's Result header. Games with an unknown result or an unreadable move are skipped (from that move on).
+    """
+    for headers, san_moves in read_games(lines):
+        result = result_to_score(headers.get("Result", "*"))
+        if result is None:
+            continue
+
+        board = Board.from_fen(headers["FEN"]) if "FEN" in headers else Board()
+        for ply, san in enumerate(san_moves):
+            try:
+                board.make_move(*board.parse_san(san))
+            except ValueError:
+                break
+            if ply + 1 >= skip_plies:
+                yield boards_to_mailboxes([board])[0].tobytes(), result
+
+
+def load_positions(positions):
+    """Packs a stream of (mailbox bytes, result) into an N x 64 int8 array and an N float64 array."""
+    mailbox_bytes = bytearray()
+    results = []
+    for mailbox, result in positions:
+        mailbox_bytes += mailbox
+        results.append(result)
+    mailboxes = np.frombuffer(bytes(mailbox_bytes), dtype=np.int8).reshape(-1, 64)
+    return mailboxes, np.array(results, dtype=np.float64)
+
+
+##################################
+""" Features """
+
+
+def build_features(mailboxes: np.ndarray):
+    """
+    Sparse linear features of each position, so that evaluation == features . weights:
+    - slot_indexes / slot_signs (N x MAX_PIECES x 2): for every piece, its material weight and its
+      piece-square weight (black squares mirrored), with sign +1 for white and -1 for black (0 = empty slot)
+    - positional (N x len(POSITIONAL_TERMS)): the positional terms of BatchEvaluator, white minus black
+    """
+    num_positions = len(mailboxes)
+    slot_indexes = np.zeros((num_positions, MAX_PIECES, 2), dtype=np.int32)
+    slot_signs = np.zeros((num_positions, MAX_PIECES), dtype=np.float64)
+
+    position_indexes, squares = np.nonzero(mailboxes)
+    codes = mailboxes[position_indexes, squares].astype(np.int64)
+    slots = np.arange(len(codes)) - np.searchsorted(position_indexes, position_indexes)  # piece number in position
+    table_squares = np.where(codes > 0, squares, squares ^ 56)  # 7 - row for black
+
+    slot_indexes[position_indexes, slots, 0] = MATERIAL_OFFSET + np.abs(codes) - 1
+    slot_indexes[position_indexes, slots, 1] = TABLE_OFFSET + (np.abs(codes) - 1) * 64 + table_squares
+    slot_signs[position_indexes, slots] = np.sign(codes)
+
+    positional = np.concatenate([positional_terms(mailboxes[start:start + CHUNK_SIZE])
+                                 for start in range(0, num_positions, CHUNK_SIZE)] or [np.zeros((0, len(POSITIONAL_TERMS)))])
+    return slot_indexes, slot_signs, positional.astype(np.float64)
+
+
+def current_weights() -> np.ndarray:
+    """The evaluation weights currently used by AIBot, as a flat vector."""
+    weights = np.zeros(NUM_WEIGHTS)
+    for index, piece_type in enumerate(PIECE_TYPES):
+        weights[MATERIAL_OFFSET + index] = PIECE_VALUES[piece_type]
+        weights[TABLE_OFFSET + index * 64:TABLE_OFFSET + (index + 1) * 64] = np.ravel(PIECE_SQUARE_TABLES[piece_type])
+    for index, term in enumerate(POSITIONAL_TERMS):
+        weights[POSITIONAL_OFFSET + index] = EVALUATION_WEIGHTS[term]
+    return weights
+
+
+def weights_to_json(weights: np.ndarray) -> dict:
+    """Rounds the weight vector to integer centipawns, in the weights file format AIBot loads."""
+    weights = np.rint(weights).astype(int)
+    return {
+        "piece_values": {piece_type.__name__: int(weights[MATERIAL_OFFSET + index])
+                         for index, piece_type in enumerate(PIECE_TYPES)},
+        "piece_square_tables": {
+            piece_type.__name__: weights[TABLE_OFFSET + index * 64:TABLE_OFFSET + (index + 1) * 64]
+            .reshape(8, 8).tolist()
+            for index, piece_type in enumerate(PIECE_TYPES)},
+        "evaluation_weights": {term: int(weights[POSITIONAL_OFFSET + index])
+                               for index, term in enumerate(POSITIONAL_TERMS)},
+    }
+
+
+##################################
+""" Loss and gradient (run in worker processes, one shard per task) """
+
+shards = []  # [(slot_indexes, slot_signs, positional, results), ...], set once per worker by init_worker
+
+
+def init_worker(worker_shards):
+    """Pool initializer: the shards are handed over once, tasks then only carry a shard index and the weights."""
+    global shards
+    shards = worker_shards
+
+
+def shard_evaluations(shard, weights: np.ndarray) -> np.ndarray:
+    slot_indexes, slot_signs, positional, _ = shard
+    return (weights[slot_indexes].sum(axis=2) * slot_signs).sum(axis=1) + positional @ weights[POSITIONAL_OFFSET:]
+
+
+def sigmoid(evaluations: np.ndarray, k: float) -> np.ndarray:
+    """Expected score for white of a position evaluated at {evaluations} centipawns."""
+    return 1.0 / (1.0 + np.power(10.0, -k * evaluations / 400.0))
+
+
+def shard_loss(task):
+    """Sum of squared errors of a shard, for a (shard index, weights, k) task."""
+    index, weights, k = task
+    shard = shards[index]
+    return float(((shard[3] - sigmoid(shard_evaluations(shard, weights), k)) ** 2).sum())
+
+
+def shard_gradient(task):
+    """(sum of squared errors, its gradient with respect to the weights) of a shard, for a (shard index, weights, k) task."""
+    index, weights, k = task
+    slot_indexes, slot_signs, positional, results = shard = shards[index]
+    predictions = sigmoid(shard_evaluations(shard, weights), k)
+    errors = results - predictions
+
+    # d(error^2)/d(evaluation), then spread over the weights each position uses
+    evaluation_gradient = -2.0 * errors * predictions * (1.0 - predictions) * k * math.log(10) / 400.0
+    slot_gradient = (evaluation_gradient[:, None] * slot_signs).ravel()
+    gradient = (np.bincount(slot_indexes[:, :, 0].ravel(), weights=slot_gradient, minlength=NUM_WEIGHTS)
+                + np.bincount(slot_indexes[:, :, 1].ravel(), weights=slot_gradient, minlength=NUM_WEIGHTS))
+    gradient[POSITIONAL_OFFSET:] += positional.T @ evaluation_gradient
+    return float((errors ** 2).sum()), gradient
+
+
+##################################
+""" Optimisation """
+
+
+class Tuner:
+    def __init__(self, mailboxes: np.ndarray, results: np.ndarray, workers=None):
+        self.num_positions = len(results)
+        self.workers = max(1, min(workers or os.cpu_count() or 1, self.num_positions))
+
+        features = build_features(mailboxes)
+        self.check_features(mailboxes, features)
+
+        bounds = np.linspace(0, self.num_positions, self.workers + 1).astype(int)
+        worker_shards = [tuple(array[start:end] for array in (*features, results))
+                         for start, end in zip(bounds[:-1], bounds[1:])]
+        self.pool = multiprocessing.Pool(self.workers, initializer=init_worker, initargs=(worker_shards,))
+
+    @staticmethod
+    def check_features(mailboxes, features):
+        """The linear model must reproduce the engine's evaluation exactly, or the tuned weights are meaningless."""
+        sample = slice(0, min(len(mailboxes), 10000))
+        linear_scores = shard_evaluations(tuple(array[sample] for array in features) + (None,), current_weights())
+        if not np.array_equal(np.rint(linear_scores).astype(np.int64), evaluate_mailboxes(mailboxes[sample])):
+            raise RuntimeError("Tuning features do not match the evaluation function")
+
+    def tasks(self, weights, k):
+        return [(index, weights, k) for index in range(self.workers)]
+
+    def loss(self, weights, k) -> float:
+        """Mean squared error of the predicted game results."""
+        return sum(self.pool.map(shard_loss, self.tasks(weights, k))) / self.num_positions
+
+    def gradient(self, weights, k):
+        losses_and_gradients = self.pool.map(shard_gradient, self.tasks(weights, k))
+        return (sum(loss for loss, _ in losses_and_gradients) / self.num_positions,
+                sum(gradient for _, gradient in losses_and_gradients) / self.num_positions)
+
+    def fit_k(self, weights, low=0.05, high=4.0, steps=40) -> float:
+        """Scaling constant of the sigmoid that best fits the current weights (golden-section search)."""
+        ratio = (math.sqrt(5) - 1) / 2
+        for _ in range(steps):
+            left, right = high - ratio * (high - low), low + ratio * (high - low)
+            if self.loss(weights, left) < self.loss(weights, right):
+                high = right
+            else:
+                low = left
+        return (low + high) / 2
+
+    def tune(self, weights, k, iterations=DEFAULT_ITERATIONS, learning_rate=DEFAULT_LEARNING_RATE, log=sys.stderr):
+        """Adam on the full batch. The king's value is frozen (it cancels out and only needs to stay large)."""
+        trainable = np.ones(NUM_WEIGHTS)
+        trainable[MATERIAL_OFFSET + PIECE_TYPES.index(King)] = 0
+        first_moment, second_moment = np.zeros(NUM_WEIGHTS), np.zeros(NUM_WEIGHTS)
+        beta1, beta2, epsilon = 0.9, 0.999, 1e-12
+
+        for iteration in range(1, iterations + 1):
+            loss, gradient = self.gradient(weights, k)
+            gradient *= trainable
+            first_moment = beta1 * first_moment + (1 - beta1) * gradient
+            second_moment = beta2 * second_moment + (1 - beta2) * gradient ** 2
+            step = (first_moment / (1 - beta1 ** iteration)) / (np.sqrt(second_moment / (1 - beta2 ** iteration)) + epsilon)
+            weights = weights - learning_rate * step
+            if log and (iteration % 10 == 0 or iteration == 1):
+                print(f"iteration {iteration}: loss {loss:.6f}", file=log)
+
+        return weights
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the evaluation weights on positions labelled with game results.")
+    parser.add_argument("input", nargs="?", help="labelled FEN/EPD file, or PGN with --pgn (default: stdin)")
+    parser.add_argument("--pgn", action="store_true", help="read PGN games, labelling positions with the game result")
+    parser.add_argument("--skip-plies", type=int, default=DEFAULT_SKIP_PLIES, help="PGN opening plies to skip")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--learning-rate", type=float, default=DEFAULT_LEARNING_RATE)
+    parser.add_argument("--k", type=float, default=None, help="sigmoid scaling constant (default: fitted)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--output", default=WEIGHTS_PATH, help="weights file to write (default: the one AIBot loads)")
+    args = parser.parse_args()
+
+    lines = open(args.input) if args.input else sys.stdin
+    with lines:
+        positions = read_pgn_positions(lines, args.skip_plies) if args.pgn else read_epd_positions(lines)
+        mailboxes, results = load_positions(positions)
+    if not len(results):
+        sys.exit("No labelled positions")
+    print(f"{len(results)} positions", file=sys.stderr)
+
+    tuner = Tuner(mailboxes, results, args.workers)
+    try:
+        weights = current_weights()
+        k = args.k if args.k is not None else tuner.fit_k(weights)
+        print(f"K = {k:.4f}, initial loss {tuner.loss(weights, k):.6f}", file=sys.stderr)
+
+        weights = tuner.tune(weights, k, args.iterations, args.learning_rate)
+        print(f"final loss {tuner.loss(np.rint(weights), k):.6f}", file=sys.stderr)
+    finally:
+        tuner.close()
+
+    with open(args.output, "w") as weights_file:
+        json.dump(weights_to_json(weights), weights_file, indent=1)
+    print(f"weights written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
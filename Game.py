@@ -1,52 +1,290 @@
 import copy
+import os
+import time
 
 import pygame
-from pygame import MOUSEBUTTONDOWN, QUIT
+from pygame import MOUSEBUTTONDOWN, MOUSEMOTION, QUIT
 
 from AIBot import AIBot
-from Board import Board
+from BackgroundAnalysis import BackgroundAnalysis, format_score
+from Board import Board, FEN_PIECE_LETTERS, encode_move, decode_move, location_to_name
+from GameClock import GameClock
+from GameRecord import GameRecorder, read_record
+from MonteCarloSearch import MonteCarloSearch
+from OpeningExplorer import OPENING_INDEX_PATH, PositionIndex, format_stats
+from Piece import Pawn
+from SharedTranspositionTable import SharedTranspositionTable
+from SoundBank import sound_bank
+
+FPS_CAP = 60  # Upper bound on redraws per second
+EXPLORER_MOVES_SHOWN = 8
+ANALYSIS_POLL_MS = 50  # While analysing, input waits at most this long before the analysis results are read
+ANALYSIS_PV_SHOWN = 8  # Moves of the principal variation written under the board
+CLOCK_POLL_MS = 100  # While a clock runs, input waits at most this long before the clocks are redrawn
+AUTOSAVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "saves", "autosave.icgr")
 
 
 # manages the board and graphics_manager
 class Game:
-    def __init__(self, graphics_manager):
-        # Ask if the user wants to play with bot or in hot seat
-        self.ai_enabled = graphics_manager.ask_for_mode()
-        self.viewing_angle = graphics_manager.ask_for_color()
+    def __init__(self, graphics_manager, resume_path=None, time_control=None, ponder=True, monte_carlo_workers=None):
+        """
+        time_control: (seconds per player, increment in seconds) for a game with clocks, None without.
+        ponder: let the bot search on the human's time.
+        monte_carlo_workers: playout processes of the Monte Carlo tree search engine mode (0: playouts in this
+        process), None for the alpha-beta search.
+        """
+        record = read_record(resume_path) if resume_path else None
+
+        if record:
+            # The mode, colors and time control of a resumed game come from its record
+            self.ai_enabled = record.ai_color is not None
+            self.viewing_angle = record.viewing_angle
+            time_control = record.metadata.get("time_control")
+        else:
+            # Ask if the user wants to play with bot or in hot seat
+            self.ai_enabled = graphics_manager.ask_for_mode()
+            self.viewing_angle = graphics_manager.ask_for_color()
         pygame.display.set_caption("Irad's Chess Game")
 
         # AI player creation
         if self.ai_enabled:
-            ai_bot_color = "black" if self.viewing_angle == "white" else "white"
+            ai_bot_color = record.ai_color if record else ("black" if self.viewing_angle == "white" else "white")
             self.ai_bot = AIBot(self, ai_bot_color)
 
-        # Initialize the board based on the selected viewing angle
-        self.board = Board()
-        pygame.mixer.Sound(f'sounds/start.mp3').play()
+        # Pondering: a worker process searches the position after the human's expected reply, writing into
+        # a transposition table the bot shares with it
+        self.ponder = None
+        if self.ai_enabled and ponder and monte_carlo_workers is None:
+            self.ai_bot.transposition_table = SharedTranspositionTable()
+            self.ponder = BackgroundAnalysis(self.ai_bot.transposition_table.name)
 
-        self.move_log = []  # To store all board states
-        self.current_log_index = -1  # Tracks current position in the move log
-        self.save_board_state()
+        # Monte Carlo tree search engine mode: the bot picks its moves by playouts, keeping the tree between moves
+        self.monte_carlo = None
+        if self.ai_enabled and monte_carlo_workers is not None:
+            self.monte_carlo = MonteCarloSearch(monte_carlo_workers)
 
         self.graphics_manager = graphics_manager
         self.game_on = True  # for run_game
         self.finished = False  # for turn to stop when game ends
+        self.time_control = tuple(time_control) if time_control else None
+        self.drawn_clock_texts = None  # what the clocks showed when they were last drawn
+
+        # Every move is appended to the save file as it is played
+        if record:
+            self.resume_game(record, resume_path)
+        else:
+            self.start_new_game()
+        sound_bank.play("start")
+
+        # Opening explorer (toggled with E), available once an index was built (see OpeningExplorer.py)
+        self.opening_index = PositionIndex(OPENING_INDEX_PATH) if os.path.exists(OPENING_INDEX_PATH) else None
+        self.show_explorer = False
+
+        # Background analysis of the displayed position (toggled with A); the worker starts on first use
+        self.analysis = None
+        self.show_analysis = False
+
+        # Fields for the event-driven loop
+        self.clock = pygame.time.Clock()
+        self.needs_redraw = True  # set whenever something visible changes (move, highlight, viewing angle)
 
     ###########################################################
     """ Helper functions """
 
     def switch_viewing_angle(self):
         self.viewing_angle = "black" if self.viewing_angle == "white" else "white"
-        pygame.mixer.Sound(f'sounds/switch.mp3').play()
+        sound_bank.play("switch")
+
+    def save_board_state(self, move=None):
+        """
+        Store a deep copy of the current board state in the move log, and append the move that led to it
+        ((start_location, end_location), None for the starting position) to the save file.
+        """
+        if move is None and self.move_log:
+            return  # nothing was played
 
-    def save_board_state(self):
-        """Store a deep copy of the current board state in the move log."""
         board_copy = copy.deepcopy(self.board)
         # If you are making a new move, remove future states (for correct redo functionality)
-        self.move_log = self.move_log[:self.current_log_index + 1]
+        if len(self.move_log) > self.current_log_index + 1:
+            self.move_log = self.move_log[:self.current_log_index + 1]
+            self.move_codes = self.move_codes[:self.current_log_index]
+            self.recorder.truncate(self.current_log_index)
         self.move_log.append(board_copy)
         self.current_log_index += 1
 
+        if move:
+            code = self.encode_last_move(*move)
+            self.move_codes.append(code)
+            now = time.perf_counter()
+            move_seconds = now - self.last_move_time
+            if self.game_clock:
+                # Press the clock: the mover gets the increment, the next player's time starts running
+                move_seconds = self.game_clock.press(None if self.finished else self.board.current_turn)
+            self.recorder.append_move(code, int(move_seconds * 1000))
+            self.last_move_time = now
+
+    def encode_last_move(self, start_location, end_location) -> int:
+        """16-bit code of the move just played on self.board, including the promotion choice."""
+        moved_piece = self.board.last_move[0]  # a castling rook is moved last, but never promotes
+        promotion_choice = "Q"
+        if isinstance(moved_piece, Pawn) and end_location[0] in (0, 7):
+            promotion_choice = FEN_PIECE_LETTERS[type(self.board.get_square(end_location).piece)].upper()
+        return encode_move(start_location, end_location, promotion_choice)
+
+    ###########################################################
+    """ Save / resume """
+
+    def start_new_game(self):
+        self.board = Board()
+        self.move_log = []  # Board states; None for positions not rebuilt yet (see get_logged_board)
+        self.move_codes = []  # move_codes[i] leads from move_log[i] to move_log[i + 1]
+        self.current_log_index = -1  # Tracks current position in the move log
+        self.finished = False
+        self.lost_on_time = None  # color whose clock ran out
+
+        ai_color = self.ai_bot.color if self.ai_enabled else None
+        metadata = {"created": time.strftime("%Y-%m-%d %H:%M:%S")}
+        if self.time_control:
+            metadata["time_control"] = list(self.time_control)
+        self.recorder = GameRecorder.create(AUTOSAVE_PATH, self.board.to_fen(), ai_color, self.viewing_angle, metadata)
+        self.last_move_time = time.perf_counter()
+
+        self.game_clock = GameClock(*self.time_control) if self.time_control else None
+        if self.game_clock:
+            self.game_clock.start(self.board.current_turn)
+        self.save_board_state()
+
+    def resume_game(self, record, path):
+        """
+        Rebuilds the game from a record: the moves are replayed once on a single board (GameRecord.replay),
+        and the intermediate positions of the move log are only rebuilt if the player goes back to them.
+        """
+        start_board = Board.from_fen(record.start_fen)
+        self.board = record.replay()
+        status = None
+        if record.moves:
+            # Only the final position needs the state a live move leaves behind (check highlight, sound, turn)
+            last_mover = "black" if self.board.current_turn == "white" else "white"
+            status = self.finish_replayed_move(self.board, last_mover)
+
+        self.move_codes = list(record.moves)
+        self.move_log = [start_board] + [None] * (len(self.move_codes) - 1) + [copy.deepcopy(self.board)]
+        self.move_log = self.move_log[:len(self.move_codes) + 1]
+        self.current_log_index = len(self.move_codes)
+        self.finished = status is not None
+        self.lost_on_time = None
+
+        self.recorder = GameRecorder.resume(path, record)
+        self.last_move_time = time.perf_counter()
+
+        # The clocks are rebuilt from the time every recorded move took
+        self.game_clock = None
+        if self.time_control and record.move_times is not None:
+            self.game_clock = GameClock.from_move_times(*self.time_control, record.move_times, start_board.current_turn)
+            if not self.finished:
+                self.game_clock.start(self.board.current_turn)
+
+    @staticmethod
+    def replay_move(board, code):
+        """
+        Plays a recorded move like a live one (turn, check highlight and sound included), without the GUI.
+        Returns the game status after the move (see Board.get_game_status).
+        """
+        mover = board.current_turn
+        board.make_move(*decode_move(code))
+        return Game.finish_replayed_move(board, mover)
+
+    @staticmethod
+    def finish_replayed_move(board, mover):
+        """Sets what a live move by {mover} leaves on {board} besides the move itself; returns the game status."""
+        status = board.get_game_status()
+        king = board.white_king if board.current_turn == "white" else board.black_king
+        board.check_location = king.current_square.location if board.checked_color == board.current_turn else None
+        if status:
+            board.sound = "checkmate" if status == "checkmate" else "stalemate"
+            board.current_turn = mover  # a finished game keeps the last mover's turn, like check_board_state
+        elif board.check_location:
+            board.sound = "check"
+        return status
+
+    def get_logged_board(self, index):
+        """Copy of the board state at {index} in the move log, replaying moves from the closest stored state."""
+        if self.move_log[index] is None:
+            start = max(i for i in range(index) if self.move_log[i] is not None)
+            board = copy.deepcopy(self.move_log[start])
+            for code in self.move_codes[start:index]:
+                self.replay_move(board, code)
+            self.move_log[index] = board
+        return copy.deepcopy(self.move_log[index])
+
+    ###########################################################
+    """ Clocks """
+
+    def update_clocks(self):
+        """Ends the game when the player to move runs out of time, and asks for a redraw when the clocks change."""
+        flagged_color = self.game_clock.flagged_color()
+        if flagged_color and not self.finished and self.current_log_index == len(self.move_log) - 1:
+            self.game_clock.stop()
+            self.finished = True
+            self.lost_on_time = flagged_color
+            print(f"{flagged_color.upper()} LOST ON TIME!")
+            sound_bank.play("checkmate")
+
+        texts = ({color: self.game_clock.format_time(color) for color in ("white", "black")}, self.game_clock.running_color)
+        if texts != self.drawn_clock_texts:
+            self.drawn_clock_texts = texts
+            self.needs_redraw = True
+
+    ###########################################################
+    """ Background analysis """
+
+    def toggle_analysis(self):
+        self.show_analysis = not self.show_analysis
+        if self.show_analysis and self.analysis is None:
+            self.analysis = BackgroundAnalysis()
+        elif not self.show_analysis:
+            self.analysis.pause()
+            self.graphics_manager.invalidate()  # repaint the squares under the analysis overlay
+
+    def update_analysis(self):
+        """
+        Points the analysis at the displayed position, or pauses it while the bot thinks (they would
+        share the CPU), then collects the worker's results. Never waits for the worker.
+        """
+        bot_thinking = (self.ai_enabled and self.board.current_turn == self.ai_bot.color
+                        and self.current_log_index == len(self.move_log) - 1 and not self.finished)
+        # A finished game keeps the last mover's turn, there is nothing left to analyse
+        if bot_thinking or self.finished:
+            self.analysis.pause()
+        else:
+            self.analysis.set_position(self.board)
+
+        if self.analysis.poll():
+            self.needs_redraw = True
+
+    def draw_analysis(self):
+        result = self.analysis.result
+        if self.finished:
+            # After a checkmate, the winner is the last mover, whose turn it still is
+            if self.lost_on_time:
+                white_share = 0.0 if self.lost_on_time == "white" else 1.0
+            elif self.board.sound == "checkmate":
+                white_share = 1.0 if self.board.current_turn == "white" else 0.0
+            else:
+                white_share = 0.5
+            self.graphics_manager.draw_analysis(self.viewing_angle, white_share, "game over")
+            return
+        if result is None:
+            self.graphics_manager.draw_analysis(self.viewing_angle, 0.5, "analysing...")
+            return
+
+        depth, score, pv = result
+        white_share = 1 / (1 + 10 ** (-max(min(score, 2000), -2000) / 400))  # mates fill the bar
+        moves = " ".join(location_to_name(start) + location_to_name(end) for start, end in pv[:ANALYSIS_PV_SHOWN])
+        self.graphics_manager.draw_analysis(self.viewing_angle, white_share,
+                                            f"depth {depth}  {format_score(score, depth)}  {moves}",
+                                            pv[0] if pv else None)
+
     ###########################################################
     """ Input processing methods for human player in run_game() """
 
@@ -78,6 +316,7 @@ class Game:
 
             # Case 2.3: Move highlighted piece if the square is a valid move
             elif square_location in self.board.highlighted_square_locations:
+                start_location = highlighted_square.location
                 self.board.execute_player_move(highlighted_square.piece, square, self.graphics_manager)
 
                 # Check game state and handle turn switching
@@ -85,11 +324,11 @@ class Game:
                 if not self.finished:
                     self.board.switch_turn()
                 else:
-                    pygame.mixer.Sound(f'sounds/{self.board.sound}.mp3').play()
+                    sound_bank.play(self.board.sound)
 
                 # Clear highlights and save the board state
                 self.board.clear_highlights()
-                self.save_board_state()
+                self.save_board_state((start_location, square_location))
 
             # Case 2.4: If the selected square is invalid, clear the highlights
             else:
@@ -99,47 +338,64 @@ class Game:
         match event.key:
             case pygame.K_v:
                 self.switch_viewing_angle()
+            case pygame.K_e:
+                self.show_explorer = not self.show_explorer and self.opening_index is not None
+            case pygame.K_a:
+                self.toggle_analysis()
             case pygame.K_r:
-                self.board = Board()
-                self.move_log = []  # To store all board states
-                self.current_log_index = -1  # Tracks current position in the move log
-                self.save_board_state()
-                pygame.mixer.Sound(f'sounds/start.mp3').play()
-                self.finished = False
+                self.recorder.close()
+                self.start_new_game()
+                if self.ponder:
+                    # A ponder search of the old game must not be taken for a ponderhit in the new one
+                    self.ponder.pause()
+                    self.ai_bot.ponder_hash = None
+                if self.monte_carlo:
+                    self.monte_carlo.set_root(self.board)  # the tree of the old game is dropped
+                sound_bank.play("start")
 
             case pygame.K_LEFT:  # Move back in the move log
                 if self.current_log_index > 0:
-                    pygame.mixer.Sound(f'sounds/{self.board.sound}.mp3').play() # sound of last move
+                    sound_bank.play(self.board.sound) # sound of last move
 
                     self.current_log_index -= 1
-                    self.board = copy.deepcopy(self.move_log[self.current_log_index])
+                    self.board = self.get_logged_board(self.current_log_index)
 
                     self.finished = False # going back disables the game ending
 
-                    self.graphics_manager.draw_board(self.board, self.viewing_angle)
-
             case pygame.K_RIGHT:  # Move forward in the move log
                 if self.current_log_index < len(self.move_log) - 1:
                     self.current_log_index += 1
-                    self.board = copy.deepcopy(self.move_log[self.current_log_index])
-
-                    pygame.mixer.Sound(f'sounds/{self.board.sound}.mp3').play() # sound of next move
+                    self.board = self.get_logged_board(self.current_log_index)
 
-                    self.graphics_manager.draw_board(self.board, self.viewing_angle)
+                    sound_bank.play(self.board.sound) # sound of next move
 
                     # Check if we're back at the latest move in the move log
                     if self.current_log_index == len(self.move_log) - 1:
                         # if we are, and games has ended. make sure no input is allowed (finished becomes True)
-                        self.finished = not self.board.is_enemy_able_to_move()
+                        self.finished = (not self.board.is_enemy_able_to_move() or self.board.is_draw()
+                                         or self.lost_on_time is not None)
 
     def process_player_input(self):
         """
-        Waits for a click or keyboard press:
+        Blocks until a click or keyboard press arrives, then handles every pending event:
         * based on a click, it calculates its location and sends it to handle_square_selection
         * for a keyboard input, sends event to handle_keyboard_events
         """
-        for event in pygame.event.get():
+        # While analysing or while a clock runs, wake up regularly to pick up results and redraw the clocks
+        timeouts = ([ANALYSIS_POLL_MS] if self.show_analysis else []) + \
+                   ([CLOCK_POLL_MS] if self.game_clock and self.game_clock.running_color else [])
+        first_event = pygame.event.wait(min(timeouts)) if timeouts else pygame.event.wait()
+        events = [first_event] + pygame.event.get()
+
+        for event in events:
             if event.type == QUIT:
+                if self.analysis:
+                    self.analysis.close()
+                if self.ponder:
+                    self.ponder.close()
+                    self.ai_bot.transposition_table.close()
+                if self.monte_carlo:
+                    self.monte_carlo.close()
                 pygame.quit()
                 quit()
 
@@ -150,17 +406,44 @@ class Game:
                 # Allow square selection only if it's the human's turn or AI is disabled
                 if not (self.ai_enabled and self.board.current_turn == self.ai_bot.color) and not self.finished:
                     self.handle_square_selection(square_location)
+                    self.needs_redraw = True
 
             elif event.type == pygame.KEYDOWN:
                 self.handle_keyboard_events(event)
+                self.needs_redraw = True
+
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                # The window was uncovered: repaint everything
+                self.graphics_manager.invalidate()
+                self.needs_redraw = True
 
     ###########################################################
     """ run_game loop: (draw => process human/bot => draw => process human/bot ...) """
 
     def run_game(self):
+        # Mouse movement never changes the board, so it should not wake the loop up
+        pygame.event.set_blocked(MOUSEMOTION)
+
         while self.game_on:
-            # 1. Draw the current state of the board + highlights.
-            self.graphics_manager.draw_board(self.board, self.viewing_angle)
+            # 0. Keep the background analysis on the displayed position, and look at the clocks
+            if self.show_analysis:
+                self.update_analysis()
+            if self.game_clock:
+                self.update_clocks()
+
+            # 1. Draw the current state of the board + highlights, only if something changed.
+            if self.needs_redraw:
+                self.graphics_manager.draw_board(self.board, self.viewing_angle)
+                if self.show_explorer:
+                    moves = self.opening_index.get_board_stats(self.board)
+                    self.graphics_manager.draw_explorer(format_stats(moves, EXPLORER_MOVES_SHOWN) or ["no games"])
+                if self.show_analysis:
+                    self.draw_analysis()
+                if self.game_clock:
+                    self.graphics_manager.draw_clocks(self.drawn_clock_texts[0], self.game_clock.running_color,
+                                                      self.viewing_angle)
+                self.needs_redraw = False
+                self.clock.tick(FPS_CAP)  # caps the redraw rate during bursts of input
 
             # 2. Check if we are at the present move (latest move in the log)
             at_latest_move = self.current_log_index == len(self.move_log) - 1
@@ -171,7 +454,8 @@ class Game:
                     and at_latest_move
                     and not self.finished):
                 self.ai_bot.handle_ai_turn()
+                self.needs_redraw = True
 
-            # 4. If it's the human player's turn, or we are reviewing previous moves, handle player input
+            # 4. If it's the human player's turn, or we are reviewing previous moves, wait for player input
             else:
                 self.process_player_input()
@@ -0,0 +1,79 @@
+""" Chess clocks with increment """
+import time
+
+
+class GameClock:
+    """
+    One clock per color, at most one running. Pressing the clock ends a move: the mover's clock stops
+    and gets the increment, and the next player's clock starts.
+    """
+
+    def __init__(self, initial_seconds: float, increment_seconds: float = 0, remaining=None):
+        self.initial = initial_seconds
+        self.increment = increment_seconds
+        self.remaining = dict(remaining) if remaining else {"white": initial_seconds, "black": initial_seconds}
+        self.running_color = None
+        self.turn_start = None
+
+    @classmethod
+    def from_move_times(cls, initial_seconds, increment_seconds, move_times, first_color):
+        """Rebuilds the clocks of a recorded game from the milliseconds each move took (see GameRecord)."""
+        clock = cls(initial_seconds, increment_seconds)
+        color = first_color
+        for milliseconds in move_times:
+            clock.remaining[color] += increment_seconds - milliseconds / 1000
+            color = "black" if color == "white" else "white"
+        return clock
+
+    def start(self, color):
+        self.stop()
+        self.running_color = color
+        self.turn_start = time.perf_counter()
+
+    def stop(self):
+        """Stops the running clock (if any), keeping the time it used."""
+        if self.running_color:
+            self.remaining[self.running_color] -= time.perf_counter() - self.turn_start
+            self.running_color = None
+
+    def press(self, next_color=None) -> float:
+        """
+        Ends the running player's move: their clock stops and gets the increment, then next_color's clock
+        starts (None: the game is over). Returns the seconds the move took.
+        """
+        mover = self.running_color
+        move_seconds = time.perf_counter() - self.turn_start if mover else 0.0
+        self.stop()
+        if mover:
+            self.remaining[mover] += self.increment
+        if next_color:
+            self.start(next_color)
+        return move_seconds
+
+    def time_left(self, color) -> float:
+        """Seconds left on {color}'s clock, counting the running move."""
+        seconds = self.remaining[color]
+        if color == self.running_color:
+            seconds -= time.perf_counter() - self.turn_start
+        return seconds
+
+    def flagged_color(self):
+        """The color whose time ran out, or None."""
+        for color in ("white", "black"):
+            if self.time_left(color) <= 0:
+                return color
+        return None
+
+    def format_time(self, color) -> str:
+        """"m:ss", or "s.t" (tenths) in the last ten seconds."""
+        seconds = max(self.time_left(color), 0.0)
+        if seconds < 10:
+            return f"{int(seconds * 10) / 10:.1f}"
+        seconds = int(seconds)
+        return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def parse_time_control(text: str):
+    """"5+3" => (300, 3): minutes per player, plus seconds added after every move."""
+    minutes, _, increment = text.partition("+")
+    return float(minutes) * 60, float(increment or 0)
@@ -0,0 +1,137 @@
+""" Compact, versioned, append-only binary game records (save / resume) """
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+
+from Board import Board, decode_move
+
+MAGIC = b"ICGR"  # Irad's Chess Game Record
+FORMAT_VERSION = 1
+
+# Header: magic, version, flags, start FEN length, metadata (JSON) length; then the FEN and the metadata
+HEADER_FORMAT = struct.Struct("<4sBBHH")
+FLAG_AI_ENABLED = 1
+FLAG_AI_WHITE = 2
+FLAG_VIEW_BLACK = 4
+FLAG_CLOCKS = 8  # every move is followed by the milliseconds its player spent on it
+
+# Move records, appended after every move: 16-bit move (see Board.encode_move) [+ 32-bit milliseconds]
+MOVE_FORMAT = struct.Struct("<H")
+CLOCK_MOVE_FORMAT = struct.Struct("<HI")
+
+
+class GameRecord:
+    """A game as read back from a record file."""
+
+    def __init__(self, start_fen, ai_color, viewing_angle, metadata, moves, move_times=None):
+        self.start_fen = start_fen
+        self.ai_color = ai_color  # None in hot seat mode
+        self.viewing_angle = viewing_angle
+        self.metadata = metadata
+        self.moves = moves  # array('H') of encoded moves
+        self.move_times = move_times  # array('I') of milliseconds per move, or None without clocks
+
+    def replay(self) -> Board:
+        """
+        Fast path: plays every move on a single Board (no copies, no GUI, no legality checks:
+        the moves were legal when they were recorded) and returns the final position.
+        """
+        board = Board.from_fen(self.start_fen)
+        for code in self.moves:
+            board.make_move(*decode_move(code))
+        return board
+
+
+class GameRecorder:
+    """
+    Writes a game record as it is played: the header once, then one small record per move, appended
+    and flushed immediately, so a crash loses at most the move being written.
+    """
+
+    def __init__(self, path, record_file, header_size, clocks):
+        self.path = path
+        self.file = record_file
+        self.header_size = header_size
+        self.record_size = (CLOCK_MOVE_FORMAT if clocks else MOVE_FORMAT).size
+        self.clocks = clocks
+
+    @classmethod
+    def create(cls, path, start_fen, ai_color=None, viewing_angle="white", metadata=None, clocks=True):
+        """Starts a new record at {path}, replacing any previous one."""
+        flags = ((FLAG_AI_ENABLED if ai_color else 0) | (FLAG_AI_WHITE if ai_color == "white" else 0)
+                 | (FLAG_VIEW_BLACK if viewing_angle == "black" else 0) | (FLAG_CLOCKS if clocks else 0))
+        fen_bytes = start_fen.encode("ascii")
+        metadata_bytes = json.dumps(metadata or {"created": time.strftime("%Y-%m-%d %H:%M:%S")}).encode()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        record_file = open(path, "wb")
+        record_file.write(HEADER_FORMAT.pack(MAGIC, FORMAT_VERSION, flags, len(fen_bytes), len(metadata_bytes)))
+        record_file.write(fen_bytes + metadata_bytes)
+        record_file.flush()
+        return cls(path, record_file, HEADER_FORMAT.size + len(fen_bytes) + len(metadata_bytes), clocks)
+
+    @classmethod
+    def resume(cls, path, record: GameRecord):
+        """Reopens the record read as {record} for appending, cutting off a half-written last move."""
+        record_file = open(path, "r+b")
+        header_size = read_header(record_file)[-1]
+        recorder = cls(path, record_file, header_size, clocks=record.move_times is not None)
+        recorder.truncate(len(record.moves))
+        return recorder
+
+    def append_move(self, code: int, milliseconds: int = 0):
+        if self.clocks:
+            self.file.write(CLOCK_MOVE_FORMAT.pack(code, min(milliseconds, 0xFFFFFFFF)))
+        else:
+            self.file.write(MOVE_FORMAT.pack(code))
+        self.file.flush()
+
+    def truncate(self, num_moves: int):
+        """Keeps only the first {num_moves} moves (a new move was played after going back in the log)."""
+        self.file.seek(self.header_size + num_moves * self.record_size)
+        self.file.truncate()
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_header(record_file):
+    """Returns (flags, start_fen, metadata, header_size) and leaves the file at the first move."""
+    magic, version, flags, fen_length, metadata_length = HEADER_FORMAT.unpack(record_file.read(HEADER_FORMAT.size))
+    if magic != MAGIC:
+        raise ValueError("Not a game record")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported game record version: {version}")
+
+    start_fen = record_file.read(fen_length).decode("ascii")
+    metadata = json.loads(record_file.read(metadata_length) or b"{}")
+    return flags, start_fen, metadata, HEADER_FORMAT.size + fen_length + metadata_length
+
+
+def read_record(path) -> GameRecord:
+    """Reads a record file. A partial last move (crash while writing) is ignored."""
+    with open(path, "rb") as record_file:
+        flags, start_fen, metadata, _ = read_header(record_file)
+        data = record_file.read()
+
+    ai_color = ("white" if flags & FLAG_AI_WHITE else "black") if flags & FLAG_AI_ENABLED else None
+    viewing_angle = "black" if flags & FLAG_VIEW_BLACK else "white"
+
+    if flags & FLAG_CLOCKS:
+        complete = len(data) - len(data) % CLOCK_MOVE_FORMAT.size
+        moves, move_times = array("H"), array("I")
+        for code, milliseconds in CLOCK_MOVE_FORMAT.iter_unpack(data[:complete]):
+            moves.append(code)
+            move_times.append(milliseconds)
+    else:
+        moves, move_times = array("H", data[:len(data) - len(data) % MOVE_FORMAT.size]), None
+        if sys.byteorder == "big":
+            moves.byteswap()  # records are little-endian
+
+    return GameRecord(start_fen, ai_color, viewing_angle, metadata, moves, move_times)
@@ -0,0 +1,419 @@
+""" Headless asyncio server hosting many concurrent games, with engine moves computed by a shared process pool """
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from AIBot import AIBot
+from Board import Board, location_to_name
+from Piece import Pawn
+
+DEFAULT_PORT = 8765
+DEFAULT_DEPTH = 3
+DEFAULT_TIME_LIMIT = 2.0  # Seconds per engine move, unless the game asks for another limit
+MAX_TIME_LIMIT = 30.0
+MAX_PENDING_PER_WORKER = 16  # Engine requests queued per worker before new ones are refused ("busy")
+MAX_IN_FLIGHT_PER_CONNECTION = 32  # Messages of one connection handled at once; reading pauses beyond that
+LATENCY_SAMPLES = 1000  # Recent engine latencies kept for the global percentiles
+
+
+##################################
+""" Engine worker (runs in the pool processes) """
+
+worker_bot = None
+
+
+def init_engine_worker():
+    """Pool initializer: one AIBot per process. stdout is left to the server, engine messages go to stderr."""
+    global worker_bot
+    sys.stdout = sys.stderr
+    worker_bot = AIBot(None, "white")
+
+
+def engine_move(fen: str, depth: int, time_limit: float):
+    """Searches the position and returns (uci_move, score, completed_depth, nodes)."""
+    board = Board.from_fen(fen)
+    worker_bot.color = board.current_turn
+    worker_bot.transposition_table.clear()
+    evaluation, best_move, pv, completed_depth = worker_bot.search(board, depth, time_limit)
+
+    start_location, end_location = pv[0] if pv else (best_move[0].current_square.location, best_move[1])
+    promotion = "q" if isinstance(board.get_square(start_location).piece, Pawn) and end_location[0] in (0, 7) else ""
+    return (location_to_name(start_location) + location_to_name(end_location) + promotion,
+            evaluation, completed_depth, worker_bot.nodes)
+
+
+##################################
+""" Metrics """
+
+
+class LatencyStats:
+    """Count, mean, max and percentiles (over the most recent samples) of a latency, in milliseconds."""
+
+    def __init__(self, max_samples: int = LATENCY_SAMPLES):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.samples = collections.deque(maxlen=max_samples)
+
+    def add(self, seconds: float):
+        milliseconds = seconds * 1000
+        self.count += 1
+        self.total += milliseconds
+        self.maximum = max(self.maximum, milliseconds)
+        self.samples.append(milliseconds)
+
+    def summary(self) -> dict:
+        summary = {"count": self.count, "mean_ms": round(self.total / self.count, 2) if self.count else None,
+                   "max_ms": round(self.maximum, 2)}
+        ordered = sorted(self.samples)
+        for percentile in (50, 95, 99):
+            summary[f"p{percentile}_ms"] = (round(ordered[min(len(ordered) - 1, len(ordered) * percentile // 100)], 2)
+                                            if ordered else None)
+        return summary
+
+
+##################################
+""" Engine pool """
+
+
+class EngineBusy(Exception):
+    """Raised when the engine queue is full; the client should retry later."""
+
+
+class EnginePool:
+    """
+    Bounded pool of AIBot worker processes. Requests are queued per client and served round-robin
+    across clients, so a client with hundreds of games can not starve one with a single game.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(workers, initializer=init_engine_worker)
+        self.max_pending = workers * MAX_PENDING_PER_WORKER
+        self.queues = collections.OrderedDict()  # client_id => deque of (arguments, future, enqueue_time)
+        self.pending = 0
+        self.running = 0
+        self.rejected = 0
+        self.wakeup = asyncio.Event()
+        self.queue_wait = LatencyStats()
+        self.compute_time = LatencyStats()
+        self.dispatcher = None
+
+    def start(self):
+        self.dispatcher = asyncio.create_task(self.dispatch())
+
+    async def close(self):
+        if self.dispatcher:
+            self.dispatcher.cancel()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def request(self, client_id, fen: str, depth: int, time_limit: float):
+        """Queues an engine search and waits for its (uci_move, score, depth, nodes)."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise EngineBusy()
+
+        future = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(client_id, collections.deque()).append(((fen, depth, time_limit), future,
+                                                                       time.perf_counter()))
+        self.pending += 1
+        self.wakeup.set()
+        return await future
+
+    def next_request(self):
+        """Takes the oldest request of the next client in turn, and moves that client to the back."""
+        client_id, queue = next(iter(self.queues.items()))
+        request = queue.popleft()
+        del self.queues[client_id]
+        if queue:
+            self.queues[client_id] = queue
+        self.pending -= 1
+        return request
+
+    async def dispatch(self):
+        """Keeps every worker busy while there are queued requests."""
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.queues or self.running >= self.workers:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            arguments, future, enqueue_time = self.next_request()
+            if future.cancelled():  # the game was closed while waiting
+                continue
+            self.queue_wait.add(time.perf_counter() - enqueue_time)
+            self.running += 1
+            loop.run_in_executor(self.executor, engine_move, *arguments).add_done_callback(
+                lambda result, future=future, start=time.perf_counter(): self.finish(result, future, start))
+
+    def finish(self, result, future, start_time):
+        self.running -= 1
+        self.compute_time.add(time.perf_counter() - start_time)
+        self.wakeup.set()
+        if future.cancelled():
+            return
+        if result.exception():
+            future.set_exception(result.exception())
+        else:
+            future.set_result(result.result())
+
+    def metrics(self) -> dict:
+        return {"workers": self.workers, "running": self.running, "queued": self.pending,
+                "rejected": self.rejected, "queue_wait": self.queue_wait.summary(),
+                "compute": self.compute_time.summary()}
+
+
+##################################
+""" Games """
+
+
+class ServerGame:
+    def __init__(self, game_id: int, client_id: int, board: Board, engine_color, depth: int, time_limit: float):
+        self.game_id = game_id
+        self.client_id = client_id
+        self.board = board
+        self.engine_color = engine_color  # None: both sides are played by the client
+        self.depth = depth
+        self.time_limit = time_limit
+        self.lock = asyncio.Lock()  # messages of one game are handled in order
+        self.moves = []  # UCI moves played, both sides
+        self.engine_latency = LatencyStats()  # from the request to the engine's answer, queueing included
+        self.status = board.get_game_status()
+
+    def state(self) -> dict:
+        return {"game_id": self.game_id, "fen": self.board.to_fen(), "turn": self.board.current_turn,
+                "status": self.status, "moves": self.moves}
+
+    def metrics(self) -> dict:
+        return {"game_id": self.game_id, "moves": len(self.moves), "engine_latency": self.engine_latency.summary()}
+
+
+class GameServer:
+    """
+    Newline-delimited JSON over TCP. Every request is an object with a "type" (and optionally an "id",
+    echoed back in the reply):
+        {"type": "new_game", "engine": "black", "fen": ..., "depth": 3, "time_limit": 1.5}
+        {"type": "move", "game_id": 1, "move": "e2e4"}  -> "moved" reply, then an "engine_move" message
+        {"type": "go", "game_id": 1}  -> "engine_move": asks again for an engine move that failed or was refused
+        {"type": "state", "game_id": 1} / {"type": "close", "game_id": 1} / {"type": "metrics"}
+    Errors are answered with {"type": "error", "error": ...}; "busy" means the engine queue is full.
+    """
+
+    def __init__(self, workers: int):
+        self.engine_pool = EnginePool(workers)
+        self.games = {}  # game_id => ServerGame
+        self.game_ids = itertools.count(1)
+        self.client_ids = itertools.count(1)
+        self.connections = 0
+        self.messages = 0
+        self.move_latency = LatencyStats()  # player move handling, engine excluded
+
+    async def serve(self, host: str, port: int, metrics_interval=None):
+        self.engine_pool.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"listening on {host}:{port}", file=sys.stderr)
+        if metrics_interval:
+            asyncio.create_task(self.publish_metrics(metrics_interval))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.engine_pool.close()
+
+    async def publish_metrics(self, interval: float):
+        """Writes the global metrics to stderr as one JSON line every {interval} seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            print(json.dumps(self.metrics()), file=sys.stderr)
+
+    ##################################
+    """ Connections """
+
+    async def handle_connection(self, reader, writer):
+        client_id = next(self.client_ids)
+        self.connections += 1
+        in_flight = asyncio.Semaphore(MAX_IN_FLIGHT_PER_CONNECTION)
+        tasks = set()
+
+        async def send(message):
+            writer.write((json.dumps(message) + "\n").encode())
+            await writer.drain()  # waits while the client is not reading
+
+        async def handle_line(line):
+            try:
+                await self.handle_message(client_id, line, send)
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+            finally:
+                in_flight.release()
+
+        try:
+            while True:
+                await in_flight.acquire()  # backpressure: stop reading while too many messages are in flight
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(handle_line(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            for game_id in [game_id for game_id, game in self.games.items() if game.client_id == client_id]:
+                del self.games[game_id]
+            self.connections -= 1
+            writer.close()
+
+    async def handle_message(self, client_id, line: bytes, send):
+        self.messages += 1
+        try:
+            message = json.loads(line)
+            handler = {"new_game": self.new_game, "move": self.play_move, "go": self.engine_go,
+                       "state": self.game_state, "close": self.close_game,
+                       "metrics": self.send_metrics}[message["type"]]
+        except (ValueError, KeyError, TypeError):
+            await send({"type": "error", "error": "invalid message"})
+            return
+
+        def reply(reply_message):
+            if "id" in message:
+                reply_message["id"] = message["id"]
+            return send(reply_message)
+
+        try:
+            await handler(client_id, message, reply)
+        except EngineBusy:
+            await reply({"type": "error", "error": "busy"})
+        except KeyError as error:
+            await reply({"type": "error", "error": f"missing field: {error.args[0]}"})
+        except (ValueError, TypeError) as error:
+            await reply({"type": "error", "error": str(error)})
+
+    def get_game(self, client_id, message) -> ServerGame:
+        game = self.games.get(message.get("game_id"))
+        if not game or game.client_id != client_id:
+            raise ValueError("unknown game")
+        return game
+
+    ##################################
+    """ Requests """
+
+    async def new_game(self, client_id, message, reply):
+        board = Board.from_fen(message["fen"]) if message.get("fen") else Board()
+        engine_color = message.get("engine")
+        if engine_color not in (None, "white", "black"):
+            raise ValueError("engine must be white, black or null")
+
+        depth = int(message.get("depth", DEFAULT_DEPTH))
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        time_limit = min(float(message.get("time_limit", DEFAULT_TIME_LIMIT)), MAX_TIME_LIMIT)
+        if not time_limit > 0:  # also rejects NaN
+            raise ValueError("time_limit must be positive")
+        game = ServerGame(next(self.game_ids), client_id, board, engine_color, depth, time_limit)
+        self.games[game.game_id] = game
+
+        async with game.lock:
+            await reply({"type": "game_started", **game.state()})
+            await self.engine_turn(game, reply)
+
+    async def play_move(self, client_id, message, reply):
+        game = self.get_game(client_id, message)
+        async with game.lock:
+            start_time = time.perf_counter()
+            if game.status:
+                raise ValueError(f"game over: {game.status}")
+            if game.board.current_turn == game.engine_color:
+                raise ValueError("not your turn")
+
+            move = message["move"]
+            game.board.make_move(*game.board.parse_uci(move))
+            game.moves.append(move)
+            game.status = game.board.get_game_status()
+            self.move_latency.add(time.perf_counter() - start_time)
+
+            await reply({"type": "moved", **game.state()})
+            await self.engine_turn(game, reply)
+
+    async def engine_turn(self, game: ServerGame, reply):
+        """Plays the engine's move if it is the engine's turn (called with the game lock held)."""
+        if game.status or game.board.current_turn != game.engine_color:
+            return
+
+        start_time = time.perf_counter()
+        try:
+            move, score, depth, nodes = await self.engine_pool.request(game.client_id, game.board.to_fen(),
+                                                                       game.depth, game.time_limit)
+        except EngineBusy:
+            raise
+        except Exception as error:
+            # A search that failed in the worker is reported to the client; the game stays on the engine's turn
+            # until the client sends "go"
+            await reply({"type": "error", "error": f"engine error: {error!r}", "game_id": game.game_id})
+            return
+        game.engine_latency.add(time.perf_counter() - start_time)
+        if game.game_id not in self.games:
+            return  # closed while the engine was thinking
+
+        game.board.make_move(*game.board.parse_uci(move))
+        game.moves.append(move)
+        game.status = game.board.get_game_status()
+        await reply({"type": "engine_move", "move": move, "score": score, "depth": depth, "nodes": nodes,
+                     **game.state()})
+
+    async def engine_go(self, client_id, message, reply):
+        """Retries the engine's move after a "busy" or engine error left the game on the engine's turn."""
+        game = self.get_game(client_id, message)
+        async with game.lock:
+            if game.status:
+                raise ValueError(f"game over: {game.status}")
+            if game.board.current_turn != game.engine_color:
+                raise ValueError("not the engine's turn")
+            await self.engine_turn(game, reply)
+
+    async def game_state(self, client_id, message, reply):
+        game = self.get_game(client_id, message)
+        await reply({"type": "state", **game.state(), "metrics": game.metrics()})
+
+    async def close_game(self, client_id, message, reply):
+        game = self.get_game(client_id, message)
+        del self.games[game.game_id]
+        await reply({"type": "closed", "game_id": game.game_id})
+
+    async def send_metrics(self, client_id, message, reply):
+        await reply({"type": "metrics", **self.metrics()})
+
+    def metrics(self) -> dict:
+        return {"games": len(self.games), "connections": self.connections, "messages": self.messages,
+                "move_latency": self.move_latency.summary(), "engine": self.engine_pool.metrics()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host concurrent games over a JSON lines TCP protocol.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="engine processes (default: CPU count)")
+    parser.add_argument("--metrics-interval", type=float, default=None, help="seconds between metrics on stderr")
+    args = parser.parse_args()
+
+    server = GameServer(args.workers or os.cpu_count() or 1)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.metrics_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -12,23 +12,31 @@ class GraphicsManager:
         self.square_size = board_size // 8
         self.font = pygame.font.SysFont(None, 36)
 
+        # Fonts for rank and file labels
+        self.number_font = pygame.font.SysFont(None, 28)  # Numbers are slightly bigger (10% increase)
+        self.letter_font = pygame.font.SysFont(None, 24)  # Letters remain the same size
+        self.square_colors = [(240, 217, 181), (181, 136, 99)]  # Light and dark square colors
+
+        # Cached layers for the renderer
+        self.board_layers = {}  # viewing_angle => (board surface, label surface)
+        self.overlays = {}  # highlight type => translucent square surface
+        self.piece_images = {}  # image path => scaled image
+        self.build_overlays()
+
+        # What is currently on screen, used to redraw only the squares that changed
+        self.drawn_layers = {}  # (draw_row, draw_col) => (overlays, image_path)
+        self.drawn_viewing_angle = None
+
     ##################################
     """ draw_board """
 
-    def draw_squares(self, board, viewing_angle):
+    def build_board_layers(self, viewing_angle):
         """
-        Draw the squares of the board, including any highlights for possible moves,
-        capturable locations, check location, and add rank and file labels.
+        Pre-render the static layers for a viewing angle: the square colors and
+        the rank and file labels. Both only change with the viewing angle, so they are built once.
         """
-        colors = [(240, 217, 181), (181, 136, 99)]  # Light and dark square colors
-        highlight_color = (0, 100, 0, 120)  # Slightly darker and less transparent highlight color for possible moves
-        selected_square_color = (0, 100, 0, 150)  # Darker green for the highlighted square
-        capturable_color = (200, 0, 0, 120)  # Reddish color for capturable locations
-        check_highlight_color = (255, 105, 180, 180)  # Pink color for check location (RGB for pink)
-
-        # Initialize fonts for rank and file labels
-        number_font = pygame.font.SysFont(None, 28)  # Numbers are slightly bigger (10% increase)
-        letter_font = pygame.font.SysFont(None, 24)  # Letters remain the same size
+        board_surface = pygame.Surface((self.board_size, self.board_size))
+        label_surface = pygame.Surface((self.board_size, self.board_size), pygame.SRCALPHA)
 
         # Precompute file and rank labels based on viewing angle
         file_labels = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H'] if viewing_angle == 'white' \
@@ -36,103 +44,250 @@ class GraphicsManager:
         rank_labels = ['1', '2', '3', '4', '5', '6', '7', '8'] if viewing_angle == 'white' \
             else ['8', '7', '6', '5', '4', '3', '2', '1']
 
-        # Extract last move (start and destination squares)
-        last_move = board.last_move
-        start_square = last_move[1] if last_move else None
-        destination_square = last_move[2] if last_move else None
-
         for row in range(8):
             for col in range(8):
-                square = board.squares[row][col]
-                color = colors[(row + col) % 2]  # Determine base square color
+                color = self.square_colors[(row + col) % 2]  # Determine base square color
 
                 # Adjust row/col based on the viewing angle (board inversion)
                 draw_row = 7 - row if viewing_angle == 'black' else row
                 draw_col = 7 - col if viewing_angle == 'black' else col
 
                 """ Draw the base square color """
-                pygame.draw.rect(self.screen, color, pygame.Rect(
-                    draw_col * self.square_size, draw_row * self.square_size, self.square_size, self.square_size))
-
-                ###############################################################
-                """ Highlight last move (start and destination squares) """
-                if last_move:
-                    if square == start_square or square == destination_square:
-                        highlight_surface = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                        highlight_surface.fill(highlight_color)
-                        self.screen.blit(highlight_surface, (draw_col * self.square_size, draw_row * self.square_size))
-
-                """ Draw all highlight types """
-                # Highlight the selected highlighted square
-                if board.highlighted_square and square == board.highlighted_square:
-                    highlight_surface = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                    highlight_surface.fill(selected_square_color)
-                    self.screen.blit(highlight_surface, (draw_col * self.square_size, draw_row * self.square_size))
-
-                # Highlight capturable locations
-                if square.location in board.capturable_locations:
-                    capturable_surface = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                    capturable_surface.fill(capturable_color)
-                    self.screen.blit(capturable_surface, (draw_col * self.square_size, draw_row * self.square_size))
-
-                # Draw possible move circles, but skip capturable locations
-                elif square.location in board.highlighted_square_locations:
-                    highlight_surface = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                    pygame.draw.circle(highlight_surface, highlight_color,
-                                       (self.square_size // 2, self.square_size // 2), self.square_size // 6)
-                    self.screen.blit(highlight_surface, (draw_col * self.square_size, draw_row * self.square_size))
-
-                # Highlight the check location
-                if square.location == board.check_location:
-                    check_surface = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                    check_surface.fill(check_highlight_color)
-                    self.screen.blit(check_surface, (draw_col * self.square_size, draw_row * self.square_size))
-
-                ###############################################################
+                pygame.draw.rect(board_surface, color, self.square_rect(draw_row, draw_col))
+
                 """ Draw rank and file labels """
-                label_color = colors[(row + col + 1) % 2]  # Opposite color for the label
+                label_color = self.square_colors[(row + col + 1) % 2]  # Opposite color for the label
                 if (col == 7 and viewing_angle == "white") or (col == 0 and viewing_angle == "black"):
                     rank_label = rank_labels[7 - row] if viewing_angle == 'white' else rank_labels[row]
-                    rank_label_surface = number_font.render(rank_label, True, label_color)
-                    self.screen.blit(rank_label_surface, (draw_col * self.square_size + self.square_size - 15,
-                                                          draw_row * self.square_size + 5))
+                    rank_label_surface = self.number_font.render(rank_label, True, label_color)
+                    label_surface.blit(rank_label_surface, (draw_col * self.square_size + self.square_size - 15,
+                                                            draw_row * self.square_size + 5))
 
                 if (row == 7 and viewing_angle == "white") or (row == 0 and viewing_angle == "black"):
                     file_label = file_labels[col] if viewing_angle == 'white' else file_labels[7 - col]
-                    file_label_surface = letter_font.render(file_label, True, label_color)
-                    self.screen.blit(file_label_surface, (draw_col * self.square_size + 5,
-                                                          draw_row * self.square_size + self.square_size - 18))
+                    file_label_surface = self.letter_font.render(file_label, True, label_color)
+                    label_surface.blit(file_label_surface, (draw_col * self.square_size + 5,
+                                                            draw_row * self.square_size + self.square_size - 18))
+
+        self.board_layers[viewing_angle] = (board_surface, label_surface)
+
+    def build_overlays(self):
+        """Pre-render one translucent surface per highlight type; they are reused for every square."""
+        highlight_color = (0, 100, 0, 120)  # Slightly darker and less transparent highlight color for possible moves
+        selected_square_color = (0, 100, 0, 150)  # Darker green for the highlighted square
+        capturable_color = (200, 0, 0, 120)  # Reddish color for capturable locations
+        check_highlight_color = (255, 105, 180, 180)  # Pink color for check location (RGB for pink)
+
+        fills = {
+            "last_move": highlight_color,
+            "selected": selected_square_color,
+            "capturable": capturable_color,
+            "check": check_highlight_color,
+        }
+        for name, color in fills.items():
+            surface = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
+            surface.fill(color)
+            self.overlays[name] = surface
+
+        # Possible moves are drawn as a circle instead of a filled square
+        move_surface = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
+        pygame.draw.circle(move_surface, highlight_color,
+                           (self.square_size // 2, self.square_size // 2), self.square_size // 6)
+        self.overlays["move"] = move_surface
+
+    def get_piece_image(self, image_path):
+        """Load and scale a piece image once, then serve it from the cache."""
+        if image_path not in self.piece_images:
+            piece_image = pygame.image.load(image_path)
+            self.piece_images[image_path] = pygame.transform.scale(piece_image, (self.square_size, self.square_size))
+        return self.piece_images[image_path]
+
+    def square_rect(self, draw_row, draw_col):
+        return pygame.Rect(draw_col * self.square_size, draw_row * self.square_size,
+                           self.square_size, self.square_size)
+
+    def get_square_layers(self, board, square, start_square, destination_square):
+        """
+        Returns the overlay names and the piece image drawn on a square, in drawing order.
+        Two squares with equal layers look the same, which is what the dirty-rect check relies on.
+        """
+        overlays = []
+
+        # Highlight last move (start and destination squares)
+        if start_square and (square == start_square or square == destination_square):
+            overlays.append("last_move")
+
+        # Highlight the selected highlighted square
+        if board.highlighted_square and square == board.highlighted_square:
+            overlays.append("selected")
+
+        # Highlight capturable locations
+        if square.location in board.capturable_locations:
+            overlays.append("capturable")
+
+        # Draw possible move circles, but skip capturable locations
+        elif square.location in board.highlighted_square_locations:
+            overlays.append("move")
+
+        # Highlight the check location
+        if square.location == board.check_location:
+            overlays.append("check")
 
-    def draw_pieces(self, board, viewing_angle):
-        """Draw all pieces on the board, adjusting for viewing angle."""
-        # Depending on the viewing angle, adjust how pieces are drawn
+        image_path = square.piece.image_path if square.piece else None
+        return tuple(overlays), image_path
+
+    def draw_square(self, draw_row, draw_col, viewing_angle, overlays, image_path):
+        """Redraw a single square from its layers: board, highlights, labels, then the piece."""
+        board_surface, label_surface = self.board_layers[viewing_angle]
+        rect = self.square_rect(draw_row, draw_col)
+
+        self.screen.blit(board_surface, rect, rect)
+        for name in overlays:
+            self.screen.blit(self.overlays[name], rect)
+        self.screen.blit(label_surface, rect, rect)
+        if image_path:
+            self.screen.blit(self.get_piece_image(image_path), rect)
+
+        return rect
+
+    def invalidate(self):
+        """Forget what is on screen, so the next draw_board repaints the whole board."""
+        self.drawn_layers = {}
+        self.drawn_viewing_angle = None
+
+    def draw_board(self, board, viewing_angle):
+        """
+        Draw the chessboard and pieces. updates itself after every click.
+        Only squares whose layers changed since the previous call are redrawn and pushed to the display.
+        """
+        if viewing_angle not in self.board_layers:
+            self.build_board_layers(viewing_angle)
+
+        full_redraw = viewing_angle != self.drawn_viewing_angle
+
+        # Extract last move (start and destination squares)
+        last_move = board.last_move
+        start_square = last_move[1] if last_move else None
+        destination_square = last_move[2] if last_move else None
+
+        dirty_rects = []
         for row in range(8):
             for col in range(8):
-                # Get the square based on viewing angle
-                if viewing_angle == "white":
-                    display_row = row
-                    display_col = col
-                else:  # "black"
-                    display_row = 7 - row
-                    display_col = 7 - col
-
                 square = board.squares[row][col]
-                if square.piece:
-                    # Load the image of the piece
-                    piece_image = pygame.image.load(square.piece.image_path)
+                overlays, image_path = self.get_square_layers(board, square, start_square, destination_square)
 
-                    # Resize the image to fit within a square on the board
-                    piece_image = pygame.transform.scale(piece_image, (self.square_size, self.square_size))
+                # Adjust row/col based on the viewing angle (board inversion)
+                draw_row = 7 - row if viewing_angle == 'black' else row
+                draw_col = 7 - col if viewing_angle == 'black' else col
 
-                    # Blit (draw) the piece image onto the screen at the correct location
-                    self.screen.blit(piece_image, (display_col * self.square_size, display_row * self.square_size))
+                layers = (overlays, image_path)
+                if full_redraw or self.drawn_layers.get((draw_row, draw_col)) != layers:
+                    dirty_rects.append(self.draw_square(draw_row, draw_col, viewing_angle, overlays, image_path))
+                    self.drawn_layers[(draw_row, draw_col)] = layers
 
-    def draw_board(self, board, viewing_angle):
-        """Draw the chessboard and pieces. updates itself after every click"""
-        self.screen.fill((255, 255, 255))  # Fill the background with white
-        self.draw_squares(board, viewing_angle)
-        self.draw_pieces(board, viewing_angle)
-        pygame.display.flip()  # updates screen
+        self.drawn_viewing_angle = viewing_angle
+
+        if full_redraw:
+            pygame.display.flip()  # updates screen
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)  # updates only the changed squares
+
+    def draw_explorer(self, lines):
+        """
+        Draw the opening explorer panel (one line per move) over the top-left of the board.
+        The squares under it are forgotten, so the next draw_board repaints them.
+        """
+        line_height = 24
+        panel_rect = pygame.Rect(0, 0, self.board_size * 5 // 8, line_height * (len(lines) + 1))
+        panel = pygame.Surface(panel_rect.size, pygame.SRCALPHA)
+        panel.fill((30, 30, 30, 210))
+        for i, line in enumerate(["Explorer (W / D / L)"] + lines):
+            panel.blit(self.letter_font.render(line, True, (240, 240, 240)), (10, 4 + i * line_height))
+
+        self.screen.blit(panel, panel_rect)
+        pygame.display.update(panel_rect)
+        self.forget_covered_squares(panel_rect)
+
+    def draw_analysis(self, viewing_angle, white_share, label, best_move=None):
+        """
+        Draw the background analysis over the board: an evaluation bar along the left edge (white's part,
+        at white's end of the board, is white_share of it), a label line at the bottom and an arrow for
+        best_move ((start_location, end_location) or None). The squares under them are forgotten,
+        so the next draw_board repaints them.
+        """
+        # Evaluation bar
+        bar_width = 12
+        white_height = round(self.board_size * min(max(white_share, 0.0), 1.0))
+        bar_rect = pygame.Rect(0, 0, bar_width, self.board_size)
+        white_top = self.board_size - white_height if viewing_angle == "white" else 0
+        self.screen.fill((40, 40, 40), bar_rect)
+        self.screen.fill((235, 235, 235), pygame.Rect(0, white_top, bar_width, white_height))
+        dirty_rects = [bar_rect]
+
+        # Best move arrow, from the center of its start square to the center of its end square
+        if best_move:
+            def square_center(location):
+                row, col = location
+                if viewing_angle == "black":
+                    row, col = 7 - row, 7 - col
+                return pygame.Vector2((col + 0.5) * self.square_size, (row + 0.5) * self.square_size)
+
+            start, end = square_center(best_move[0]), square_center(best_move[1])
+            direction = (end - start).normalize()
+            normal = pygame.Vector2(-direction.y, direction.x)
+            head_length, head_width = self.square_size * 0.35, self.square_size * 0.25
+            head_base = end - direction * head_length
+
+            arrow = pygame.Surface((self.board_size, self.board_size), pygame.SRCALPHA)
+            arrow_color = (255, 170, 0, 170)
+            pygame.draw.line(arrow, arrow_color, start, head_base, max(self.square_size // 8, 2))
+            pygame.draw.polygon(arrow, arrow_color,
+                                [end, head_base + normal * head_width, head_base - normal * head_width])
+            arrow_rect = arrow.get_bounding_rect()
+            self.screen.blit(arrow, arrow_rect, arrow_rect)
+            dirty_rects.append(arrow_rect)
+
+        # Label: depth, score and principal variation
+        label_surface = self.letter_font.render(label, True, (240, 240, 240))
+        label_rect = pygame.Rect(bar_width, self.board_size - 24, self.board_size - bar_width, 24)
+        panel = pygame.Surface(label_rect.size, pygame.SRCALPHA)
+        panel.fill((30, 30, 30, 210))
+        panel.blit(label_surface, (8, 4))
+        self.screen.blit(panel, label_rect)
+        dirty_rects.append(label_rect)
+
+        pygame.display.update(dirty_rects)
+        for rect in dirty_rects:
+            self.forget_covered_squares(rect)
+
+    def draw_clocks(self, times, running_color, viewing_angle):
+        """
+        Draw both clocks at the right edge of the board: the viewing side's at the bottom (above the
+        analysis line), the opponent's at the top. times: color => text; the running clock is lit.
+        """
+        width, height = 110, 40
+        bottom_color = viewing_angle
+        top_color = "black" if viewing_angle == "white" else "white"
+
+        dirty_rects = []
+        for color, top in ((top_color, 0), (bottom_color, self.board_size - height - 24)):
+            rect = pygame.Rect(self.board_size - width, top, width, height)
+            running = color == running_color
+            self.screen.fill((240, 240, 240) if running else (90, 90, 90), rect)
+            text_surface = self.font.render(times[color], True, (20, 20, 20) if running else (230, 230, 230))
+            self.screen.blit(text_surface, (rect.centerx - text_surface.get_width() // 2,
+                                            rect.centery - text_surface.get_height() // 2))
+            dirty_rects.append(rect)
+
+        pygame.display.update(dirty_rects)
+        for rect in dirty_rects:
+            self.forget_covered_squares(rect)
+
+    def forget_covered_squares(self, rect):
+        """Forget the on-screen state of the squares under {rect} (something was drawn over them)."""
+        for square_location in list(self.drawn_layers):
+            if rect.colliderect(self.square_rect(*square_location)):
+                del self.drawn_layers[square_location]
 
     ##################################
     """ methods for Main => Hot-seat/Bot and White/Black"""
@@ -242,6 +397,7 @@ class GraphicsManager:
         """Display a message on the screen."""
         text_surface = self.font.render(message, True, (255, 0, 0))
         self.screen.blit(text_surface, (self.board_size // 2 - text_surface.get_width() // 2, self.board_size - 40))
+        self.invalidate()  # the message covers board squares
 
     def ask_for_promotion_choice(self):
         """Displays a set of buttons for the user to choose a promotion piece."""
@@ -299,4 +455,5 @@ class GraphicsManager:
                             button_height
                         )
                         if button_rect.collidepoint(event.pos):
+                            self.invalidate()  # the menu was drawn over the board
                             return key  # Return the key representing the chosen promotion
@@ -0,0 +1,15 @@
+""" Bounded LRU of legal moves per position, shared by every Board (and every copy of a Board) """
+from LRUCache import LRUCache
+
+LEGAL_MOVE_CACHE_SIZE = 8192  # Number of (position, color) entries kept
+
+
+class LegalMoveCache(LRUCache):
+    """(position_hash, color) => [(start_location, end_location), ...]"""
+
+    def __init__(self, max_size: int = LEGAL_MOVE_CACHE_SIZE):
+        super().__init__(max_size)
+
+
+# One cache for the whole process: the GUI board, move_log copies and search boards all share it
+legal_move_cache = LegalMoveCache()
@@ -1,13 +1,39 @@
-from Game import Game
+import sys
+
+from Game import Game, AUTOSAVE_PATH
+from GameClock import parse_time_control
 from GraphicsManager import GraphicsManager
+from SoundBank import sound_bank
 
 
 def main():
     # Create an instance of the GraphicsManager to show the viewing angle selection
     graphics_manager = GraphicsManager()
 
-    # Create an instance of the Game class with the selected viewing angle
-    game = Game(graphics_manager)
+    # Start decoding the sound effects while the user picks a mode and a color
+    sound_bank.load_in_background()
+
+    # Create an instance of the Game class with the selected viewing angle.
+    # "python Main.py --resume [record]" continues a saved game (by default the last one played)
+    resume_path = None
+    if "--resume" in sys.argv:
+        arguments = sys.argv[sys.argv.index("--resume") + 1:]
+        resume_path = arguments[0] if arguments and not arguments[0].startswith("--") else AUTOSAVE_PATH
+
+    # "python Main.py --clock 5+3" plays with 5 minutes per player and 3 seconds added after every move
+    time_control = None
+    if "--clock" in sys.argv:
+        time_control = parse_time_control(sys.argv[sys.argv.index("--clock") + 1])
+    # "python Main.py --mcts [workers]" plays against the Monte Carlo tree search, with playouts on that many
+    # processes (by default none: playouts in the game's process)
+    monte_carlo_workers = None
+    if "--mcts" in sys.argv:
+        arguments = sys.argv[sys.argv.index("--mcts") + 1:]
+        monte_carlo_workers = int(arguments[0]) if arguments and arguments[0].isdigit() else 0
+
+    # "python Main.py --no-ponder" keeps the bot from thinking on the human's time
+    game = Game(graphics_manager, resume_path, time_control, ponder="--no-ponder" not in sys.argv,
+                monte_carlo_workers=monte_carlo_workers)
 
     # Start the game
     game.run_game()
@@ -0,0 +1,295 @@
+""" Forced-mate finder: depth-first proof-number search (df-pn) over checking moves """
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import copy
+import time
+
+from AIBot import SearchTimeout
+from Board import Board, location_to_name
+from LRUCache import LRUCache
+from Piece import Pawn, King
+
+INFINITY = 10 ** 9  # Proof / disproof number of a solved node
+MATE_TABLE_SIZE = 200000  # Proof table entries kept (LRU)
+EXPANSION_CACHE_SIZE = 50000  # Positions whose children (moves + hashes) are kept (LRU)
+PROMOTION_CHOICES = ("Q", "N")  # A rook or bishop promotion never mates where a queen or knight would not
+TIME_CHECK_INTERVAL = 64  # Nodes between two looks at the clock
+
+
+class MateFinder:
+    """
+    Proves or disproves "the side to move mates within N moves". The attacker only tries checking moves,
+    the defender tries every legal reply. Nodes are keyed by (position hash, plies left): the ply limit
+    makes the search graph acyclic, so repetitions can not loop.
+    """
+
+    def __init__(self, table_size: int = MATE_TABLE_SIZE):
+        # (position_hash, plies_left) => (proof_number, disproof_number, mate_distance or None)
+        self.table = LRUCache(table_size)
+        # (position_hash, attacking) => ([(move, child_hash), ...], in_check)
+        # move = (start_location, end_location, promotion_choice), promotion_choice None unless a pawn promotes
+        self.expansions = LRUCache(EXPANSION_CACHE_SIZE)
+        self.nodes = 0
+        self.deadline = None
+
+    ##################################
+    """ Move generation """
+
+    @staticmethod
+    def make_child(board, move):
+        """Copy of {board} with {move} played (and the turn passed)."""
+        child = copy.deepcopy(board)
+        child.make_move(*move)
+        return child
+
+    @staticmethod
+    def is_special_move(board, start_location, end_location) -> bool:
+        """Castling, en passant and promotions move more than one piece, they are checked on a copy."""
+        piece = board.get_square(start_location).piece
+        if isinstance(piece, King):
+            return abs(start_location[1] - end_location[1]) == 2
+        if isinstance(piece, Pawn):
+            return end_location[0] in (0, 7) or (start_location[1] != end_location[1]
+                                                 and not board.get_square(end_location).piece)
+        return False
+
+    @staticmethod
+    def gives_check(board, start_location, end_location) -> bool:
+        """
+        True if the (ordinary) move attacks the enemy king: directly from its destination, or by discovery
+        through its start square. Tested in place, the same way the board tracks checks after a move.
+        """
+        piece = board.get_square(start_location).piece
+        enemy_king = board.black_king if piece.color == "white" else board.white_king
+        king_location = enemy_king.current_square.location
+        original_square, target_square = piece.current_square, board.get_square(end_location)
+        target_piece = target_square.piece
+
+        # Play the move (the captured piece is never the king, so the piece lists can stay as they are)
+        original_square.piece = None
+        target_square.piece = piece
+        piece.current_square = target_square
+
+        gives_check = (board.attacks(piece, king_location)
+                       or board.is_discovered_attack(king_location, start_location, piece.color))
+
+        # Restore the board
+        target_square.piece = target_piece
+        original_square.piece = piece
+        piece.current_square = original_square
+
+        return gives_check
+
+    def expand(self, board, position_hash, attacking):
+        """
+        Returns ([(move, child_hash), ...], in_check) for the side to move: checking moves only for the
+        attacker, every legal move for the defender. Served from the expansion cache after the first call.
+        """
+        key = (position_hash, attacking)
+        expansion = self.expansions.get(key)
+        if expansion is not None:
+            return expansion
+
+        color = board.current_turn
+        moves = []
+        for start_location, end_location in board.get_legal_moves(color):
+            if self.is_special_move(board, start_location, end_location):
+                is_promotion = isinstance(board.get_square(start_location).piece, Pawn) and end_location[0] in (0, 7)
+                for promotion_choice in (PROMOTION_CHOICES if is_promotion else (None,)):
+                    move = (start_location, end_location, promotion_choice)
+                    child = self.make_child(board, move)
+                    if not attacking or child.checked_color == child.current_turn:
+                        moves.append((move, child.get_position_hash()))
+            elif not attacking or self.gives_check(board, start_location, end_location):
+                move = (start_location, end_location, None)
+                moves.append((move, self.make_child(board, move).get_position_hash()))
+
+        expansion = (moves, board.checked_color == color)
+        self.expansions.put(key, expansion)
+        return expansion
+
+    ##################################
+    """ Proof-number search """
+
+    def lookup(self, position_hash, plies_left):
+        """(proof_number, disproof_number, mate_distance) of a node, (1, 1, None) if it was never searched."""
+        return self.table.get((position_hash, plies_left)) or (1, 1, None)
+
+    def mid(self, board, position_hash, attacking, plies_left, proof_threshold, disproof_threshold):
+        """
+        Multiple iterative deepening: searches the node until its proof number reaches proof_threshold
+        or its disproof number reaches disproof_threshold, then stores the result in the table.
+        """
+        self.nodes += 1
+        if self.deadline and self.nodes % TIME_CHECK_INTERVAL == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        key = (position_hash, plies_left)
+        if plies_left <= 0:
+            # Out of moves: only a checkmated defender is a proof (no need to expand the replies)
+            color = board.current_turn
+            mated = not attacking and not board.get_legal_moves(color) and board.checked_color == color
+            self.table.put(key, (0, INFINITY, 0) if mated else (INFINITY, 0, None))
+            return
+
+        children, in_check = self.expand(board, position_hash, attacking)
+        if not children:
+            # Attacker without a check: disproven. Defender without a move: mated or stalemated.
+            mated = not attacking and in_check
+            self.table.put(key, (0, INFINITY, 0) if mated else (INFINITY, 0, None))
+            return
+
+        child_plies = plies_left - 1
+        while True:
+            proof_number, disproof_number, best_index, second_best = self.combine(children, attacking, child_plies)
+            if proof_number >= proof_threshold or disproof_number >= disproof_threshold:
+                break
+
+            # Thresholds of the most proving child: it is searched until another child becomes more promising
+            child_entry = self.lookup(children[best_index][1], child_plies)
+            if attacking:  # OR node: the child with the smallest proof number
+                child_proof_threshold = min(proof_threshold, second_best + 1)
+                child_disproof_threshold = disproof_threshold - disproof_number + child_entry[1]
+            else:  # AND node: the child with the smallest disproof number
+                child_proof_threshold = proof_threshold - proof_number + child_entry[0]
+                child_disproof_threshold = min(disproof_threshold, second_best + 1)
+
+            move, child_hash = children[best_index]
+            self.mid(self.make_child(board, move), child_hash, not attacking, child_plies,
+                     min(child_proof_threshold, INFINITY), min(child_disproof_threshold, INFINITY))
+
+        self.table.put(key, (proof_number, disproof_number, self.mate_distance(children, attacking, child_plies)
+                             if proof_number == 0 else None))
+
+    def combine(self, children, attacking, child_plies):
+        """
+        Proof and disproof numbers of a node from its children, plus the index of the child to search next
+        and the second smallest proof (OR node) or disproof (AND node) number, used for its threshold.
+        """
+        entries = [self.lookup(child_hash, child_plies) for _, child_hash in children]
+        # The attacker needs one proven child, the defender one disproven child
+        selected = 0 if attacking else 1
+        ordered = sorted(range(len(entries)), key=lambda index: entries[index][selected])
+        second_best = entries[ordered[1]][selected] if len(ordered) > 1 else INFINITY
+
+        if attacking:
+            proof_number = entries[ordered[0]][0]
+            disproof_number = min(sum(entry[1] for entry in entries), INFINITY)
+        else:
+            proof_number = min(sum(entry[0] for entry in entries), INFINITY)
+            disproof_number = entries[ordered[0]][1]
+        return proof_number, disproof_number, ordered[0], second_best
+
+    def mate_distance(self, children, attacking, child_plies):
+        """Plies to mate of a proven node: the quickest proven check, or the defender's longest resistance."""
+        distances = [self.lookup(child_hash, child_plies)[2] for _, child_hash in children]
+        distances = [distance for distance in distances if distance is not None]
+        return 1 + (min(distances) if attacking else max(distances))
+
+    ##################################
+    """ Driver """
+
+    def find_mate(self, board, max_moves: int, time_limit=None):
+        """
+        Looks for a forced mate by the side to move in at most max_moves moves, trying 1, 2, ... moves so the
+        shortest mate is found. Returns (mate_in, line) with line a list of (start, end, promotion) moves, or
+        None if there is no such mate (or time_limit, in seconds, ran out first).
+        """
+        self.nodes = 0
+        self.deadline = time.perf_counter() + time_limit if time_limit else None
+        position_hash = board.get_position_hash()
+
+        try:
+            for mate_in in range(1, max_moves + 1):
+                plies_left = 2 * mate_in - 1
+                self.mid(board, position_hash, True, plies_left, INFINITY, INFINITY)
+                if self.lookup(position_hash, plies_left)[0] == 0:
+                    self.deadline = None  # the mate is found: re-proving evicted nodes of its line may take a while
+                    return mate_in, self.mating_line(board, plies_left)
+        except SearchTimeout:
+            pass
+        finally:
+            self.deadline = None
+        return None
+
+    def prove_child(self, board, move, child_hash, child_attacking, child_plies):
+        """Searches the child reached by {move} until it is solved (again, after its entry was evicted)."""
+        self.mid(self.make_child(board, move), child_hash, child_attacking, child_plies, INFINITY, INFINITY)
+        return self.lookup(child_hash, child_plies)
+
+    def mating_line(self, board, plies_left):
+        """
+        Follows the proof from a proven root: quickest mating check, longest defence. Proofs evicted from the
+        table are searched again; the line ends early only if that fails.
+        """
+        line = []
+        attacking = True
+        position_hash = board.get_position_hash()
+
+        while True:
+            children, _ = self.expand(board, position_hash, attacking)
+            if not children or plies_left <= 0:
+                return line
+
+            best = None
+            for move, child_hash in children:
+                entry = self.lookup(child_hash, plies_left - 1)
+                if entry[0] != 0:
+                    if attacking:
+                        continue
+                    # Evicted from the table: prove this reply again
+                    entry = self.prove_child(board, move, child_hash, True, plies_left - 1)
+                    if entry[0] != 0:
+                        return line
+                if best is None or (entry[2] < best[0] if attacking else entry[2] > best[0]):
+                    best = (entry[2], move, child_hash)
+
+            if best is None:
+                # Every mating check was evicted from the table: prove the checks again until one mates
+                for move, child_hash in children:
+                    entry = self.prove_child(board, move, child_hash, False, plies_left - 1)
+                    if entry[0] == 0:
+                        best = (entry[2], move, child_hash)
+                        break
+                else:
+                    return line
+
+            _, move, position_hash = best
+            line.append(move)
+            board = self.make_child(board, move)
+            attacking = not attacking
+            plies_left -= 1
+
+
+def move_to_uci(move) -> str:
+    """((6, 4), (4, 4), None) => "e2e4"; promotions get their piece letter ("e7e8n")."""
+    start_location, end_location, promotion_choice = move
+    return location_to_name(start_location) + location_to_name(end_location) + (promotion_choice or "").lower()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find a forced mate for the side to move.")
+    parser.add_argument("fen", help="position, in FEN")
+    parser.add_argument("--moves", type=int, default=5, help="longest mate searched, in moves")
+    parser.add_argument("--time", type=float, default=None, help="time limit, in seconds")
+    args = parser.parse_args()
+
+    board = Board.from_fen(args.fen)
+    mate_finder = MateFinder()
+    start_time = time.perf_counter()
+    result = mate_finder.find_mate(board, args.moves, args.time)
+    elapsed = time.perf_counter() - start_time
+
+    if result:
+        mate_in, line = result
+        print(f"mate in {mate_in}: {' '.join(move_to_uci(move) for move in line)}")
+    else:
+        print(f"no mate in {args.moves} found")
+    print(f"{mate_finder.nodes} nodes, {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+""" Monte Carlo tree search (UCT) engine mode: random playouts instead of alpha-beta, playouts on a process pool """
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import copy
+import math
+import multiprocessing
+import queue
+import random
+import time
+from array import array
+
+from AIBot import AIBot
+from Board import Board, encode_move, decode_move, location_to_name
+
+MAX_NODES = 200000  # Tree capacity: once full, leaves are still played out but no longer expanded
+EXPLORATION = 1.4  # UCT exploration constant
+VIRTUAL_LOSS = 1  # Losses added along a path while its playout runs, so parallel selections spread out
+PLAYOUT_PLIES = 16  # Random moves per playout before the position is scored by the evaluation
+CAPTURE_CHANCE = 0.5  # Chance a playout move is a capture, when one is available
+EVALUATION_SCALE = 400  # Centipawns per factor 10 in the odds of winning (logistic, as in Elo)
+MOVE_TIME = 2.0  # Seconds per move without a clock
+TASKS_PER_WORKER = 2  # Playouts queued per worker process, so none of them waits for the tree
+NOT_TERMINAL = -1  # terminal_results of a node with moves (or not yet looked at)
+
+
+##################################
+""" Playouts """
+
+
+def random_move(board, color):
+    """
+    A random legal move (start_location, end_location) of {color}, or None if there is none. Pseudo-legal moves
+    are drawn at random and checked one at a time, captures first with CAPTURE_CHANCE: usually only one or two
+    moves are ever checked for legality.
+    """
+    pieces = board.white_pieces if color == "white" else board.black_pieces
+    moves = [(piece, end_location) for piece in pieces for end_location in piece.get_unfiltered_moves(board)]
+    captures = [move for move in moves if board.get_square(move[1]).piece]
+
+    for candidates in ((captures, moves) if random.random() < CAPTURE_CHANCE else (moves,)):
+        while candidates:
+            index = random.randrange(len(candidates))
+            piece, end_location = candidates[index]
+            if board.filter_moves([end_location], piece):
+                return piece.current_square.location, end_location
+            candidates[index] = candidates[-1]
+            candidates.pop()
+    return None
+
+
+def playout(board) -> float:
+    """
+    Plays random moves from {board} (modified in place) for PLAYOUT_PLIES plies, then scores the position.
+    Returns the result for the side to move on the original board: 1 win, 0.5 draw, 0 loss, or in between
+    from the evaluation when the playout ends undecided.
+    """
+    color = board.current_turn
+    for _ in range(PLAYOUT_PLIES):
+        move = random_move(board, board.current_turn)
+        if move is None:
+            if board.checked_color != board.current_turn:
+                return 0.5  # stalemate
+            return 0.0 if board.current_turn == color else 1.0
+        board.make_move(*move)
+        if board.is_draw():
+            return 0.5
+
+    evaluation = AIBot.evaluate_board(board)
+    white_result = 1 / (1 + 10 ** (-evaluation / EVALUATION_SCALE))
+    return white_result if color == "white" else 1 - white_result
+
+
+def playout_worker(node, fen):
+    """Pool task: (node, result of a playout from the position in FEN)."""
+    return node, playout(Board.from_fen(fen))
+
+
+##################################
+""" Search tree """
+
+
+class MonteCarloSearch:
+    """
+    UCT over array-backed nodes: node i is described by entry i of each array, and the children of a node are
+    a block of consecutive entries (first_child, child_count). Positions are not stored; a node's board is
+    rebuilt by replaying the moves from the root. A node's value is the sum of playout results for the side
+    that played its move. The tree is kept between moves: the subtree of the position reached is compacted
+    into a new root, and only an unrelated position (new game, takeback) starts from an empty tree.
+    """
+
+    def __init__(self, workers: int = 0, max_nodes: int = MAX_NODES):
+        """workers: playout processes; 0 plays out in this process."""
+        self.max_nodes = max_nodes
+        self.moves = array("H", [0]) * max_nodes  # move code (Board.encode_move) leading to the node
+        self.parents = array("i", [0]) * max_nodes
+        self.first_child = array("i", [0]) * max_nodes  # 0: not expanded
+        self.child_count = array("H", [0]) * max_nodes
+        self.visits = array("I", [0]) * max_nodes
+        self.values = array("d", [0]) * max_nodes
+        self.virtual_losses = array("H", [0]) * max_nodes
+        self.terminal_results = array("b", [NOT_TERMINAL]) * max_nodes  # result for the side to move at the node
+        self.node_count = 0
+        self.root_board = None
+
+        # spawn: the GUI process runs SDL and a sound loading thread, which a forked child should not inherit
+        self.pool = multiprocessing.get_context("spawn").Pool(workers) if workers else None
+        self.workers = workers
+
+    def reset(self, board):
+        self.root_board = copy.deepcopy(board)
+        self.node_count = 1
+        self.clear_node(0, 0, 0)
+
+    def clear_node(self, node, parent, move):
+        self.moves[node] = move
+        self.parents[node] = parent
+        self.first_child[node] = 0
+        self.child_count[node] = 0
+        self.visits[node] = 0
+        self.values[node] = 0.0
+        self.virtual_losses[node] = 0
+        self.terminal_results[node] = NOT_TERMINAL
+
+    def set_root(self, board, last_code=None):
+        """
+        Moves the root to {board}'s position: the root itself, or the child reached by move {last_code} (the
+        opponent's reply to the move passed to advance(), as Board.encode_move codes it), else a new tree.
+        The code is passed in because board.last_move does not tell it: after castling it holds the rook's move.
+        """
+        if self.root_board is not None and self.root_board.get_position_hash() != board.get_position_hash():
+            if last_code is not None:
+                self.advance(last_code)
+            if self.root_board is not None and self.root_board.get_position_hash() != board.get_position_hash():
+                self.root_board = None
+        if self.root_board is None:
+            self.reset(board)
+
+    def advance(self, code):
+        """Makes the child reached by move {code} the root, keeping its subtree (compacted to the front)."""
+        child = self.find_child(0, code)
+        if child is None:
+            self.root_board = None
+            return
+        self.root_board.make_move(*decode_move(code))
+
+        # Breadth-first order keeps every block of children consecutive. The subtree is read completely
+        # before it is written back: a node can be moved onto the old place of one not yet read
+        old_nodes = [child]
+        new_parents = [0]
+        for new_node, old_node in enumerate(old_nodes):
+            first_child = self.first_child[old_node]
+            if first_child:
+                old_nodes.extend(range(first_child, first_child + self.child_count[old_node]))
+                new_parents.extend([new_node] * self.child_count[old_node])
+        kept = [(self.moves[node], self.child_count[node], self.visits[node], self.values[node],
+                 self.terminal_results[node], self.first_child[node] != 0) for node in old_nodes]
+
+        self.node_count = len(old_nodes)
+        next_child = 1  # where the next block of children starts, in the same breadth-first order
+        for new_node, (move, child_count, visits, value, terminal_result, expanded) in enumerate(kept):
+            self.clear_node(new_node, new_parents[new_node], move)
+            self.child_count[new_node] = child_count
+            self.visits[new_node] = visits
+            self.values[new_node] = value
+            self.terminal_results[new_node] = terminal_result
+            if expanded:
+                self.first_child[new_node] = next_child
+                next_child += child_count
+
+    def find_child(self, node, code):
+        """The child of {node} reached by move {code}, or None."""
+        first_child = self.first_child[node]
+        if first_child:
+            for child in range(first_child, first_child + self.child_count[node]):
+                if self.moves[child] == code:
+                    return child
+        return None
+
+    ##################################
+    """ Search """
+
+    def select(self):
+        """
+        Descends from the root by UCT (virtual losses count as visits without a win) to a leaf, expanding it if
+        it was played out before. Returns (leaf, board of the leaf); the path carries a virtual loss.
+        """
+        node = 0
+        board = copy.deepcopy(self.root_board)
+        while True:
+            self.virtual_losses[node] += VIRTUAL_LOSS
+            if self.terminal_results[node] != NOT_TERMINAL:
+                return node, board
+            if not self.first_child[node]:
+                if self.visits[node] == 0 and node != 0:
+                    return node, board
+                if not self.expand(node, board):
+                    return node, board
+
+            node = self.best_child(node)
+            board.make_move(*decode_move(self.moves[node]))
+
+    def best_child(self, node):
+        parent_visits = self.visits[node] + self.virtual_losses[node]
+        log_visits = math.log(parent_visits or 1)
+        best_score, best_child = -1.0, None
+        first_child = self.first_child[node]
+        for child in range(first_child, first_child + self.child_count[node]):
+            visits = self.visits[child] + self.virtual_losses[child]
+            if visits == 0:
+                return child  # every move is tried once first
+            score = self.values[child] / visits + EXPLORATION * math.sqrt(log_visits / visits)
+            if score > best_score:
+                best_score, best_child = score, child
+        return best_child
+
+    def expand(self, node, board) -> bool:
+        """
+        Adds the children of {node}, or marks it terminal (mate, stalemate, draw). False if the node is
+        terminal or the tree is full.
+        """
+        if board.is_draw():
+            self.terminal_results[node] = 1
+            return False
+        legal_moves = board.get_legal_moves(board.current_turn)
+        if not legal_moves:
+            self.terminal_results[node] = 0 if board.checked_color == board.current_turn else 1
+            return False
+        if self.node_count + len(legal_moves) > self.max_nodes:
+            return False
+
+        self.first_child[node] = self.node_count
+        self.child_count[node] = len(legal_moves)
+        for start_location, end_location in legal_moves:
+            self.clear_node(self.node_count, node, encode_move(start_location, end_location))
+            self.node_count += 1
+        return True
+
+    def backpropagate(self, node, result):
+        """{result}: for the side to move at {node}. Removes the virtual losses of the path."""
+        while True:
+            self.virtual_losses[node] -= VIRTUAL_LOSS
+            self.visits[node] += 1
+            self.values[node] += 1 - result  # the node's value is for the side that played into it
+            if node == 0:
+                return
+            result = 1 - result
+            node = self.parents[node]
+
+    def run_playouts(self, deadline, max_playouts):
+        """Selects, plays out and backpropagates until the deadline or the playout limit. Returns the playouts run."""
+        playouts = 0
+        if not self.pool:
+            while time.perf_counter() < deadline and playouts < max_playouts:
+                node, board = self.select()
+                terminal_result = self.terminal_results[node]
+                self.backpropagate(node, terminal_result / 2 if terminal_result != NOT_TERMINAL else playout(board))
+                playouts += 1
+            return playouts
+
+        # Parallel: keep TASKS_PER_WORKER playouts per worker in flight; virtual losses steer each new selection
+        # away from the paths still being played out
+        results = queue.Queue()  # filled by the pool's result thread: (node, result), or (node, exception)
+        pending = 0
+        error = None
+        while True:
+            while pending < self.workers * TASKS_PER_WORKER and time.perf_counter() < deadline \
+                    and playouts + pending < max_playouts:
+                node, board = self.select()
+                terminal_result = self.terminal_results[node]
+                if terminal_result != NOT_TERMINAL:
+                    self.backpropagate(node, terminal_result / 2)
+                    playouts += 1
+                    continue
+                self.pool.apply_async(playout_worker, (node, board.to_fen()), callback=results.put,
+                                      error_callback=lambda exception, node=node: results.put((node, exception)))
+                pending += 1
+            if not pending:
+                if error:
+                    raise error
+                return playouts
+            node, result = results.get()
+            if isinstance(result, BaseException):
+                # A failed playout still takes its virtual losses back (as a draw); no new playout is started,
+                # and the error is raised once the ones running are in
+                error = error or result
+                deadline = 0
+                result = 0.5
+            self.backpropagate(node, result)
+            pending -= 1
+            playouts += 1
+
+    def search(self, board, time_limit=MOVE_TIME, max_playouts=None, last_code=None):
+        """
+        Searches {board} for time_limit seconds (or max_playouts playouts), reusing the tree of the previous
+        search when the position follows from it (see set_root for last_code). Returns (win_rate, best_move, pv,
+        playouts) with best_move as (piece, end_location) on {board}, win_rate the expected result of the side
+        to move, and pv the most visited line as (start_location, end_location) tuples.
+        """
+        self.set_root(board, last_code)
+        playouts = self.run_playouts(time.perf_counter() + time_limit, max_playouts or float("inf"))
+
+        pv = []
+        node = 0
+        while self.first_child[node]:
+            first_child = self.first_child[node]
+            node = max(range(first_child, first_child + self.child_count[node]), key=lambda child: self.visits[child])
+            if not self.visits[node]:
+                break
+            pv.append(decode_move(self.moves[node])[:2])
+
+        if not pv:
+            return 0.5, None, [], playouts
+        best_child = self.find_child(0, encode_move(*pv[0]))
+        win_rate = self.values[best_child] / self.visits[best_child]
+        return win_rate, (board.get_square(pv[0][0]).piece, pv[0][1]), pv, playouts
+
+    def close(self):
+        if self.pool:
+            self.pool.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo tree search of a position.")
+    parser.add_argument("fen", nargs="?", default=Board().to_fen(), help="position, in FEN")
+    parser.add_argument("--time", type=float, default=MOVE_TIME, help="seconds")
+    parser.add_argument("--workers", type=int, default=0, help="playout processes (0: none)")
+    args = parser.parse_args()
+
+    monte_carlo = MonteCarloSearch(args.workers)
+    win_rate, best_move, pv, playouts = monte_carlo.search(Board.from_fen(args.fen), args.time)
+    monte_carlo.close()
+    print(f"{' '.join(location_to_name(start) + location_to_name(end) for start, end in pv) or 'no move'}  "
+          f"win rate {win_rate:.2f}  {playouts} playouts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+""" Opening explorer: on-disk index of (position -> move -> white wins / draws / black wins) built from PGN games """
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import heapq
+import itertools
+import mmap
+import multiprocessing
+import struct
+import sys
+import tempfile
+
+from Board import Board, encode_move, decode_move, location_to_name
+from PgnReader import read_games, result_to_score
+
+MAGIC = b"ICPX"  # Irad's Chess Position indeX
+FORMAT_VERSION = 1
+
+# Header: magic, version, Bloom hash count, entry count, Bloom filter size in bits (0 = no filter).
+# Then the entries, sorted by (position hash, move), then the Bloom filter bytes.
+HEADER_FORMAT = struct.Struct("<4sBB2xQQ")
+ENTRY_FORMAT = struct.Struct("<QHIII")  # position hash, move (Board.encode_move), white wins, draws, black wins
+HASH_FORMAT = struct.Struct("<Q")
+
+DEFAULT_MAX_PLIES = 40  # Only the opening is indexed
+BLOOM_BITS_PER_POSITION = 10  # ~1% false positives with BLOOM_HASHES hashes
+BLOOM_HASHES = 7
+MAX_MEMORY_ENTRIES = 2000000  # (position, move) pairs counted in memory before a sorted run is spilled to disk
+GAMES_PER_TASK = 64  # Games sent to an import worker at once
+OPENING_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "explorer.icpx")
+
+
+##################################
+""" Importing """
+
+
+def game_positions(game):
+    """
+    Import worker: replays one (headers, san_moves) game through the Board rules and returns
+    [(position_hash, move_code), ...] for its first plies, plus the result index (0 white win, 1 draw, 2 black win).
+    """
+    headers, san_moves, max_plies = game
+    score = result_to_score(headers.get("Result", "*"))
+    if score is None:
+        return None, []
+
+    board = Board.from_fen(headers["FEN"]) if "FEN" in headers else Board()
+    positions = []
+    for san in san_moves[:max_plies]:
+        try:
+            move = board.parse_san(san)
+        except ValueError:
+            break  # keep the moves read so far
+        positions.append((board.get_position_hash(), encode_move(*move)))
+        board.make_move(*move)
+    return {1.0: 0, 0.5: 1, 0.0: 2}[score], positions
+
+
+def import_games_batch(games):
+    return [game_positions(game) for game in games]
+
+
+def write_run(counts, run_file):
+    """Writes the in-memory counts as one sorted run of entries."""
+    for key in sorted(counts):
+        white_wins, draws, black_wins = counts[key]
+        run_file.write(ENTRY_FORMAT.pack(key >> 16, key & 0xFFFF, white_wins, draws, black_wins))
+    run_file.flush()
+    run_file.seek(0)
+
+
+def read_run(run_file):
+    """Yields ((position_hash, move), counts) from a sorted run file."""
+    chunk_size = ENTRY_FORMAT.size * 4096
+    while True:
+        chunk = run_file.read(chunk_size)
+        if not chunk:
+            return
+        for position_hash, move, white_wins, draws, black_wins in ENTRY_FORMAT.iter_unpack(chunk):
+            yield (position_hash, move), (white_wins, draws, black_wins)
+
+
+def build_index(pgn_lines, path, max_plies=DEFAULT_MAX_PLIES, bloom=True, workers=None, log=sys.stderr):
+    """
+    Streams PGN games into the index file at {path}. Games are replayed over a pool of processes; counts
+    are aggregated in memory, spilled as sorted runs when memory fills up, and merged into the final file.
+    Returns the number of indexed games.
+    """
+    counts = {}  # position_hash << 16 | move => [white wins, draws, black wins]
+    runs = []
+    num_games = 0
+    pending_entries = 0
+
+    games = ((headers, san_moves, max_plies) for headers, san_moves in read_games(pgn_lines))
+    batches = iter(lambda: list(itertools.islice(games, GAMES_PER_TASK)), [])
+
+    with multiprocessing.Pool(workers or os.cpu_count() or 1) as pool:
+        for results in pool.imap(import_games_batch, batches):
+            for result_index, positions in results:
+                if result_index is None:
+                    continue
+                num_games += 1
+                for position_hash, move in positions:
+                    key = position_hash << 16 | move
+                    entry = counts.get(key)
+                    if entry is None:
+                        entry = counts[key] = [0, 0, 0]
+                    entry[result_index] += 1
+
+            if len(counts) >= MAX_MEMORY_ENTRIES:
+                runs.append(tempfile.TemporaryFile())
+                write_run(counts, runs[-1])
+                pending_entries += len(counts)
+                counts = {}
+            if log and num_games and num_games % 10000 < GAMES_PER_TASK:
+                print(f"{num_games} games", file=log)
+
+    runs.append(tempfile.TemporaryFile())
+    write_run(counts, runs[-1])
+    pending_entries += len(counts)
+    del counts
+
+    write_index(path, heapq.merge(*(read_run(run) for run in runs)), pending_entries if bloom else 0)
+    for run in runs:
+        run.close()
+    return num_games
+
+
+def write_index(path, sorted_entries, max_positions):
+    """
+    Writes the index file from ((position_hash, move), counts) pairs in sorted order, summing the counts
+    of equal keys (they come from different runs). max_positions sizes the Bloom filter (0: no filter).
+    """
+    bloom_bits = max(64, max_positions * BLOOM_BITS_PER_POSITION) if max_positions else 0
+    bloom_filter = bytearray((bloom_bits + 7) // 8)
+    num_entries = 0
+
+    with open(path, "wb") as index_file:
+        index_file.write(HEADER_FORMAT.pack(MAGIC, FORMAT_VERSION, BLOOM_HASHES, 0, 0))  # completed below
+
+        for key, group in itertools.groupby(sorted_entries, key=lambda entry: entry[0]):
+            totals = [sum(counts) for counts in zip(*(entry[1] for entry in group))]
+            index_file.write(ENTRY_FORMAT.pack(*key, *totals))
+            num_entries += 1
+            if bloom_bits:
+                for bit in bloom_bit_indexes(key[0], bloom_bits):
+                    bloom_filter[bit >> 3] |= 1 << (bit & 7)
+
+        index_file.write(bloom_filter)
+        index_file.seek(0)
+        index_file.write(HEADER_FORMAT.pack(MAGIC, FORMAT_VERSION, BLOOM_HASHES, num_entries, bloom_bits))
+
+
+def bloom_bit_indexes(position_hash, bloom_bits):
+    """Double hashing: Zobrist hashes are already uniformly random, so their two halves serve as the hashes."""
+    low, high = position_hash & 0xFFFFFFFF, (position_hash >> 32) | 1
+    return [(low + i * high) % bloom_bits for i in range(BLOOM_HASHES)]
+
+
+##################################
+""" Querying """
+
+
+class PositionIndex:
+    """Read-only view of an index file, memory-mapped: lookups touch only the pages they need."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.bloom_hashes, self.num_entries, self.bloom_bits = HEADER_FORMAT.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a position index")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Unsupported position index version: {version}")
+        self.entries_offset = HEADER_FORMAT.size
+        self.bloom_offset = self.entries_offset + self.num_entries * ENTRY_FORMAT.size
+
+    def might_contain(self, position_hash) -> bool:
+        """False if the position is certainly absent (Bloom filter), True if it may be present."""
+        if not self.bloom_bits:
+            return True
+        return all(self.map[self.bloom_offset + (bit >> 3)] & (1 << (bit & 7))
+                   for bit in bloom_bit_indexes(position_hash, self.bloom_bits))
+
+    def entry_hash(self, index) -> int:
+        return HASH_FORMAT.unpack_from(self.map, self.entries_offset + index * ENTRY_FORMAT.size)[0]
+
+    def lookup(self, position_hash):
+        """
+        Returns [(move_code, white_wins, draws, black_wins), ...] for a position, most played move first.
+        Binary search for the first entry of the position, then a scan over its moves.
+        """
+        if not self.might_contain(position_hash):
+            return []
+
+        low, high = 0, self.num_entries
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry_hash(middle) < position_hash:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        while low < self.num_entries:
+            entry_hash, move, white_wins, draws, black_wins = ENTRY_FORMAT.unpack_from(
+                self.map, self.entries_offset + low * ENTRY_FORMAT.size)
+            if entry_hash != position_hash:
+                break
+            moves.append((move, white_wins, draws, black_wins))
+            low += 1
+
+        moves.sort(key=lambda entry: -sum(entry[1:]))
+        return moves
+
+    def get_board_stats(self, board):
+        """lookup for the position on {board} with its side to move."""
+        return self.lookup(board.get_position_hash())
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def format_stats(moves, limit=None) -> list:
+    """Human-readable lines: "e2-e4   1234   38% / 31% / 31%" (white wins / draws / black wins)."""
+    lines = []
+    for move, white_wins, draws, black_wins in moves[:limit]:
+        start_location, end_location, _ = decode_move(move)
+        games = white_wins + draws + black_wins
+        lines.append(f"{location_to_name(start_location)}-{location_to_name(end_location)}  {games:>7}  "
+                     f"{100 * white_wins // games}% / {100 * draws // games}% / {100 * black_wins // games}%")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query an opening explorer index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="index PGN games")
+    build_parser.add_argument("pgn", nargs="?", help="PGN file (default: stdin)")
+    build_parser.add_argument("-o", "--output", default=OPENING_INDEX_PATH)
+    build_parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES)
+    build_parser.add_argument("--no-bloom", action="store_true", help="do not write a Bloom filter")
+    build_parser.add_argument("--workers", type=int, default=None, help="import processes (default: CPU count)")
+
+    query_parser = commands.add_parser("query", help="show the moves played from a position")
+    query_parser.add_argument("fen")
+    query_parser.add_argument("-i", "--index", default=OPENING_INDEX_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        lines = open(args.pgn) if args.pgn else sys.stdin
+        with lines:
+            num_games = build_index(lines, args.output, args.max_plies, not args.no_bloom, args.workers)
+        print(f"{num_games} games indexed into {args.output}", file=sys.stderr)
+    else:
+        index = PositionIndex(args.index)
+        print("\n".join(format_stats(index.get_board_stats(Board.from_fen(args.fen)))) or "position not found")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+""" Parallel search: several processes search the same position and share a transposition table (lazy SMP) """
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import multiprocessing
+import time
+
+from AIBot import AIBot
+from Board import Board, location_to_name
+from SharedTranspositionTable import SharedTranspositionTable, SHARED_TABLE_SIZE
+
+HELPER_EXTRA_DEPTH = 1  # Helpers may deepen this much further than the main search, so they never run out of work
+
+
+def search_worker(worker_index, table_name, command_queue, result_queue, stop_flag):
+    """
+    Runs in each worker process. Commands are (fen, max_depth, time_limit), or None to quit.
+    Worker 0 is the main search: it reports (0, depth, evaluation, pv) after every completed depth.
+    Every worker reports (worker_index, None, None, None) once it stopped. The other workers are helpers:
+    their only output is what they write into the shared table, which the main search then finds there.
+    Odd helpers start one depth deeper, so the workers are not all busy with the same iteration.
+    """
+    bot = AIBot(None, "white")
+    table = SharedTranspositionTable(name=table_name) if table_name else None
+    if table:
+        bot.transposition_table = table
+    bot.stop_requested = lambda: stop_flag.value
+
+    while True:
+        command = command_queue.get()
+        if command is None:
+            break
+
+        fen, max_depth, time_limit = command
+        board = Board.from_fen(fen)
+        bot.color = board.current_turn
+        if worker_index == 0:
+            def send_depth(lines, depth):
+                evaluation, _, pv = lines[0]
+                result_queue.put((0, depth, evaluation, pv))
+
+            bot.search_lines(board, max_depth, 1, time_limit, on_depth=send_depth)
+        else:
+            bot.search_lines(board, max_depth + HELPER_EXTRA_DEPTH, 1, start_depth=1 + worker_index % 2)
+        result_queue.put((worker_index, None, None, None))
+
+    if table:
+        table.close()
+
+
+class ParallelSearch:
+    """
+    Keeps {workers} search processes running between searches. With shared=False, every worker keeps a private
+    table instead, which is what the shared table is measured against.
+    """
+
+    def __init__(self, workers: int = None, shared: bool = True, table_size: int = SHARED_TABLE_SIZE):
+        # spawn: the GUI process runs SDL and a sound loading thread, which a forked child should not inherit
+        context = multiprocessing.get_context("spawn")
+        self.table = SharedTranspositionTable(table_size) if shared else None
+        self.result_queue = context.Queue()
+        self.stop_flag = context.Value("b", 0)
+        self.command_queues = []
+        self.processes = []
+
+        for worker_index in range(workers or os.cpu_count() or 1):
+            command_queue = context.Queue()
+            process = context.Process(target=search_worker, daemon=True,
+                                      args=(worker_index, self.table.name if self.table else None, command_queue,
+                                            self.result_queue, self.stop_flag))
+            process.start()
+            self.command_queues.append(command_queue)
+            self.processes.append(process)
+
+    def search(self, board, max_depth, time_limit=None, on_depth=None):
+        """
+        Searches {board} on every worker. Returns (evaluation, best_move, pv, depth) of the main search like
+        AIBot.search, best_move being (piece, end_location) on {board}. on_depth(depth, evaluation, pv, elapsed),
+        if given, is called as the main search completes each depth.
+        """
+        start_time = time.perf_counter()
+        if self.table:
+            self.table.new_search()
+        self.stop_flag.value = 0
+        fen = board.to_fen()
+        for command_queue in self.command_queues:
+            command_queue.put((fen, max_depth, time_limit))
+
+        result = None
+        running = len(self.processes)
+        while running:
+            worker_index, depth, evaluation, pv = self.result_queue.get()
+            if depth is None:
+                running -= 1
+                if worker_index == 0:
+                    self.stop_flag.value = 1  # the main search is over: stop the helpers
+            else:
+                result = (evaluation, pv, depth)
+                if on_depth:
+                    on_depth(depth, evaluation, pv, time.perf_counter() - start_time)
+
+        evaluation, pv, depth = result
+        best_move = (board.get_square(pv[0][0]).piece, pv[0][1]) if pv else None
+        return evaluation, best_move, pv, depth
+
+    def close(self):
+        for command_queue in self.command_queues:
+            command_queue.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        if self.table:
+            self.table.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to depth of the parallel search, with a shared "
+                                                 "transposition table and with private ones.")
+    parser.add_argument("fens", nargs="*", default=[Board().to_fen()], help="positions, in FEN")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None, help="search processes (default: CPU count)")
+    args = parser.parse_args()
+
+    for shared in (False, True):
+        parallel_search = ParallelSearch(args.workers, shared)
+        parallel_search.search(Board(), 1)  # waits for every worker to start, so start-up is not timed
+        total_time = 0.0
+        for fen in args.fens:
+            depth_times = []  # (depth, seconds since the search started)
+            evaluation, best_move, pv, depth = parallel_search.search(
+                Board.from_fen(fen), args.depth,
+                on_depth=lambda depth, evaluation, pv, elapsed: depth_times.append((depth, elapsed)))
+            total_time += depth_times[-1][1]
+            moves = " ".join(location_to_name(start) + location_to_name(end) for start, end in pv)
+            times = " ".join(f"{depth}:{elapsed:.2f}s" for depth, elapsed in depth_times)
+            print(f"{'shared' if shared else 'private'}  {fen}  {evaluation}  {moves}  {times}")
+        print(f"{'shared' if shared else 'private'} tables: {total_time:.2f}s to depth {args.depth}")
+        parallel_search.close()
+
+
+if __name__ == "__main__":
+    main()
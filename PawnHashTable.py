@@ -0,0 +1,42 @@
+""" Fixed-size table of pawn-structure scores per pawn placement, shared by every evaluation """
+
+PAWN_HASH_SIZE = 1 << 14  # Number of slots (a power of two)
+
+
+class PawnHashTable:
+    """
+    Direct-mapped: a key lives in slot key & (size - 1) and replaces whatever was there.
+    Pawns move rarely within a search tree, so nearly every leaf finds its pawn structure already scored.
+    Keys come from the pawns alone: the pawn shield depends on the kings too, so it is not part of the score.
+    """
+
+    def __init__(self, size: int = PAWN_HASH_SIZE):
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.scores = [0] * size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the stored score for key, or None."""
+        slot = key & self.mask
+        if self.keys[slot] != key:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return self.scores[slot]
+
+    def put(self, key, score):
+        slot = key & self.mask
+        self.keys[slot] = key
+        self.scores[slot] = score
+
+    def clear(self):
+        self.keys = [None] * len(self.keys)
+        self.hits = 0
+        self.misses = 0
+
+
+# One table for the whole process, like the legal move cache: search boards are copies of each other
+pawn_hash_table = PawnHashTable()
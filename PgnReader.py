@@ -0,0 +1,55 @@
+""" Streams games out of PGN text, one game at a time """
+import re
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+HEADER_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]$')
+MOVE_NUMBER_PATTERN = re.compile(r"^\d+\.+")
+
+
+def read_games(lines):
+    """
+    Yields (headers, san_moves) for every game of a PGN stream. Comments, variations, NAGs and
+    move numbers are dropped; only the main line is kept. Reads line by line, so huge files are fine.
+    """
+    headers, movetext = {}, []
+
+    for line in lines:
+        line = line.strip()
+        if line.startswith("["):
+            match = HEADER_PATTERN.match(line)
+            if match:
+                if movetext:  # a header after movetext starts the next game
+                    yield headers, parse_movetext("\n".join(movetext))
+                    headers, movetext = {}, []
+                headers[match.group(1)] = match.group(2)
+            continue
+
+        if line and not line.startswith("%"):
+            movetext.append(line)  # kept as separate lines: a ";" comment ends at the end of its line
+
+    if headers or movetext:
+        yield headers, parse_movetext("\n".join(movetext))
+
+
+def parse_movetext(movetext: str) -> list:
+    """ "1. e4 {best} e5 (1... c5) 2. Nf3 $1 1-0" => ["e4", "e5", "Nf3"] """
+    # Drop comments and (possibly nested) variations
+    movetext = re.sub(r"\{[^}]*\}|;[^\n]*", " ", movetext)
+    while "(" in movetext:
+        stripped = re.sub(r"\([^()]*\)", " ", movetext)
+        if stripped == movetext:
+            break
+        movetext = stripped
+
+    san_moves = []
+    for token in movetext.split():
+        token = MOVE_NUMBER_PATTERN.sub("", token)
+        if not token or token.startswith("$") or token in RESULTS:
+            continue
+        san_moves.append(token)
+    return san_moves
+
+
+def result_to_score(result: str):
+    """Game result from white's point of view: 1.0, 0.5 or 0.0 (None if unknown)."""
+    return {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}.get(result)
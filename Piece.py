@@ -1,13 +1,91 @@
+import copy
 from abc import ABC, abstractmethod
 
 from typing import List, Tuple
 
+##################################
+""" Move tables, built once at import """
+# Every table is indexed by square index (row * 8 + col) and holds (row, col) locations, the same tuples
+# the generators return: no offset arithmetic or bounds checks are left for move generation.
+
+
+def build_targets(offsets):
+    """For every square, the squares one offset away that are still on the board."""
+    return [tuple((row + row_offset, col + col_offset) for row_offset, col_offset in offsets
+                  if 0 <= row + row_offset < 8 and 0 <= col + col_offset < 8)
+            for row in range(8) for col in range(8)]
+
+
+def build_rays(directions):
+    """For every square, one ray per direction: the squares from the nearest outwards to the board edge."""
+    rays = []
+    for row in range(8):
+        for col in range(8):
+            square_rays = []
+            for row_step, col_step in directions:
+                ray = []
+                current_row, current_col = row + row_step, col + col_step
+                while 0 <= current_row < 8 and 0 <= current_col < 8:
+                    ray.append((current_row, current_col))
+                    current_row, current_col = current_row + row_step, current_col + col_step
+                if ray:  # rays running straight off the board are left out
+                    square_rays.append(tuple(ray))
+            rays.append(tuple(square_rays))
+    return rays
+
+
+ORTHOGONAL_DIRECTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0)]  # Right, left, down, up
+DIAGONAL_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]  # Down-right, down-left, up-right, up-left
+KNIGHT_OFFSETS = [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)]
+
+KNIGHT_TARGETS = build_targets(KNIGHT_OFFSETS)
+KING_TARGETS = build_targets(ORTHOGONAL_DIRECTIONS + DIAGONAL_DIRECTIONS)
+# The squares a king may not step on next to the enemy king: its targets and its own square
+KING_ZONES = [frozenset(targets + (divmod(index, 8),)) for index, targets in enumerate(KING_TARGETS)]
+ROOK_RAYS = build_rays(ORTHOGONAL_DIRECTIONS)
+BISHOP_RAYS = build_rays(DIAGONAL_DIRECTIONS)
+QUEEN_RAYS = [rook_rays + bishop_rays for rook_rays, bishop_rays in zip(ROOK_RAYS, BISHOP_RAYS)]
+
+# color => per square: the one-square push (None on the last rank), the two-square push (None off the
+# starting rank), and the diagonal capture squares
+PAWN_PUSHES = {}
+PAWN_DOUBLE_PUSHES = {}
+PAWN_CAPTURES = {}
+for pawn_color, forward, starting_row in (("white", -1, 6), ("black", 1, 1)):
+    PAWN_PUSHES[pawn_color] = [(row + forward, col) if 0 <= row + forward < 8 else None
+                               for row in range(8) for col in range(8)]
+    PAWN_DOUBLE_PUSHES[pawn_color] = [(row + 2 * forward, col) if row == starting_row else None
+                                      for row in range(8) for col in range(8)]
+    PAWN_CAPTURES[pawn_color] = build_targets([(forward, -1), (forward, 1)])
+
 
 class Piece(ABC):
+    # No per-instance __dict__: keeps pieces small and cheap to deepcopy during search
+    __slots__ = ("color", "current_square")
+
+    image_paths = {}  # color => path to the image representing the piece (set by each subclass)
+
     def __init__(self, color: str, starting_square):
         self.color = color  # "white" or "black"
         self.current_square = starting_square  # Reference to the square this piece is currently on
-        self.image_path = None  # Path to the image representing the piece
+
+    def __deepcopy__(self, memo):
+        """
+        Copies the slots directly. The default deepcopy of a __slots__ class goes through
+        __reduce_ex__ and is about twice as slow, and boards are deep-copied at every search node.
+        """
+        piece = object.__new__(type(self))
+        memo[id(self)] = piece
+        piece.color = self.color
+        piece.current_square = copy.deepcopy(self.current_square, memo)
+        if isinstance(self, (Rook, King)):
+            piece.has_moved = self.has_moved
+        return piece
+
+    @property
+    def image_path(self) -> str:
+        """Path to the image representing the piece, shared by all pieces of the same type and color."""
+        return self.image_paths[self.color]
 
     @abstractmethod
     def get_unfiltered_moves(self, board) -> List[Tuple[int, int]]:
@@ -19,264 +97,142 @@ class Piece(ABC):
         pass
 
     # used for Queen, Rook and Bishop to find unfiltered_moves
-    def traverse_in_direction(self, board, start_row: int, start_col: int,
-                              vertical_direction: int, horizontal_direction: int) -> List[Tuple[int, int]]:
+    def slide(self, board, rays) -> List[Tuple[int, int]]:
         """
-        Helper method to traverse the board in a specific direction
-        until the edge of the board or a blocking piece is encountered.
+        Follows each precomputed ray of the piece's square until the edge of the board
+        or a blocking piece (included if it can be captured).
         """
         moves = []
-        current_row, current_col = start_row, start_col
+        squares = board.squares
 
-        # in each iteration we advance further in direction
-        while True:
-            current_row += vertical_direction
-            current_col += horizontal_direction
+        for ray in rays:
+            for location in ray:
+                piece = squares[location[0]][location[1]].piece
+                if piece:
+                    if piece.color != self.color:  # Can capture opponent's piece
+                        moves.append(location)
+                    break  # Stop advancing in this direction, as the piece blocks further movement
+                moves.append(location)
 
-            # Check if the position is out of bounds
-            if not (0 <= current_row < 8 and 0 <= current_col < 8):
-                break
+        return moves
 
-            square = board.get_square((current_row, current_col))
+    def step(self, board, targets) -> List[Tuple[int, int]]:
+        """Used for Knight and King: the precomputed target squares not occupied by a friendly piece."""
+        moves = []
+        squares = board.squares
 
-            if square.is_occupied():
-                if square.piece.color != self.color:  # Can capture opponent's piece
-                    moves.append((current_row, current_col))
-                break  # Stop advancing in this direction, as the piece blocks further movement
-            else:
-                moves.append((current_row, current_col))
+        for location in targets:
+            piece = squares[location[0]][location[1]].piece
+            # Add the move if the square is not occupied by a friendly piece
+            if not piece or piece.color != self.color:
+                moves.append(location)
 
         return moves
 
 
 class Pawn(Piece):
-    def __init__(self, color: str, current_square):
-        super().__init__(color, current_square)
-        self.image_path = f"images/{color}_pawn.png"
+    __slots__ = ()
+
+    image_paths = {"white": "images/white_pawn.png", "black": "images/black_pawn.png"}
 
     def get_unfiltered_moves(self, board) -> List[Tuple[int, int]]:
         possible_moves = []
         current_row, current_col = self.current_square.location
+        index = current_row * 8 + current_col
+        squares = board.squares
 
         # Determine the direction the pawn moves based on its color
         forward = -1 if self.color == "white" else 1
 
         # 1. Forward movement: one square forward
-        forward_square = board.get_square((current_row + forward, current_col))
-        if not forward_square.is_occupied():
-            possible_moves.append((current_row + forward, current_col))
+        push = PAWN_PUSHES[self.color][index]
+        if push and not squares[push[0]][current_col].piece:
+            possible_moves.append(push)
 
             # 2. Two squares forward only from the starting rank
-            if (self.color == "white" and current_row == 6) or (self.color == "black" and current_row == 1):
-                two_squares_forward = board.get_square((current_row + 2 * forward, current_col))
-                if not two_squares_forward.is_occupied():
-                    possible_moves.append((current_row + 2 * forward, current_col))
+            double_push = PAWN_DOUBLE_PUSHES[self.color][index]
+            if double_push and not squares[double_push[0]][current_col].piece:
+                possible_moves.append(double_push)
 
         # 3. Capturing diagonally
-        for dy in [-1, 1]:  # Check both diagonals
-            if 0 <= current_col + dy <= 7:  # Ensure we're within board bounds
-                diagonal_square = board.get_square((current_row + forward, current_col + dy))
-                if diagonal_square.is_occupied() and diagonal_square.piece.color != self.color:
-                    possible_moves.append((current_row + forward, current_col + dy))
+        for location in PAWN_CAPTURES[self.color][index]:
+            piece = squares[location[0]][location[1]].piece
+            if piece and piece.color != self.color:
+                possible_moves.append(location)
 
         # 4. En passant capture - conditions
-        # If there was a previous move (board.last_move is not None; only false on the first turn)
-        if board.last_move:
-            last_piece, start_square, end_square, captured_piece = board.last_move
-
-            # Check if the last move was a pawn moving two squares forward
-            if isinstance(last_piece, Pawn) and abs(start_square.location[0] - end_square.location[0]) == 2:
-
-                # Check if the opponent's pawn is in the same row as our pawn and is
-                # adjacent to our column (+-1 column difference)
-                if end_square.location[0] == current_row and abs(end_square.location[1] - current_col) == 1:
-
-                    # All en passant conditions are met, so we record information
-                    # to validate the capture later in `handle_square_selection`.
-                    # These three fields will allow `handle_square_selection` to
-                    # verify if the move is a valid en passant capture:
-
-                    # 1. `board.en_passant_end_location`: The location where our
-                    #     pawn will land after performing the en passant.
-                    #     This will help confirm the destination square during move selection.
-                    board.en_passant_end_location = (current_row + forward, end_square.location[1])
-
-                    # 2. `board.en_passant_square`: The square containing the opponent's
-                    #     pawn that is vulnerable to en passant capture.
-                    #     This square is where the pawn being captured is located.
-                    board.en_passant_square = board.get_square((current_row, end_square.location[1]))
-
-                    # 3. `board.en_passanting_pawns`: This field keeps
-                    #     track of the specific pawn eligible to perform en passant.
-                    #     This ensures that only this pawn can attempt the capture and not other pieces.
-                    board.en_passanting_pawns.append(self)
-
-                    # Add the potential en passant capture move to the possible_moves list for further evaluation.
-                    possible_moves.append((current_row + forward, end_square.location[1]))
+        # The board records the square a pawn skipped over with its last two-square move
+        # (board.en_passant_location, None otherwise). Only a pawn standing next to that pawn,
+        # on its own fifth rank (row 3 for white, row 4 for black), can capture onto it.
+        # Move generation only reads the board, it never writes to it.
+        en_passant_location = board.en_passant_location
+        if en_passant_location:
+            en_passant_row = 3 if self.color == "white" else 4
+            if current_row == en_passant_row and en_passant_location[0] == current_row + forward \
+                    and abs(en_passant_location[1] - current_col) == 1:
+                possible_moves.append(en_passant_location)
 
         return possible_moves
 
 
 class Rook(Piece):
+    __slots__ = ("has_moved",)
+
+    image_paths = {"white": "images/white_rook.png", "black": "images/black_rook.png"}
+
     def __init__(self, color: str, current_square):
         super().__init__(color, current_square)
-        self.image_path = f"images/{color}_rook.png"
         self.has_moved = False  # Tracks if the Rook has moved, important for castling
 
     def get_unfiltered_moves(self, board) -> List[Tuple[int, int]]:
-        possible_moves = []
         current_row, current_col = self.current_square.location
-
-        # Directions for rook movement: (vertical_direction, horizontal_direction)
-        directions = [
-            (0, 1),   # Right
-            (0, -1),  # Left
-            (1, 0),   # Down
-            (-1, 0)   # Up
-        ]
-
-        # Iterate over all four directions
-        for vertical_direction, horizontal_direction in directions:
-            # Get all possible moves in the current direction
-            direction_moves = self.traverse_in_direction(board, current_row, current_col,
-                                                         vertical_direction, horizontal_direction)
-            # Add these moves to the possible_moves list
-            possible_moves.extend(direction_moves)
-
-        return possible_moves
+        return self.slide(board, ROOK_RAYS[current_row * 8 + current_col])
 
 
 class Knight(Piece):
-    def __init__(self, color: str, current_square):
-        super().__init__(color, current_square)
-        self.image_path = f"images/{color}_knight.png"
+    __slots__ = ()
+
+    image_paths = {"white": "images/white_knight.png", "black": "images/black_knight.png"}
 
     def get_unfiltered_moves(self, board) -> List[Tuple[int, int]]:
-        possible_moves = []
         current_row, current_col = self.current_square.location
-
-        # Possible L-shaped moves for a knight (row_offset, col_offset)
-        knight_moves = [
-            (2, 1),   # Two down, one right
-            (2, -1),  # Two down, one left
-            (-2, 1),  # Two up, one right
-            (-2, -1), # Two up, one left
-            (1, 2),   # One down, two right
-            (1, -2),  # One down, two left
-            (-1, 2),  # One up, two right
-            (-1, -2)  # One up, two left
-        ]
-
-        # Iterate over all knight moves
-        for vertical_direction, horizontal_direction in knight_moves:
-            new_row = current_row + vertical_direction
-            new_col = current_col + horizontal_direction
-
-            # Check if the position is out of bounds
-            if 0 <= new_row < 8 and 0 <= new_col < 8:
-                square = board.get_square((new_row, new_col))
-
-                # Add the move if the square is not occupied by a friendly piece
-                if not square.is_occupied() or square.piece.color != self.color:
-                    possible_moves.append((new_row, new_col))
-
-        return possible_moves
+        return self.step(board, KNIGHT_TARGETS[current_row * 8 + current_col])
 
 
 class Bishop(Piece):
-    def __init__(self, color: str, current_square):
-        super().__init__(color, current_square)
-        self.image_path = f"images/{color}_bishop.png"
+    __slots__ = ()
+
+    image_paths = {"white": "images/white_bishop.png", "black": "images/black_bishop.png"}
 
     def get_unfiltered_moves(self, board) -> List[Tuple[int, int]]:
-        possible_moves = []
         current_row, current_col = self.current_square.location
-
-        # Directions for bishop movement: (vertical_direction, horizontal_direction)
-        directions = [
-            (1, 1),   # Down-right
-            (1, -1),  # Down-left
-            (-1, 1),  # Up-right
-            (-1, -1)  # Up-left
-        ]
-
-        # Iterate over all four diagonal directions
-        for vertical_direction, horizontal_direction in directions:
-            # Get all possible moves in the current diagonal direction
-            direction_moves = self.traverse_in_direction(board, current_row, current_col,
-                                                         vertical_direction, horizontal_direction)
-            # Add these moves to the possible_moves list
-            possible_moves.extend(direction_moves)
-
-        return possible_moves
+        return self.slide(board, BISHOP_RAYS[current_row * 8 + current_col])
 
 
 class Queen(Piece):
-    def __init__(self, color: str, current_square):
-        super().__init__(color, current_square)
-        self.image_path = f"images/{color}_queen.png"
+    __slots__ = ()
+
+    image_paths = {"white": "images/white_queen.png", "black": "images/black_queen.png"}
 
     def get_unfiltered_moves(self, board) -> List[Tuple[int, int]]:
-        possible_moves = []
         current_row, current_col = self.current_square.location
+        return self.slide(board, QUEEN_RAYS[current_row * 8 + current_col])
 
-        # Directions for queen movement: both rook-like and bishop-like
-        directions = [
-            (0, 1),   # Right (Rook direction)
-            (0, -1),  # Left (Rook direction)
-            (1, 0),   # Down (Rook direction)
-            (-1, 0),  # Up (Rook direction)
-            (1, 1),   # Down-right (Bishop direction)
-            (1, -1),  # Down-left (Bishop direction)
-            (-1, 1),  # Up-right (Bishop direction)
-            (-1, -1)  # Up-left (Bishop direction)
-        ]
-
-        # Iterate over all eight directions
-        for vertical_direction, horizontal_direction in directions:
-            # Get all possible moves in the current direction
-            direction_moves = self.traverse_in_direction(board, current_row, current_col,
-                                                         vertical_direction, horizontal_direction)
-            # Add these moves to the possible_moves list
-            possible_moves.extend(direction_moves)
 
-        return possible_moves
+class King(Piece):
+    __slots__ = ("has_moved",)
 
+    image_paths = {"white": "images/white_king.png", "black": "images/black_king.png"}
 
-class King(Piece):
     def __init__(self, color: str, current_square):
         super().__init__(color, current_square)
-        self.image_path = f"images/{color}_king.png"
         self.has_moved = False  # Tracks if the King has moved, important for castling
 
     def get_unfiltered_moves(self, board) -> List[Tuple[int, int]]:
-        possible_moves = []
         current_row, current_col = self.current_square.location
 
-        # Directions for king movement: one square in any direction
-        directions = [
-            (0, 1),    # Right
-            (0, -1),   # Left
-            (1, 0),    # Down
-            (-1, 0),   # Up
-            (1, 1),    # Down-right
-            (1, -1),   # Down-left
-            (-1, 1),   # Up-right
-            (-1, -1)   # Up-left
-        ]
-
-        # Iterate over all eight possible directions for regular moves
-        for vertical_direction, horizontal_direction in directions:
-            new_row = current_row + vertical_direction
-            new_col = current_col + horizontal_direction
-
-            # Check if the new position is within board bounds
-            if 0 <= new_row < 8 and 0 <= new_col < 8:
-                square = board.get_square((new_row, new_col))
-
-                # Add the move if the square is not occupied by a friendly piece
-                if not square.is_occupied() or square.piece.color != self.color:
-                    possible_moves.append((new_row, new_col))
+        # Regular moves: one square in any direction
+        possible_moves = self.step(board, KING_TARGETS[current_row * 8 + current_col])
 
         # Check for castling moves
         # if the king hasn't moved yet: proceed
@@ -291,9 +247,9 @@ class King(Piece):
                         not board.get_threats_to_square(board.get_square((row, 5)), self.color) and
                         not board.get_threats_to_square(board.get_square((row, 6)), self.color)):
 
-                    # check if the king side rook has not moved
+                    # check if the king side rook has not moved (and was not captured)
                     rook = board.white_king_rook if self.color == "white" else board.black_king_rook
-                    if not rook.has_moved:
+                    if rook and not rook.has_moved and rook.current_square:
                         possible_moves.append((row, 6))  # e1 to g1 or e8 to g8
 
                 # Long castling checks
@@ -303,9 +259,9 @@ class King(Piece):
                         not board.get_threats_to_square(board.get_square((row, 3)), self.color) and
                         not board.get_threats_to_square(board.get_square((row, 2)), self.color)):
 
-                    # check if the queen side rook has not moved
+                    # check if the queen side rook has not moved (and was not captured)
                     rook = board.white_queen_rook if self.color == "white" else board.black_queen_rook
-                    if not rook.has_moved:
+                    if rook and not rook.has_moved and rook.current_square:
                         possible_moves.append((row, 2))  # e1 to c1 or e8 to c8
 
         # for all these moves: check if they will put us too close to the opposite king:
@@ -313,10 +269,5 @@ class King(Piece):
         enemy_king_location = enemy_king.current_square.location
 
         # Filter out moves that place the king too close to the opponent's king
-        filtered_moves = []
-        for move in possible_moves:
-            # Check if the move is NOT within 1 square of the enemy king in both x and y directions
-            if not (abs(move[0] - enemy_king_location[0]) <= 1 and abs(move[1] - enemy_king_location[1]) <= 1):
-                filtered_moves.append(move)
-
-        return filtered_moves
+        enemy_king_zone = KING_ZONES[enemy_king_location[0] * 8 + enemy_king_location[1]]
+        return [move for move in possible_moves if move not in enemy_king_zone]
@@ -0,0 +1,79 @@
+""" Transposition table in shared memory: every process of a parallel search reads and writes the same entries """
+import struct
+from multiprocessing import shared_memory
+
+SHARED_TABLE_SIZE = 1 << 20  # Number of slots (a power of two), 16 bytes each
+
+# An entry is two 64-bit words: (position hash ^ data, data), where data packs
+# bits 0-15 best move code (0: none), bits 16-47 value + VALUE_OFFSET, bits 48-55 depth, bits 56-57 bound,
+# bits 58-63 age (the search that wrote it)
+VALUE_OFFSET = 1 << 31
+AGE_MASK = 63
+ENTRY_FORMAT = struct.Struct("QQ")
+AGE_FORMAT = struct.Struct("Q")  # The block starts with the age of the current search, shared by every process
+
+
+class SharedTranspositionTable:
+    """
+    Direct-mapped like the pawn hash table, with the same (depth, value, bound, best move code) entries as
+    AIBot's private table. Writes take no lock: a reader only accepts an entry whose two words XOR back to
+    its own key, so a slot torn by two processes writing it at once reads as a miss instead of as garbage.
+    Words are read and written with struct (no memoryview is kept on the block, so it can always be closed).
+    """
+
+    def __init__(self, size: int = SHARED_TABLE_SIZE, name: str = None):
+        """Creates a table of {size} slots, or attaches to the table called {name} (in a child process)."""
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=AGE_FORMAT.size + ENTRY_FORMAT.size * size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.owner = name is None
+        self.buffer = self.memory.buf
+        # The block can be larger than asked for (rounded up to whole pages): only the largest power of two is used
+        slots = (len(self.buffer) - AGE_FORMAT.size) // ENTRY_FORMAT.size
+        self.mask = (1 << (slots.bit_length() - 1)) - 1
+
+    @property
+    def name(self) -> str:
+        """What the other processes pass to attach to this table."""
+        return self.memory.name
+
+    def get(self, key):
+        """Returns (depth, value, bound, best move code or None) for key, or None."""
+        check, data = ENTRY_FORMAT.unpack_from(self.buffer, AGE_FORMAT.size + ENTRY_FORMAT.size * (key & self.mask))
+        if check ^ data != key:
+            return None
+        return (data >> 48) & 0xFF, ((data >> 16) & 0xFFFFFFFF) - VALUE_OFFSET, (data >> 56) & 3, (data & 0xFFFF) or None
+
+    def put(self, key, entry):
+        """
+        Stores (depth, value, bound, best move code or None) for key. Another position's entry is only replaced
+        if it is from an older search or not deeper; the same position keeps its best move if the new one has none.
+        """
+        depth, value, bound, best_move = entry
+        offset = AGE_FORMAT.size + ENTRY_FORMAT.size * (key & self.mask)
+        age = AGE_FORMAT.unpack_from(self.buffer)[0]
+
+        old_check, old_data = ENTRY_FORMAT.unpack_from(self.buffer, offset)
+        if old_data:
+            if old_check ^ old_data == key:
+                best_move = best_move or old_data & 0xFFFF
+            elif old_data >> 58 == age and (old_data >> 48) & 0xFF > depth:
+                return
+
+        data = (best_move or 0) | (value + VALUE_OFFSET) << 16 | min(depth, 0xFF) << 48 | bound << 56 | age << 58
+        ENTRY_FORMAT.pack_into(self.buffer, offset, key ^ data, data)
+
+    def new_search(self):
+        """Ages every entry by one search: older entries are the first to be replaced."""
+        AGE_FORMAT.pack_into(self.buffer, 0, (AGE_FORMAT.unpack_from(self.buffer)[0] + 1) & AGE_MASK)
+
+    def clear(self):
+        self.buffer[AGE_FORMAT.size:] = bytes(len(self.buffer) - AGE_FORMAT.size)
+
+    def close(self):
+        """Detaches this process from the table; the creator also frees it."""
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
@@ -0,0 +1,69 @@
+""" Decodes every sound effect once and plays them through a fixed set of mixer channels """
+import threading
+
+import pygame
+
+SOUND_NAMES = ["capture", "castle", "check", "checkmate", "illegal", "move",
+               "promote", "stalemate", "start", "switch"]
+NUM_CHANNELS = 4  # Effects never overlap much, a few reserved channels are enough
+
+
+class SoundBank:
+    def __init__(self):
+        self.sounds = {}  # name => decoded pygame.mixer.Sound
+        self.channels = []
+        self.next_channel = 0  # Round-robin index into self.channels
+        self.pending = []  # Names played before their sound finished decoding
+        self.lock = threading.Lock()
+        self.loader = None
+
+    def load_in_background(self):
+        """Start decoding all sounds on a background thread, so the main thread never waits on disk."""
+        if self.loader or not pygame.mixer.get_init():
+            return
+
+        # Reserve a fixed set of channels for effects
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), NUM_CHANNELS))
+        pygame.mixer.set_reserved(NUM_CHANNELS)
+        self.channels = [pygame.mixer.Channel(i) for i in range(NUM_CHANNELS)]
+
+        self.loader = threading.Thread(target=self.load_sounds, daemon=True)
+        self.loader.start()
+
+    def load_sounds(self):
+        for name in SOUND_NAMES:
+            sound = pygame.mixer.Sound(f'sounds/{name}.mp3')
+            with self.lock:
+                self.sounds[name] = sound
+                play_now = name in self.pending
+                if play_now:
+                    self.pending.remove(name)
+
+            # A sound requested before it was decoded plays as soon as it is ready
+            if play_now:
+                self.play(name)
+
+    def play(self, name):
+        """Play a sound effect without blocking. Unknown names (e.g. no move made yet) are ignored."""
+        if name not in SOUND_NAMES:
+            return
+
+        self.load_in_background()  # lazily start loading if nobody did it yet
+
+        with self.lock:
+            sound = self.sounds.get(name)
+            if not sound:
+                if name not in self.pending:
+                    self.pending.append(name)
+                return
+
+        if not self.channels:
+            return
+
+        channel = self.channels[self.next_channel]
+        self.next_channel = (self.next_channel + 1) % len(self.channels)
+        channel.play(sound)
+
+
+# One bank shared by the whole game (Board, Game and AIBot all play through it)
+sound_bank = SoundBank()
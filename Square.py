@@ -1,11 +1,22 @@
 """ Mainly important for highlighting squares and control of the Board"""
+import copy
 
 
 class Square:
+    __slots__ = ("location", "piece")  # No per-instance __dict__, squares are copied with every board
+
     def __init__(self, location: tuple[int, int]):
         self.location: tuple[int, int] = location  # The (x, y) position of the square on the board
         self.piece = None  # The piece currently occupying the square, if any
 
+    def __deepcopy__(self, memo):
+        """Copies the slots directly, much faster than the default deepcopy of a __slots__ class."""
+        square = object.__new__(Square)
+        memo[id(self)] = square
+        square.location = self.location  # tuples of ints are immutable, no need to copy
+        square.piece = copy.deepcopy(self.piece, memo)
+        return square
+
     def is_occupied(self) -> bool:
         return self.piece is not None
 
@@ -0,0 +1,87 @@
+""" Engine time management: per-move soft and hard limits from the clock """
+import time
+
+from Piece import Knight, Bishop, Rook, Queen
+
+MOVE_OVERHEAD = 0.05  # Seconds kept back per move for everything around the search (GUI, copies)
+MIN_MOVES_TO_GO = 15  # Moves the remaining time is shared over in a bare endgame...
+MAX_MOVES_TO_GO = 35  # ...and with every piece still on the board
+HARD_LIMIT_FACTOR = 4  # The hard limit is this many soft limits...
+MAX_HARD_SHARE = 0.15  # ...but never more than this share of the time left
+INSTABILITY_FACTOR = 1.5  # The soft limit grows this much each time the best move changes
+OBVIOUS_MOVE_SHARE = 0.25  # Share of the soft limit spent on an obvious recapture
+BRANCHING_ESTIMATE = 6  # One more depth takes about this many times the previous one (odd depths more, even less)
+NEXT_DEPTH_SOFT_FACTOR = 1.5  # A new depth starts only if it should end within this many soft limits
+
+PHASE_WEIGHTS = {Knight: 1, Bishop: 1, Rook: 2, Queen: 4}
+TOTAL_PHASE = 24  # Phase weight of the starting pieces
+
+
+def game_phase(board) -> float:
+    """1.0 with every piece on the board, 0.0 with only kings and pawns left."""
+    phase = sum(PHASE_WEIGHTS.get(type(piece), 0) for piece in board.white_pieces + board.black_pieces)
+    return min(phase / TOTAL_PHASE, 1.0)
+
+
+class TimeManager:
+    """
+    Budgets one move at a time: start_move sets the limits from the clock, and iteration_done, called
+    after every completed depth, says whether deepening should stop. The hard limit is enforced by the
+    search itself (its deadline), the soft limit only between iterations.
+    """
+
+    def __init__(self):
+        self.start_time = None
+        self.soft_limit = 0.0
+        self.hard_limit = 0.0
+        self.recapture_location = None  # where the opponent just captured: recapturing there is often forced
+        self.best_move = None  # (start_location, end_location) of the last completed iteration
+        self.stable_iterations = 0  # iterations in a row that kept self.best_move
+        self.iteration_start = None
+
+    def start_move(self, board, time_left, increment) -> float:
+        """
+        Sets the limits for the move about to be searched on {board}: the time left is shared over the
+        moves expected to remain (fewer as pieces come off), plus most of the increment. Returns the hard limit.
+        """
+        self.start_time = self.iteration_start = time.perf_counter()
+        available = max(time_left - MOVE_OVERHEAD, 0.0)
+        moves_to_go = MIN_MOVES_TO_GO + (MAX_MOVES_TO_GO - MIN_MOVES_TO_GO) * game_phase(board)
+
+        self.soft_limit = min(available / moves_to_go + increment * 0.75, available)
+        self.hard_limit = min(self.soft_limit * HARD_LIMIT_FACTOR, available * MAX_HARD_SHARE + increment, available)
+        self.soft_limit = min(self.soft_limit, self.hard_limit)
+
+        last_move = board.last_move
+        self.recapture_location = last_move[2].location if last_move and last_move[3] else None
+        self.best_move = None
+        self.stable_iterations = 0
+        return self.hard_limit
+
+    def iteration_done(self, lines, depth) -> bool:
+        """True if the search should not start depth + 1."""
+        now = time.perf_counter()
+        elapsed = now - self.start_time
+        iteration_time = now - self.iteration_start
+        self.iteration_start = now
+
+        pv = lines[0][2]
+        best_move = pv[0] if pv else None
+        if best_move == self.best_move:
+            self.stable_iterations += 1
+        else:
+            # An unstable best move: the position is unclear, give it more time (up to the hard limit)
+            if self.best_move is not None:
+                self.soft_limit = min(self.soft_limit * INSTABILITY_FACTOR, self.hard_limit)
+            self.best_move = best_move
+            self.stable_iterations = 0
+
+        soft_limit = self.soft_limit
+        # An obvious recapture: the best move takes back on the square of the capture, depth after depth
+        if best_move and best_move[1] == self.recapture_location and self.stable_iterations >= 1:
+            soft_limit *= OBVIOUS_MOVE_SHARE
+
+        # Stop at the soft limit, or when the next depth would overrun it by far: an iteration cut off by the
+        # hard limit is wasted time
+        predicted_end = elapsed + iteration_time * BRANCHING_ESTIMATE
+        return elapsed >= soft_limit or predicted_end > min(soft_limit * NEXT_DEPTH_SOFT_FACTOR, self.hard_limit)